@@ -84,8 +84,8 @@ void Wheels::setDutyCycle(int newDutyCycle) {
     dutyCycle = newDutyCycle;
 
     // Update PWM output
-    analogWrite(enable1Pin, freq);
-    analogWrite(enable2Pin, resolution);
+    analogWrite(enable1Pin, dutyCycle);
+    analogWrite(enable2Pin, dutyCycle);
 
     // Update cached distance per second
     updateDistancePerSecond();
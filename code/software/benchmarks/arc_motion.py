@@ -0,0 +1,88 @@
+"""
+Time of a turn around the object with the stop-start steps and with the continuous motion.
+
+Run from code/software with:
+    python -m benchmarks.arc_motion [--radius 30] [--points 6] [--latency-ms 15] [--turns 3]
+
+The navigator drives the circle against the simulated ESP32 API in real time, without
+captures. In the legacy mode, each 5 cm step pivots around the left wheel then goes
+straight, and each motion waits for /status to report the wheels stopped before the next
+one is sent. In the
+continuous mode, the motions are chained at their expected end while the wheels still
+turn, the heading follows the circle by pivoting around a wheel, and the reach points are
+faced by turning on itself. The latency jitter makes the drift of the dead reckoning vary
+from one turn to the other, so the means over several turns are compared: both modes model
+the pivots and must drift less than MAX_DRIFT_RATIO of the circle.
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+import config.dev_config as dconfig
+from controllers.navigator import Navigator
+from controllers.ss8 import SS8
+from simulation.esp32_server import ESP32Server
+
+MAX_DRIFT_RATIO = 0.03     # Max mean drift of the dead reckoning over a turn, relative to the circle length
+
+
+def run_turn(radius, points, latency, continuous):
+    """
+    Drives one turn, returns its duration, the number of motion and status requests and the dead reckoning error.
+    """
+    server = ESP32Server(port=0, latency=latency)
+    server.start()
+    server.robot.pose = [0., 0., math.pi / 2]   # The navigator starts heading along the circle
+
+    dconfig.CONTINUOUS_MOTION = continuous
+    ss8 = SS8(None, lambda: print("Connection lost"))
+    ss8.client.set_base_url(server.url)
+    nav = Navigator(ss8, None)
+    nav.set_precision(1, points)
+    nav._set_circle_trajectory(radius, points)
+
+    start = time.perf_counter()
+    nav.moving = True
+    nav._move_one_turn()
+    ss8.motion.wait_idle()
+    duration = time.perf_counter() - start
+
+    x, y, _ = server.robot.get_pose()
+    drift = np.linalg.norm(nav.ss8_pos - [x, y])
+    requests = sum(count for route, count in server.request_counts.items() if route not in ("/status",))
+    server.stop()
+    return duration, requests, server.request_counts.get("/status", 0), drift
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--radius', type=float, default=30, help='Radius of the circle in cm')
+    parser.add_argument('--points', type=int, default=6, help='Number of reach points of the circle')
+    parser.add_argument('--latency-ms', type=float, default=15, help='Mean latency of the simulated API')
+    parser.add_argument('--turns', type=int, default=3, help='Number of turns per mode')
+    args = parser.parse_args()
+
+    dconfig.CONNECT_TO_TOP_CAM = False
+    dconfig.CONNECT_TO_FRONT_CAM = False
+    dconfig.NAVIGATION_ONLY = True
+    random.seed(0)
+
+    print(f"{'mode':>12} {'turn':>9} {'commands':>9} {'status':>7} {'drift':>9}")
+    results = {}
+    for name, continuous in (('stop-start', False), ('continuous', True)):
+        runs = np.array([run_turn(args.radius, args.points, args.latency_ms / 1000, continuous) for _ in range(args.turns)])
+        duration, requests, polls, drift = runs.mean(axis=0)
+        results[name] = (duration, drift)
+        print(f"{name:>12} {f'{duration:.1f} s':>9} {requests:>9.0f} {polls:>7.0f} {f'{drift:.1f} cm':>9}")
+
+    (legacy, _), (continuous, _) = results['stop-start'], results['continuous']
+    print(f"Turn {legacy / continuous:.2f}x faster")
+
+    # Accuracy checks
+    assert continuous < legacy, "The continuous motion must be faster"
+    for name, (_, drift) in results.items():
+        assert drift < MAX_DRIFT_RATIO * 2 * math.pi * args.radius, f"The dead reckoning of the {name} mode must follow the simulated pose"
+    print("Accuracy checks passed")
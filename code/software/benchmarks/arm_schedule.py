@@ -0,0 +1,136 @@
+"""
+Arm travel and settle time of a scan with the arm parked at each reach point and with the serpentine sweeps.
+
+Run from code/software with:
+    python -m benchmarks.arm_schedule [--radius 80] [--obstacles 0 20]
+
+The arm moves of a turn are replayed on the simulated SS8 with a virtual clock, with the
+stepper profiles of the firmware. In the legacy schedule, each reach point sweeps the arm
+positions bottom to top, then parks the arm before the body moves on. In the serpentine
+schedule, each sweep starts where the previous one ended, and the arm is only parked when
+it would come closer than ARM_CLEARANCE to an obstacle while the body moves to the next
+reach point. The obstacles are spread around the circle, outside of it, where the arm
+reaches. Both schedules must capture the same views, and the serpentine one must park
+exactly before the moves that collide.
+"""
+import argparse
+import math
+
+import numpy as np
+
+from controllers.arm_positions import generate_path
+from controllers.arm_schedule import ArmSchedule, arm_tip_positions, sweep_order
+from controllers.navigator import STEP_DISTANCE
+from controllers.obstacle_store import ObstacleStore
+from simulation.esp32_server import SimulatedSS8
+
+CLOCK_STEP = 0.01   # Time step of the virtual clock while waiting for the arm in seconds
+GRIDS = [(6, 3), (12, 3), (12, 7)]
+OBSTACLE_FORCE = -100000
+OBSTACLE_ORDER = 3
+
+
+def arc(radius, start, end):
+    """
+    Returns the positions every STEP_DISTANCE along the circle around the object at (0, 0), from the angle start to end.
+    """
+    count = int(radius * (end - start) / STEP_DISTANCE) + 2
+    angles = np.linspace(start, end, count)
+    return radius * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def replay(radius, horizontal, vertical, obstacles, serpentine):
+    """
+    Replays the arm moves of a turn, returns the ArmSchedule, the captured views and the indices of the
+    moves of the body done with the arm parked.
+    """
+    now = [0.]
+    robot = SimulatedSS8(clock=lambda: now[0])
+    schedule = ArmSchedule()
+
+    def goto_arm(x, y):
+        # Same commands as SS8.goto_arm, (0, 0) parks the arm with the angles
+        assert robot.arm_goto(x, y, x == 0 and y == 0), f"Arm position {x}, {y} out of range"
+        start = now[0]
+        while robot.arm_moving():
+            now[0] += CLOCK_STEP
+        schedule.add_settle_time(now[0] - start)
+
+    angles = np.linspace(0, 2 * math.pi, horizontal + 1)
+    views, parked_moves = [], []
+    for i, angle in enumerate(angles[:-1]):
+        arm_positions = generate_path(vertical)
+        if serpentine:
+            arm_positions = schedule.order(arm_positions)
+        for arm_pos in arm_positions:
+            goto_arm(*arm_pos)
+            schedule.move_to(arm_pos)
+            views.append((float(angle), tuple(arm_pos)))
+
+        if not serpentine or schedule.must_park(arc(radius, angle, angles[i + 1]), (0, 0), obstacles):
+            goto_arm(0, 0)
+            schedule.park()
+            parked_moves.append(i)
+    if not schedule.parked:
+        goto_arm(0, 0)
+        schedule.park()
+    return schedule, views, parked_moves
+
+
+def colliding_moves(radius, horizontal, vertical, obstacles):
+    """
+    Returns the indices of the moves of the body along which the arm at the end of the sweep comes closer than the
+    clearance to an obstacle, checked against all the obstacles. The sweeps go up after a park and alternate otherwise.
+    """
+    angles = np.linspace(0, 2 * math.pi, horizontal + 1)
+    path = generate_path(vertical)
+    positions = obstacles.positions
+    moves, upward = [], True
+    for i in range(horizontal):
+        end = path[-1] if upward else path[0]
+        tips = arm_tip_positions(arc(radius, angles[i], angles[i + 1]), (0, 0), end[0])
+        if len(positions) and np.min(np.linalg.norm(tips[:, None] - positions[None], axis=2)) < ArmSchedule().clearance:
+            moves.append(i)
+            upward = True
+        else:
+            upward = not upward
+    return moves
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--radius', type=float, default=80, help='Radius of the circle in cm')
+    parser.add_argument('--obstacles', type=int, nargs='+', default=[0, 20], help='Numbers of obstacles around the circle')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'grid':>6} {'obstacles':>10} {'schedule':>11} {'travel':>9} {'settle':>9} {'parks':>6}")
+    for obstacle_nbr in args.obstacles:
+        # Beyond the circle, where the arm reaches out
+        angles = rng.uniform(0, 2 * math.pi, obstacle_nbr)
+        dists = args.radius + rng.uniform(15, 60, obstacle_nbr)
+        obstacles = ObstacleStore()
+        obstacles.add_many(np.stack([dists * np.cos(angles), dists * np.sin(angles)], axis=1), OBSTACLE_FORCE, OBSTACLE_ORDER)
+
+        for horizontal, vertical in GRIDS:
+            results = {}
+            for name, serpentine in (('legacy', False), ('serpentine', True)):
+                schedule, views, parked_moves = replay(args.radius, horizontal, vertical, obstacles, serpentine)
+                results[name] = (schedule, views, parked_moves)
+                print(f"{f'{horizontal}x{vertical}':>6} {obstacle_nbr:>10} {name:>11} {f'{schedule.travel:.0f} cm':>9} "
+                      f"{f'{schedule.settle_time:.0f} s':>9} {schedule.parks:>6}")
+
+            (legacy, legacy_views, _), (serpentine, serpentine_views, parked_moves) = results['legacy'], results['serpentine']
+            print(f"{'':>6} {'':>10} {'saved':>11} {f'{legacy.travel - serpentine.travel:.0f} cm':>9} "
+                  f"{f'{legacy.settle_time - serpentine.settle_time:.0f} s':>9}")
+
+            # Accuracy checks
+            assert sorted(legacy_views) == sorted(serpentine_views), "The schedules must capture the same views"
+            assert serpentine.travel <= legacy.travel and serpentine.settle_time <= legacy.settle_time
+            assert parked_moves == colliding_moves(args.radius, horizontal, vertical, obstacles), \
+                "The arm must be parked exactly before the moves along which it collides"
+
+    # Successive identical sweeps alternate their direction
+    path = generate_path(5)
+    assert sweep_order(path, np.array([0., 0.])) == path and sweep_order(path, np.array(path[-1])) == path[::-1]
+    print("Accuracy checks passed")
@@ -0,0 +1,87 @@
+"""
+Round trip latency of the SS8 control commands, with and without kept alive connections.
+
+Run from code/software with:
+    python -m benchmarks.command_latency [--iterations 500] [--delay-ms 0]
+
+A local HTTP/1.1 server stands in for the ESP32-S2 and answers every route with an empty
+JSON object after --delay-ms. The legacy client opens a new connection for each command
+with requests.post, the CommandClient reuses the connections of its session.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from controllers.command_client import CommandClient
+
+BENCH_PORT = 18080
+COMMANDS = [
+    ("/fwd", {"ms": 0}),
+    ("/cam/goto", {"alpha": 0, "beta": 0}),
+    ("/led/set", {"r": 0, "g": 4, "b": 4}),
+    ("/text", {"text": "Bench"}),
+]
+
+
+def make_handler(delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # Keep the connections alive like the ESP32 WebServer
+        disable_nagle_algorithm = True  # Headers and body are written separately
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if delay:
+                time.sleep(delay)
+            body = json.dumps({}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run(send, iterations):
+    durations = []
+    for i in range(iterations):
+        route, body = COMMANDS[i % len(COMMANDS)]
+        start = time.perf_counter()
+        send(route, body).json()
+        durations.append(time.perf_counter() - start)
+    return np.array(durations) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500, help='Number of commands per client')
+    parser.add_argument('--delay-ms', type=float, default=0, help='Processing time of the stand-in server')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', BENCH_PORT), make_handler(args.delay_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{BENCH_PORT}"
+
+    client = CommandClient(url)
+    clients = (
+        ('requests.post', lambda route, body: requests.post(url + route, json=body)),
+        ('CommandClient', client.post),
+    )
+
+    print(f"{'client':>14} {'mean':>10} {'p50':>10} {'p99':>10}")
+    for name, send in clients:
+        run(send, 10) # Warm up
+        durations = run(send, args.iterations)
+        print(f"{name:>14} {f'{durations.mean():.3f} ms':>10} {f'{np.percentile(durations, 50):.3f} ms':>10} "
+              f"{f'{np.percentile(durations, 99):.3f} ms':>10}")
+
+    client.close()
+    server.shutdown()
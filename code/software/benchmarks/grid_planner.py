@@ -0,0 +1,130 @@
+"""
+Replanning latency of the grid planner when obstacles are discovered on the way.
+
+Run from code/software with:
+    python -m benchmarks.grid_planner [--walls 12] [--sensor-range 100] [--seed 0]
+
+The robot drives to a goal 2 m away through random walls that it only sees once they
+are closer than the sensor range. At each step the newly seen obstacles are either
+repaired by D* Lite or searched again from scratch, the same algorithm with a fresh
+search. Both paths must have the same cost and avoid the inflated obstacles. A U shaped
+obstacle around the robot, a local minimum of a potential field, must be planned around.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from controllers.grid_planner import GridPlanner
+from controllers.obstacle_store import force_contributions
+
+STEP_DISTANCE = 5
+START = np.array([0., 0.])
+GOAL = np.array([200., 0.])
+WALL_LENGTH = 60        # Length of the random walls in cm
+POINT_SPACING = 2.5     # Spacing of the sampled points of a wall in cm
+
+
+def random_walls(count, rng):
+    """
+    Returns the points of count random walls between the start and the goal, none of them close to the
+    start or the goal, and such that the goal is reachable.
+    """
+    while True:
+        points = []
+        for _ in range(count):
+            center = rng.uniform([20, -100], [180, 100])
+            angle = rng.uniform(0, np.pi)
+            t = np.arange(-WALL_LENGTH / 2, WALL_LENGTH / 2, POINT_SPACING)
+            points.append(center + t[:, None] * [np.cos(angle), np.sin(angle)])
+        points = np.concatenate(points)
+        clear = np.minimum(np.linalg.norm(points - START, axis=1), np.linalg.norm(points - GOAL, axis=1)) > 30
+        points = points[clear]
+        planner = GridPlanner(max_expansions=10 ** 6)
+        planner.set_obstacles(points)
+        if planner.plan(START, GOAL) is not None:
+            return points
+
+
+def path_cost(path):
+    return np.linalg.norm(np.diff(path, axis=0), axis=1).sum()
+
+
+def potential_field_reaches(start, goal, obstacles, steps=400):
+    """
+    Follows the force field of the navigator (reach point of order 0, obstacles of order 3).
+    """
+    pos = start.astype(float)
+    for _ in range(steps):
+        dep = force_contributions(goal[None], np.array([40.]), np.array([0.]), pos)[0]
+        dep += force_contributions(obstacles, np.full(len(obstacles), -100000.), np.full(len(obstacles), 3.), pos).sum(axis=0)
+        if np.linalg.norm(dep) > STEP_DISTANCE:
+            dep = dep / np.linalg.norm(dep) * STEP_DISTANCE
+        pos += dep
+        if np.linalg.norm(pos - goal) < STEP_DISTANCE:
+            return True
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--walls', type=int, default=12, help='Number of random walls')
+    parser.add_argument('--sensor-range', type=float, default=100, help='Distance at which the walls are seen in cm')
+    parser.add_argument('--max-steps', type=int, default=200, help='Max number of moves of the robot')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    world = random_walls(args.walls, np.random.default_rng(args.seed))
+    # Unbounded expansions so that both searches always complete and can be compared
+    incremental = GridPlanner(max_expansions=10 ** 6)
+    robot = START.copy()
+    seen = np.zeros(len(world), dtype=bool)
+    repair_times, scratch_times, expansions = [], [], []
+
+    for step in range(args.max_steps):
+        seen |= np.linalg.norm(world - robot, axis=1) < args.sensor_range
+        points = world[seen]
+        incremental.set_obstacles(points)
+
+        start = time.perf_counter()
+        path = incremental.plan(robot, GOAL)
+        repair_times.append(time.perf_counter() - start)
+        expansions.append(incremental.search.expansions)
+
+        scratch = GridPlanner(max_expansions=10 ** 6)
+        scratch.set_obstacles(points)
+        start = time.perf_counter()
+        scratch_path = scratch.plan(robot, GOAL)
+        scratch_times.append(time.perf_counter() - start)
+
+        assert path is not None and scratch_path is not None, "The goal must stay reachable"
+        assert abs(path_cost(path) - path_cost(scratch_path)) < 1e-6, "The repaired path must be optimal"
+        assert not any(incremental.is_blocked(p) for p in path), "The path must avoid the obstacles"
+
+        robot = path[min(1, len(path) - 1)].copy()
+        if np.linalg.norm(robot - GOAL) < STEP_DISTANCE:
+            break
+    assert np.linalg.norm(robot - GOAL) < STEP_DISTANCE, "The robot must reach the goal"
+
+    # The first plan is a full search for both, only the repairs are compared
+    repair_times, scratch_times = np.array(repair_times[1:]) * 1e3, np.array(scratch_times[1:]) * 1e3
+    print(f"{'search':>12} {'mean':>10} {'p95':>10} {'max':>10}")
+    for name, times in (('D* Lite', repair_times), ('scratch', scratch_times)):
+        print(f"{name:>12} {f'{times.mean():.2f} ms':>10} {f'{np.percentile(times, 95):.2f} ms':>10} "
+              f"{f'{times.max():.2f} ms':>10}")
+    print(f"{step + 1} steps, {seen.sum()}/{len(world)} obstacle points seen, {incremental.repairs} repairs, "
+          f"{expansions[0]} expansions for the first plan, {np.mean(expansions[1:]):.0f} per step")
+
+    # Local minimum of the potential field: a U open away from the goal
+    u_shape = np.concatenate([
+        np.stack([np.full(21, 100.), np.linspace(-50, 50, 21)], axis=1),
+        np.stack([np.linspace(40, 100, 13), np.full(13, -50.)], axis=1),
+        np.stack([np.linspace(40, 100, 13), np.full(13, 50.)], axis=1),
+    ])
+    planner = GridPlanner()
+    planner.set_obstacles(u_shape)
+    u_path = planner.plan(np.array([60., 0.]), GOAL)
+    assert u_path is not None and not any(planner.is_blocked(p) for p in u_path), "The U must be planned around"
+    print(f"U shape : potential field reaches the goal {potential_field_reaches(np.array([60., 0.]), GOAL, u_shape)}, "
+          f"planned path of {path_cost(u_path):.0f} cm")
+    print("Accuracy checks passed")
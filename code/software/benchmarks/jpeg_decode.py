@@ -0,0 +1,55 @@
+"""
+Decode time and memory per frame at each JPEG reduction level.
+
+Run from code/software with:
+    python -m benchmarks.jpeg_decode [--iterations 50]
+
+The reduced decodes use libjpeg's DCT domain downscaling (cv2.IMREAD_REDUCED_COLOR_*), the
+last column compares with a full decode followed by cv2.resize, which is what the previews
+would cost without it.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.udp_throughput import make_jpeg, RESOLUTIONS
+from controllers.udp_receiver import DECODE_FLAGS
+
+
+def time_decode(jpeg, flag, iterations):
+    buffer = np.frombuffer(jpeg, np.uint8)
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        frame = cv2.imdecode(buffer, flag)
+        durations.append(time.perf_counter() - start)
+    return np.median(durations) * 1000, frame
+
+
+def time_decode_and_resize(jpeg, scale, iterations):
+    buffer = np.frombuffer(jpeg, np.uint8)
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        cv2.resize(frame, (frame.shape[1] // scale, frame.shape[0] // scale), interpolation=cv2.INTER_AREA)
+        durations.append(time.perf_counter() - start)
+    return np.median(durations) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50, help='Number of decodes per measure')
+    args = parser.parse_args()
+
+    print(f"{'resolution':>12} {'scale':>6} {'output':>10} {'decode':>10} {'memory':>10} {'full+resize':>12}")
+    for width, height in RESOLUTIONS:
+        jpeg = make_jpeg(width, height)
+        for scale, flag in DECODE_FLAGS.items():
+            decode_ms, frame = time_decode(jpeg, flag, args.iterations)
+            resize_ms = time_decode_and_resize(jpeg, scale, args.iterations) if scale > 1 else decode_ms
+            output = f'{frame.shape[1]}x{frame.shape[0]}'
+            print(f"{f'{width}x{height}':>12} {scale:>6} {output:>10} {f'{decode_ms:.2f} ms':>10} "
+                  f"{f'{frame.nbytes // 1024} KiB':>10} {f'{resize_ms:.2f} ms':>12}")
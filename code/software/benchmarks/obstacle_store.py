@@ -0,0 +1,99 @@
+"""
+Cost of the obstacle force field per planning step.
+
+Run from code/software with:
+    python -m benchmarks.obstacle_store [--obstacles 100 1000 5000] [--repeat 20]
+
+The legacy layout is an object array of ForcePoint grown with np.append, looped over in
+Python to sum the contributions and to check the spacing of a new obstacle. It is compared
+with the ObstacleStore arrays. The sums of both layouts must match.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from controllers.navigator import ForcePoint
+from controllers.obstacle_store import ObstacleStore
+
+OBSTACLE_FORCE = -100000
+OBSTACLE_ORDER = 3
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def legacy_build(positions):
+    obstacles = np.array([])
+    for pos in positions:
+        obstacles = np.append(obstacles, ForcePoint(pos, OBSTACLE_FORCE, OBSTACLE_ORDER))
+    return obstacles
+
+
+def legacy_sum(obstacles, pos):
+    total = np.zeros(2)
+    for obs in obstacles:
+        total += obs.get_contribution(pos)
+    return total
+
+
+def legacy_any_within(obstacles, pos, radius):
+    for obs in obstacles:
+        if np.linalg.norm(obs.get_pos() - pos) < radius:
+            return True
+    return False
+
+
+def store_build(positions):
+    store = ObstacleStore()
+    for pos in positions:
+        store.add(pos, OBSTACLE_FORCE, OBSTACLE_ORDER)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--obstacles', type=int, nargs='+', default=[100, 1000, 5000], help='Numbers of obstacles')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of runs, the best one is kept')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    robot = np.array([0., 0.])
+    # Far from the robot, so that no obstacle is in the spacing radius
+    probe = np.array([1000., 1000.])
+
+    print(f"{'obstacles':>10} {'layout':>8} {'insert':>12} {'force sum':>12} {'spacing check':>14}")
+    for n in args.obstacles:
+        positions = rng.uniform(-150, 150, (n, 2)) + np.array([0, 200])
+
+        legacy_insert = best_time(lambda: legacy_build(positions), max(args.repeat // 10, 1))
+        store_insert = best_time(lambda: store_build(positions), max(args.repeat // 10, 1))
+        obstacles = legacy_build(positions)
+        store = store_build(positions)
+
+        legacy_force = best_time(lambda: legacy_sum(obstacles, robot), args.repeat)
+        store_force = best_time(lambda: store.total_contribution(robot), args.repeat)
+        legacy_check = best_time(lambda: legacy_any_within(obstacles, probe, 20), args.repeat)
+        store_check = best_time(lambda: store.any_within(probe, 20), args.repeat)
+
+        for name, insert, force, check in (('legacy', legacy_insert, legacy_force, legacy_check),
+                                           ('store', store_insert, store_force, store_check)):
+            print(f"{n:>10} {name:>8} {f'{insert / n * 1e6:.2f} us/obs':>12} {f'{force * 1e3:.3f} ms':>12} "
+                  f"{f'{check * 1e3:.3f} ms':>14}")
+
+        expected = legacy_sum(obstacles, robot)
+        assert np.allclose(store.total_contribution(robot), expected, rtol=1e-9, atol=1e-12), "The force sums differ"
+
+    # The norm orders used by the trajectory points (0) and the obstacles are all supported
+    points = [ForcePoint(rng.uniform(-50, 50, 2), force, order) for force, order in ((40, 0), (-1000, 1), (-5, 2), (-1e5, 3))]
+    store = ObstacleStore()
+    for point in points:
+        store.add(point.get_pos(), point.force, point.dist_order)
+    assert np.allclose(store.contributions(robot), [p.get_contribution(robot) for p in points]), "The orders differ"
+    print("Accuracy checks passed")
@@ -0,0 +1,109 @@
+"""
+Cost of integrating the depth scans of the front camera in the occupancy grid.
+
+Run from code/software with:
+    python -m benchmarks.occupancy_grid [--scans 200] [--points 300] [--resolution 5]
+
+A simulated robot drives along a corridor and sees its walls plus a box that is removed
+halfway. Each scan is ray cast in the grid at once, then the obstacles of the force field
+are synced with the occupied cells in range, like in Navigator.update_occupancy. The accuracy
+part checks that the walls are occupied, that the corridor is free, that the removed box
+is cleared from the grid and from the obstacles, and that the window followed the robot.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from controllers.navigator import OBSTACLE_DIST_ORDER, OBSTACLE_FORCE, OBSTACLE_MIN_SPACING
+from controllers.obstacle_store import ObstacleStore
+from controllers.occupancy_grid import OccupancyGrid
+
+CORRIDOR_WIDTH = 175    # Distance between the walls in cm
+BOX = np.array([300., 0.])
+BOX_SIZE = 20
+FOV = np.radians(60)
+SYNC_RANGE = 350        # Range of the synced obstacles in cm, larger than OBSTACLE_RANGE so that the box is in it
+
+
+def scan(robot, heading, points, with_box, rng):
+    """
+    Returns the hits of a scan of the corridor walls (y = +-CORRIDOR_WIDTH / 2) and of the box.
+    """
+    angles = heading + rng.uniform(-FOV / 2, FOV / 2, points)
+    directions = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    with np.errstate(divide='ignore'):
+        dist = np.abs((np.sign(directions[:, 1]) * CORRIDOR_WIDTH / 2 - robot[1]) / directions[:, 1])
+    if with_box:
+        # Rays crossing the box stop at its front face
+        to_box = (BOX[0] - BOX_SIZE / 2 - robot[0]) / directions[:, 0]
+        y = robot[1] + to_box * directions[:, 1]
+        blocked = (to_box > 0) & (np.abs(y - BOX[1]) < BOX_SIZE / 2)
+        dist = np.where(blocked & (to_box < dist), to_box, dist)
+    dist = dist + rng.normal(0, 1, points)
+    return robot + directions * dist[:, None]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scans', type=int, default=200, help='Number of depth scans')
+    parser.add_argument('--points', type=int, default=300, help='Number of points per scan')
+    parser.add_argument('--resolution', type=float, default=5, help='Side of a cell in cm')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    grid = OccupancyGrid(resolution=args.resolution)
+    obstacles = ObstacleStore()
+    durations, sync_durations = [], []
+    robot = np.array([0., 0.])
+    for i in range(args.scans):
+        # Forward to the box, then it is removed and the robot backs up looking at the same place
+        with_box = i < args.scans // 2
+        robot = np.array([min(i, args.scans // 2) * 0.5 - max(i - args.scans // 2, 0) * 0.5, 0.])
+        hits = scan(robot, 0., args.points, with_box, rng)
+
+        start = time.perf_counter()
+        grid.follow(robot)
+        grid.update(robot, hits)
+        durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        obstacles.sync(grid.occupied_within(robot, SYNC_RANGE), robot, SYNC_RANGE,
+                       OBSTACLE_FORCE, OBSTACLE_DIST_ORDER, OBSTACLE_MIN_SPACING)
+        sync_durations.append(time.perf_counter() - start)
+        if i == args.scans // 2 - 1:
+            assert grid.is_occupied([BOX - [BOX_SIZE / 2 - 1, 0]]).all(), "The box must be occupied"
+            assert obstacles.any_within(BOX, BOX_SIZE), "The box must be an obstacle"
+
+    start = time.perf_counter()
+    for _ in range(100):
+        grid.occupied_within(robot, 150)
+    query_time = (time.perf_counter() - start) / 100
+
+    durations = np.array(durations) * 1e3
+    sync_durations = np.array(sync_durations) * 1e3
+    print(f"Grid of {grid.cells}x{grid.cells} cells of {args.resolution} cm, {args.points} points per scan")
+    print(f"Update : mean {durations.mean():.2f} ms, p95 {np.percentile(durations, 95):.2f} ms")
+    print(f"Occupied cells within 150 cm : {query_time * 1e6:.0f} us")
+    print(f"Obstacles sync : mean {sync_durations.mean():.2f} ms, p95 {np.percentile(sync_durations, 95):.2f} ms, "
+          f"{len(obstacles)} obstacles")
+
+    # Accuracy checks
+    wall = np.stack([np.arange(200, 260, 5.), np.full(12, CORRIDOR_WIDTH / 2)], axis=1)
+    assert grid.is_occupied(wall).mean() > 0.8, "The walls must be occupied"
+    corridor = np.stack([np.arange(20, 250, 10.), np.zeros(23)], axis=1)
+    assert not grid.is_occupied(corridor).any(), "The corridor must be free"
+    assert not grid.is_occupied([BOX - [BOX_SIZE / 2 - 1, 0]]).any(), "The removed box must be cleared"
+    assert not obstacles.any_within(BOX, BOX_SIZE), "The removed box must not be an obstacle anymore"
+    assert obstacles.any_within(wall.mean(axis=0), OBSTACLE_MIN_SPACING), "The walls must be obstacles"
+    gaps = np.linalg.norm(obstacles.positions[:, None] - obstacles.positions[None], axis=2)
+    assert gaps[~np.eye(len(obstacles), dtype=bool)].min() >= OBSTACLE_MIN_SPACING, "The obstacles must not pile up"
+
+    moving = OccupancyGrid(resolution=args.resolution, size=200)
+    moving.update([0, 0], [[50, 0]])
+    moving.update([0, 0], [[50, 0]])
+    moving.follow([80, 0])
+    assert moving.is_occupied([[50, 0]]).all(), "The window must keep the cells still inside"
+    moving.follow([1000, 0])
+    assert not moving.is_occupied([[50, 0]]).any() and abs(moving.center[0] - 1000) <= args.resolution
+    print("Accuracy checks passed")
@@ -0,0 +1,82 @@
+"""
+Speed and accuracy of the top camera reverse kinematics.
+
+Run from code/software with:
+    python -m benchmarks.reverse_kinematics [--targets 200] [--table-step 5]
+
+The legacy solver minimizes the Frobenius error with scipy.optimize.minimize (Nelder-Mead,
+like SS8._get_reverse_kin_angle did) and builds Rotation objects on every evaluation. It is
+compared with the closed form solver, one target at a time and vectorized over all of them,
+and with the interpolation table.
+
+The accuracy part checks that reachable targets (arm axis along X) are recovered exactly
+and that the closed form error is never above the legacy optimizer's on random targets.
+"""
+import argparse
+import time
+
+import numpy as np
+import scipy.optimize as opt
+from scipy.spatial.transform import Rotation as Rot
+
+from controllers.reverse_kinematics import (solve_top_cam_angles, get_top_cam_angles, decomposition_error,
+                                            ReverseKinematicsTable)
+
+
+def legacy_top_cam_angles(hor_angle, vert_angle, arm_angle):
+    r_final = Rot.from_euler('xyz', [hor_angle, 0, vert_angle], degrees=True).as_matrix()
+    gamma = np.radians(arm_angle)
+    u1 = np.array([np.cos(gamma), np.sin(gamma), 0])
+
+    def error_function(params):
+        alpha, beta = params
+        r1 = Rot.from_rotvec(alpha * u1).as_matrix()
+        r2 = Rot.from_euler('z', beta).as_matrix()
+        return np.linalg.norm(r_final - r2 @ r1, ord='fro')
+
+    result = opt.minimize(error_function, [0.1, 0.1], method='Nelder-Mead')
+    return result.x % (2*np.pi)
+
+
+def timed(func):
+    start = time.perf_counter()
+    res = func()
+    return time.perf_counter() - start, res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', type=int, default=200, help='Number of random targets')
+    parser.add_argument('--table-step', type=float, default=5, help='Grid step of the table in degrees')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hor = rng.uniform(-180, 180, args.targets)
+    vert = rng.uniform(-180, 180, args.targets)
+    arm = rng.uniform(-180, 180, args.targets)
+
+    legacy_time, legacy = timed(lambda: np.array([legacy_top_cam_angles(h, v, a) for h, v, a in zip(hor, vert, arm)]))
+    single_time, _ = timed(lambda: [get_top_cam_angles(h, v, a) for h, v, a in zip(hor, vert, arm)])
+    batch_time, (alpha, beta) = timed(lambda: solve_top_cam_angles(hor, vert, arm))
+    build_time, table = timed(lambda: ReverseKinematicsTable(args.table_step))
+    lookup_time, (table_alpha, table_beta) = timed(lambda: table.lookup(hor, vert, arm))
+
+    legacy_error = decomposition_error(hor, vert, arm, legacy[:, 0], legacy[:, 1])
+    error = decomposition_error(hor, vert, arm, alpha, beta)
+    table_error = decomposition_error(hor, vert, arm, table_alpha, table_beta)
+
+    print(f"{'solver':>22} {'per target':>12} {'mean error':>12} {'max error':>12}")
+    for name, duration, err in (('legacy Nelder-Mead', legacy_time, legacy_error),
+                                ('closed form, single', single_time, error),
+                                ('closed form, batch', batch_time, error),
+                                (f'table ({args.table_step} deg)', lookup_time, table_error)):
+        print(f"{name:>22} {f'{duration / args.targets * 1e6:.1f} us':>12} {err.mean():12.2e} {err.max():12.2e}")
+    print(f"Table built in {build_time:.2f} s")
+
+    # Accuracy checks
+    reachable_alpha, reachable_beta = solve_top_cam_angles(hor, vert, 0)
+    reachable_error = decomposition_error(hor, vert, 0, reachable_alpha, reachable_beta).max()
+    print(f"Max error on reachable targets : {reachable_error:.2e}")
+    assert reachable_error < 1e-9, "Reachable targets must be recovered exactly"
+    assert np.all(error <= legacy_error + 1e-6), "The closed form must be at least as accurate as the optimizer"
+    print("Accuracy checks passed")
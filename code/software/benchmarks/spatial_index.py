@@ -0,0 +1,85 @@
+"""
+Cost of adding the obstacles of a detection frame as the map grows.
+
+Run from code/software with:
+    python -m benchmarks.spatial_index [--frames 100] [--points 150] [--spacing 20]
+
+Each frame projects points scattered over an area the size of a room. They are merged
+into the map with a min spacing between obstacles. The linear variant checks each
+point against all the obstacles, like the navigator first did one point at a time, and is
+compared with ObstacleStore.add_many backed by the grid index. The time per frame must
+stay flat with the index, and both variants must keep the same obstacles.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from controllers.obstacle_store import ObstacleStore
+
+OBSTACLE_FORCE = -100000
+OBSTACLE_ORDER = 3
+ROOM_SIZE = 2000    # Side of the area of the projected points in cm
+
+
+def linear_add(positions, points, spacing):
+    """
+    Adds the points not closer than spacing to the kept ones, checking them all.
+    """
+    kept = list(positions)
+    for point in points:
+        if all(np.linalg.norm(obs - point) >= spacing for obs in kept):
+            kept.append(point)
+    return kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=100, help='Number of detection frames')
+    parser.add_argument('--points', type=int, default=150, help='Number of projected points per frame')
+    parser.add_argument('--spacing', type=float, default=20, help='Min spacing between obstacles in cm')
+    parser.add_argument('--linear-frames', type=int, default=30, help='Frames also run with the linear scan')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.uniform(0, ROOM_SIZE, (args.points, 2)) for _ in range(args.frames)]
+
+    store = ObstacleStore(cell_size=args.spacing)
+    linear = []
+    print(f"{'frame':>6} {'obstacles':>10} {'grid':>10} {'linear':>10}")
+    for i, points in enumerate(frames):
+        start = time.perf_counter()
+        store.add_many(points, OBSTACLE_FORCE, OBSTACLE_ORDER, args.spacing)
+        grid_time = time.perf_counter() - start
+
+        linear_time = None
+        if i < args.linear_frames:
+            start = time.perf_counter()
+            linear = linear_add(linear, points, args.spacing)
+            linear_time = time.perf_counter() - start
+            assert np.array_equal(np.array(linear), store.positions), "The kept obstacles differ"
+
+        if i % max(args.frames // 10, 1) == 0 or i == args.frames - 1:
+            linear_str = '-' if linear_time is None else f'{linear_time * 1e3:.2f} ms'
+            print(f"{i:>6} {len(store):>10} {f'{grid_time * 1e3:.2f} ms':>10} {linear_str:>10}")
+
+    # Range queries and batch removal
+    center = np.array([ROOM_SIZE / 2, ROOM_SIZE / 2])
+    start = time.perf_counter()
+    ids = store.within(center, 150)
+    query_time = time.perf_counter() - start
+    expected = np.flatnonzero(np.linalg.norm(store.positions - center, axis=1) < 150)
+    assert np.array_equal(np.sort(ids), expected), "The range query differs from the brute force"
+
+    for _ in range(10):
+        store.age()
+    store.add_many(rng.uniform(0, ROOM_SIZE, (args.points, 2)), OBSTACLE_FORCE, OBSTACLE_ORDER, args.spacing)
+    before = len(store)
+    start = time.perf_counter()
+    store.cull(5)
+    cull_time = time.perf_counter() - start
+    assert all(len(store.within(pos, 1e-9)) > 0 for pos in store.positions), "The index is stale after the cull"
+
+    print(f"Range query of 150 cm : {query_time * 1e6:.0f} us for {len(ids)} obstacles")
+    print(f"Cull of {before - len(store)} old obstacles out of {before} : {cull_time * 1e3:.2f} ms")
+    print("Accuracy checks passed")
@@ -0,0 +1,100 @@
+"""
+Cost of selecting the next reach point and refreshing the trajectory plot during a turn.
+
+Run from code/software with:
+    python -m benchmarks.trajectory [--steps 12 60 360] [--radius 80]
+
+The robot goes round the object along the circle, 5 cm per planning step. At each step
+the reach points already passed are skipped, the force of the next one is computed and
+the trajectory plot data is refreshed. The legacy layout is a list of (ForcePoint, angle)
+tuples popped from the front, with the angle around the object recomputed for each
+point, and is compared with the Trajectory arrays and their cursor. Both must select
+the same reach points with the same forces.
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from controllers.navigator import ForcePoint, STEP_DISTANCE
+from controllers.trajectory import Trajectory, REACH_FORCE, REACH_DIST_ORDER
+
+
+def trajectory_angle(pos, obj_pos):
+    tracking_vec = pos - obj_pos
+    return math.atan2(tracking_vec[1], tracking_vec[0]) % (2*np.pi)
+
+
+def legacy_step(trajectory, pos, obj_pos):
+    """
+    The selection of Navigator._compute_next_deplacement before the cursor, returns the force of the reach point.
+    """
+    while len(trajectory) > 0:
+        if np.linalg.norm(trajectory[0][0].get_pos() - pos) < STEP_DISTANCE/2 or trajectory_angle(pos, obj_pos) > trajectory[0][1]:
+            trajectory.pop(0)
+        else:
+            return trajectory[0][0].get_contribution(pos)
+    return None
+
+
+def legacy_plot_data(trajectory, pos):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.array([point[0].get_pos() for point in trajectory]), np.array([point[0].get_contribution(pos) for point in trajectory])
+
+
+def cursor_step(trajectory, pos, obj_pos):
+    trajectory.advance(pos, trajectory_angle(pos, obj_pos), STEP_DISTANCE/2)
+    return trajectory.contribution(pos) if len(trajectory) > 0 else None
+
+
+def turn(radius):
+    """
+    Returns the positions of the robot at each planning step of a turn, starting at (0, 0).
+    """
+    angles = np.arange(0, 2 * np.pi, STEP_DISTANCE / radius)
+    return radius * np.stack([np.cos(angles) - 1, np.sin(angles)], axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, nargs='+', default=[12, 60, 360], help='Numbers of reach points of the circle')
+    parser.add_argument('--radius', type=float, default=80, help='Radius of the circle in cm')
+    args = parser.parse_args()
+
+    obj_pos = np.array([-args.radius, 0.])
+    positions = turn(args.radius)
+    print(f"{len(positions)} planning steps per turn")
+    print(f"{'points':>8} {'legacy':>12} {'cursor':>12} {'speedup':>8}")
+    for step_nbr in args.steps:
+        trajectory = Trajectory.circle(args.radius, step_nbr)
+        legacy = [(ForcePoint(pos, REACH_FORCE, REACH_DIST_ORDER), angle) for pos, angle in zip(trajectory.positions, trajectory.angles)]
+
+        legacy_time = cursor_time = 0.
+        for pos in positions:
+            start = time.perf_counter()
+            legacy_dep = legacy_step(legacy, pos, obj_pos)
+            legacy_plot = legacy_plot_data(legacy, pos)
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            cursor_dep = cursor_step(trajectory, pos, obj_pos)
+            cursor_plot = trajectory.positions.copy(), trajectory.contributions(pos)
+            cursor_time += time.perf_counter() - start
+
+            assert len(legacy) == len(trajectory), "The reach points differ"
+            assert (legacy_dep is None) == (cursor_dep is None)
+            if cursor_dep is not None:
+                assert np.allclose(legacy_dep, cursor_dep), "The forces differ"
+                # A point exactly at the position has a nan force with ForcePoint, and none with the arrays
+                assert np.allclose(legacy_plot[0], cursor_plot[0]) and np.allclose(np.nan_to_num(legacy_plot[1]), cursor_plot[1])
+
+        legacy_ms, cursor_ms = legacy_time / len(positions) * 1e3, cursor_time / len(positions) * 1e3
+        print(f"{step_nbr:>8} {f'{legacy_ms:.3f} ms':>12} {f'{cursor_ms:.3f} ms':>12} {legacy_ms / cursor_ms:>7.1f}x")
+
+    # The reach points are evenly spread whatever their number, the first one is the start and the last one closes the circle
+    for step_nbr in (7, 500):
+        trajectory = Trajectory.circle(args.radius, step_nbr)
+        assert len(trajectory) == step_nbr + 1 and np.allclose(np.diff(trajectory.angles[:-1]), 2 * np.pi / step_nbr)
+        assert np.allclose(trajectory.positions[[0, -1]], 0)
+    print("Accuracy checks passed")
@@ -0,0 +1,155 @@
+"""
+Loopback throughput benchmark of the UDP JPEG reassembly.
+
+Run from code/software with:
+    python -m benchmarks.udp_throughput [--duration 5] [--fps 60]
+
+A sender process streams a synthetic JPEG over loopback, split in datagrams like a big
+ESP32-CAM frame would be, while the main process reassembles and decodes the frames.
+The legacy reassembly (growing bytes buffer rescanned from the start) is compared with
+the preallocated JpegAssembler, alone and behind the asyncio StreamHub used by UDPReceiver.
+
+With --recording, a stream recorded with `python -m controllers.udp_recorder record` is
+replayed instead of the synthetic frames, at the pace given by --speed.
+"""
+import argparse
+import multiprocessing
+import socket
+import time
+
+import cv2
+import numpy as np
+
+from controllers.udp_receiver import JpegAssembler, UDPReceiver, MAX_DATAGRAM_SIZE, DEFAULT_BUFFER_SIZE
+from controllers.udp_recorder import UDPReplayer
+
+BENCH_PORT = 12399
+CHUNK_SIZE = 1400
+RESOLUTIONS = [(640, 480), (1600, 1200)]
+
+
+def make_jpeg(width, height, quality=80):
+    """
+    Encodes a textured synthetic image, so that its JPEG size is close to a real camera frame.
+    """
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    img = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def send_frames(jpeg, port, duration, fps):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    chunks = [jpeg[i:i + CHUNK_SIZE] for i in range(0, len(jpeg), CHUNK_SIZE)]
+    period = 1 / fps
+    start = time.perf_counter()
+    next_frame = start
+    while time.perf_counter() - start < duration:
+        for chunk in chunks:
+            sock.sendto(chunk, ('127.0.0.1', port))
+        next_frame += period
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    sock.close()
+
+
+def replay_frames(path, port, duration, speed):
+    replayer = UDPReplayer(path, tcp_port=0, udp_port=port, speed=speed)
+    replayer.start()
+    replayer.set_target('127.0.0.1')
+    time.sleep(duration)
+    replayer.stop()
+
+
+def receive_legacy(sock, deadline):
+    frames = 0
+    bytes_buffer = b''
+    while time.perf_counter() < deadline:
+        try:
+            data, _ = sock.recvfrom(MAX_DATAGRAM_SIZE)
+        except socket.timeout:
+            continue
+        bytes_buffer += data
+        start_index = bytes_buffer.find(b'\xff\xd8')
+        end_index = bytes_buffer.find(b'\xff\xd9')
+        if start_index != -1 and end_index != -1:
+            jpg_frame = bytes_buffer[start_index:end_index + 2]
+            bytes_buffer = bytes_buffer[end_index + 2:]
+            if cv2.imdecode(np.frombuffer(jpg_frame, np.uint8), cv2.IMREAD_COLOR) is not None:
+                frames += 1
+    return frames
+
+
+def receive_assembler(sock, deadline):
+    frames = 0
+    assembler = JpegAssembler()
+    while time.perf_counter() < deadline:
+        try:
+            nbytes, _ = sock.recvfrom_into(assembler.writable(), MAX_DATAGRAM_SIZE)
+        except socket.timeout:
+            continue
+        jpg_frames = assembler.commit(nbytes)
+        if jpg_frames:
+            if cv2.imdecode(np.frombuffer(jpg_frames[-1], np.uint8), cv2.IMREAD_COLOR) is not None:
+                frames += 1
+    return frames
+
+
+def receive_hub(sock, deadline):
+    frames = 0
+    frame_id = 0
+    receiver = UDPReceiver(BENCH_PORT, '127.0.0.1')
+    receiver.udp_sock = sock
+    receiver.hub.add_stream(receiver, sock)
+    while time.perf_counter() < deadline:
+        res = receiver.wait_for_new_frame(frame_id, timeout=0.1)
+        if res is not None:
+            frame_id, _, frame = res
+            if frame is not None:
+                frames += 1
+    receiver.stop()
+    return frames
+
+
+def run(engine, sender_args, duration):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, DEFAULT_BUFFER_SIZE)
+    sock.bind(('127.0.0.1', BENCH_PORT))
+    sock.settimeout(0.1)
+
+    sender = multiprocessing.Process(target=sender_args[0], args=(sender_args[1], BENCH_PORT, duration, sender_args[2]))
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    sender.start()
+    frames = engine(sock, wall_start + duration)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    sender.join()
+    sock.close()
+
+    return frames / wall, (cpu / frames * 1000) if frames else float('nan')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=5, help='Duration of each run in seconds')
+    parser.add_argument('--fps', type=float, default=60, help='Frame rate of the sender')
+    parser.add_argument('--recording', help='Replay this recording instead of synthetic frames')
+    parser.add_argument('--speed', type=float, default=1., help='Replay speed of the recording, 0 for as fast as possible')
+    args = parser.parse_args()
+
+    engines = (('legacy', receive_legacy), ('assembler', receive_assembler), ('hub', receive_hub))
+    if args.recording:
+        print(f"{'engine':>10} {'fps':>8} {'cpu/frame':>10}")
+        for name, engine in engines:
+            fps, cpu_ms = run(engine, (replay_frames, args.recording, args.speed), args.duration)
+            print(f"{name:>10} {fps:8.1f} {f'{cpu_ms:.2f} ms':>10}")
+    else:
+        print(f"{'resolution':>12} {'jpeg size':>10} {'engine':>10} {'fps':>8} {'cpu/frame':>10}")
+        for width, height in RESOLUTIONS:
+            jpeg = make_jpeg(width, height)
+            for name, engine in engines:
+                fps, cpu_ms = run(engine, (send_frames, jpeg, args.fps), args.duration)
+                print(f"{f'{width}x{height}':>12} {f'{len(jpeg) // 1024} KiB':>10} {name:>10} {fps:8.1f} {f'{cpu_ms:.2f} ms':>10}")
@@ -0,0 +1,141 @@
+"""
+Scan time and coverage of the next best view planner against the fixed grids of photos.
+
+Run from code/software with:
+    python -m benchmarks.view_planner [--radius 80] [--targets 0.9 0.95 0.99 1]
+
+The views are replayed on the simulated SS8 with a virtual clock: the arm moves with the
+stepper profiles of the firmware, and parks while the body drives along the circle. The
+coverage is measured on the surface points of synthetic objects: a point is covered once
+seen by MIN_VIEWS cameras under MAX_INCIDENCE, out of the points that all the candidate
+views together cover. The grids are the horizontal x vertical precisions of the app. For
+each grid, a planned scan must cover at least as much in less time.
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from controllers.arm_positions import generate_path
+from controllers.view_planner import (ViewPlanner, camera_positions, body_move_time, MIN_VIEWS, MAX_INCIDENCE,
+                                      STOP_TIME, VIEW_TIME, DEFAULT_OBJECT_HEIGHT)
+from simulation.esp32_server import SimulatedSS8
+
+CLOCK_STEP = 0.01   # Time step of the virtual clock while waiting for the arm in seconds
+GRIDS = [(6, 3), (12, 3), (12, 7)]
+CANDIDATE_ARM_STEPS = 7
+
+
+def box_surface(size, height, count, rng):
+    """
+    Returns points and normals of the faces of a box standing on the ground, except the bottom one.
+    """
+    faces = [(np.array([1., 0, 0]), size / 2), (np.array([-1., 0, 0]), size / 2), (np.array([0, 1., 0]), size / 2),
+             (np.array([0, -1., 0]), size / 2), (np.array([0, 0, 1.]), height)]
+    points, normals = [], []
+    for normal, offset in faces:
+        uv = rng.uniform(-0.5, 0.5, (count // len(faces), 3))
+        p = uv * [size, size, height] + [0, 0, height / 2]
+        axis = np.argmax(np.abs(normal))
+        p[:, axis] = offset if normal[axis] > 0 or axis == 2 else -offset
+        points.append(p)
+        normals.append(np.tile(normal, (len(p), 1)))
+    return np.concatenate(points), np.concatenate(normals)
+
+
+def sphere_surface(radius, count, rng):
+    """
+    Returns points and normals of a ball lying on the ground, without the part hidden by the ground.
+    """
+    normals = rng.normal(size=(count, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = normals[normals[:, 2] > -0.5]
+    return normals * radius + [0, 0, radius], normals
+
+
+def covered(points, normals, cameras):
+    """
+    Returns for each surface point if it is seen by MIN_VIEWS cameras.
+    """
+    to_cam = cameras[None] - points[:, None]
+    to_cam /= np.linalg.norm(to_cam, axis=2, keepdims=True)
+    seen = np.einsum('pcd,pd->pc', to_cam, normals) > math.cos(MAX_INCIDENCE)
+    return seen.sum(axis=1) >= MIN_VIEWS
+
+
+def replay(views, radius):
+    """
+    Replays the views on the simulated SS8, returns the duration of the scan in seconds.
+    """
+    now = [0.]
+    robot = SimulatedSS8(clock=lambda: now[0])
+
+    def goto_arm(x, y):
+        # Same commands as SS8.goto_arm, (0, 0) parks the arm with the angles
+        assert robot.arm_goto(x, y, x == 0 and y == 0), f"Arm position {x}, {y} out of range"
+        while robot.arm_moving():
+            now[0] += CLOCK_STEP
+
+    body_angle = None
+    for angle, arm in views:
+        if angle != body_angle:
+            goto_arm(0, 0)
+            if body_angle is not None:
+                now[0] += body_move_time(radius, angle - body_angle)
+            now[0] += STOP_TIME
+            body_angle = angle
+        goto_arm(*arm)
+        now[0] += VIEW_TIME
+    goto_arm(0, 0)
+    return now[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--radius', type=float, default=80, help='Radius of the circle in cm')
+    parser.add_argument('--targets', type=float, nargs='+', default=[0.9, 0.95, 0.99, 1.], help='Coverage targets of the planner')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    objects = {
+        'box': box_surface(30, DEFAULT_OBJECT_HEIGHT, 5000, rng),
+        'tall box': box_surface(20, 2 * DEFAULT_OBJECT_HEIGHT, 5000, rng),
+        'ball': sphere_surface(DEFAULT_OBJECT_HEIGHT / 2, 5000, rng),
+    }
+
+    plans = {}
+    for horizontal, vertical in GRIDS:
+        angles = np.linspace(0, 2 * math.pi, horizontal, endpoint=False)
+        plans[f'grid {horizontal}x{vertical}'] = ([(a, arm) for a in angles for arm in generate_path(vertical)], 0.)
+    expected = {}
+    for target in args.targets:
+        start = time.perf_counter()
+        planner = ViewPlanner(args.radius, generate_path(CANDIDATE_ARM_STEPS), coverage_target=target)
+        views, expected[target] = planner.plan()
+        plans[f'next best {target:.0%}'] = (views, time.perf_counter() - start)
+
+    # Only the surface seen by enough candidate views can be covered, e.g. not the top of the box
+    cameras = camera_positions(args.radius, planner.body_angles, planner.arm_positions)
+    objects = {name: (points[mask], normals[mask]) for name, (points, normals) in objects.items()
+               for mask in [covered(points, normals, cameras)]}
+
+    print(f"{'plan':>16} {'views':>6} {'stops':>6} {'scan':>9} {'planning':>9} " + ' '.join(f'{name:>9}' for name in objects))
+    results = {}
+    for name, (views, cpu) in plans.items():
+        duration = replay(views, args.radius)
+        cameras = camera_positions(args.radius, np.array([a for a, _ in views]), np.array([arm for _, arm in views]))
+        coverages = [covered(points, normals, cameras).mean() for points, normals in objects.values()]
+        results[name] = (duration, coverages)
+        stops = len(set(a for a, _ in views))
+        print(f"{name:>16} {len(views):>6} {stops:>6} {f'{duration:.0f} s':>9} {f'{cpu * 1e3:.1f} ms':>9} "
+              + ' '.join(f'{c:>9.1%}' for c in coverages))
+    print("Expected durations of the planned scans : " + ', '.join(f'{d:.0f} s' for d in expected.values()))
+
+    # Accuracy checks
+    for grid in (name for name in results if name.startswith('grid')):
+        duration, coverages = results[grid]
+        assert any(d < duration and np.all(np.array(c) >= np.array(coverages) - 0.01)
+                   for name, (d, c) in results.items() if name.startswith('next best')), \
+            f"No planned scan covers as much as the {grid} in less time"
+    print("Accuracy checks passed")
@@ -0,0 +1,105 @@
+"""
+Full scans fast-forwarded on the virtual SS8, across scenarios.
+
+Run from code/software with:
+    python -m benchmarks.virtual_scan [--radius 80] [--scenarios grid-6x3 obstacles-6x3]
+
+Each scenario runs Navigator.start_moving on a VirtualSS8, calibration included, with its
+own precision and dev_config flags. The scan time is the virtual duration of the scan,
+the planner time the CPU time spent choosing the trajectory and the next deplacements,
+and the drift the distance between the dead reckoning and the simulated position at the
+end. The motions pay the latency of the API and the status polls like with the
+MotionDispatcher, so the continuous scenarios compare with the stop-start ones. Every scan must take all its photos with the object in view, without collision, in
+a small fraction of its virtual duration, and drift less than MAX_DRIFT.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import config.dev_config as dconfig
+from controllers.navigator import Navigator
+from simulation.virtual_ss8 import VirtualSS8, Scene, ring_obstacles
+
+MAX_WALL_RATIO = 0.1    # Max wall time of a scan relative to its virtual duration
+MAX_DRIFT = 3           # Max distance in cm between the dead reckoning and the simulated position at the end
+
+# (vertical, horizontal) precision, number of obstacles and dev_config flags of each scenario
+SCENARIOS = {
+    'grid-6x3': ((3, 6), 0, {}),
+    'grid-12x3': ((3, 12), 0, {}),
+    'continuous-12x3': ((3, 12), 0, {'CONTINUOUS_MOTION': True}),
+    'obstacles-6x3': ((3, 6), 6, {'OBSTACLES_AVOIDANCE': True}),
+    'continuous-obstacles-6x3': ((3, 6), 6, {'OBSTACLES_AVOIDANCE': True, 'CONTINUOUS_MOTION': True}),
+    'next-best-view': ((3, 6), 0, {'NEXT_BEST_VIEW': True}),
+}
+
+
+def timed(obj, name, totals):
+    """
+    Wraps the method of the object to add its CPU time to totals[0].
+    """
+    method = getattr(obj, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.process_time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            totals[0] += time.process_time() - start
+    setattr(obj, name, wrapper)
+
+
+def run_scan(radius, precision, obstacle_nbr, flags):
+    """
+    Runs a scan, returns the VirtualSS8, the navigator, the planner CPU time and the wall time in seconds.
+    """
+    defaults = {name: getattr(dconfig, name) for name in flags}
+    for name, value in flags.items():
+        setattr(dconfig, name, value)
+    try:
+        ss8 = VirtualSS8(Scene(radius, obstacles=ring_obstacles(radius, obstacle_nbr, np.random.default_rng(0))))
+        nav = Navigator(ss8, None)
+        nav.set_precision(*precision)
+        if obstacle_nbr > 0:
+            ss8.connect_navigator(nav)
+        planner_time = [0.]
+        timed(nav, '_set_circle_trajectory', planner_time)
+        timed(nav, '_compute_next_deplacement', planner_time)
+
+        start = time.perf_counter()
+        nav.start_moving(lambda: None)
+        return ss8, nav, planner_time[0], time.perf_counter() - start
+    finally:
+        for name, value in defaults.items():
+            setattr(dconfig, name, value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--radius', type=float, default=80, help='Distance to the object in cm')
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS), help='Scenarios to run')
+    args = parser.parse_args()
+
+    dconfig.SKIP_CALLIBRATION_STEP = False
+    dconfig.NAVIGATION_ONLY = False
+
+    results = {}
+    for name in args.scenarios:
+        results[name] = run_scan(args.radius, *SCENARIOS[name])
+
+    print(f"{'scenario':>24} {'scan':>7} {'photos':>7} {'planner':>9} {'wall':>7} {'drift':>8} {'error':>7} {'collisions':>10}")
+    for name, (ss8, nav, planner_time, wall_time) in results.items():
+        errors = [abs(capture['error']) for capture in ss8.captures if capture['error'] is not None]
+        print(f"{name:>24} {f'{ss8.clock():.0f} s':>7} {f'{len(ss8.captures)}/{nav.total_pictures}':>7} "
+              f"{f'{planner_time * 1e3:.0f} ms':>9} {f'{wall_time:.2f} s':>7} {f'{ss8.drift(nav):.1f} cm':>8} "
+              f"{f'{np.mean(errors):.2f}':>7} {ss8.collisions:>10}")
+
+    # Accuracy checks
+    for name, (ss8, nav, planner_time, wall_time) in results.items():
+        assert len(ss8.captures) == nav.total_pictures, f"{name}: photos are missing"
+        assert all(capture['error'] is not None for capture in ss8.captures), f"{name}: the object is out of a photo"
+        assert ss8.collisions == 0, f"{name}: the body hit an obstacle"
+        assert ss8.drift(nav) < MAX_DRIFT, f"{name}: the dead reckoning drifted"
+        assert wall_time < MAX_WALL_RATIO * ss8.clock(), f"{name}: the scan isn't fast-forwarded"
+    print("Accuracy checks passed")
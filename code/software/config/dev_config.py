@@ -13,15 +13,26 @@ DEBUG_SS8 = False
 SKIP_CALLIBRATION_STEP = False
 NAVIGATION_ONLY = False
 OBSTACLES_AVOIDANCE = False
+GRID_PLANNER = True         # Avoid the obstacles along a path planned on the occupancy grid, else with the force field only
+NEXT_BEST_VIEW = False      # Capture the views picked by the view planner instead of the precision grid
+CONTINUOUS_MOTION = False   # Chain the motions of the turn without stopping the wheels in between
+SERPENTINE_ARM = True       # Alternate the direction of the arm sweeps and only park the arm before a collision
+TRACE_SCAN = False          # Record the timeline of the scan to tmp/superscanner8000/scan_trace.json
 
 # Default scanning config
 DEFAULT_VERTICAL_PRECISION = 3
 DEFAULT_HORIZONTAL_PRECISION = 6
-ARM_MOV_WAITING_TIME = 2
+ARM_MOV_WAITING_TIME = 2    # Fixed wait for the motors when their status can't be read, in seconds
+ARM_SETTLE_TIMEOUT = 15     # Max time to wait for the motors and the image to settle before a capture, in seconds
 CENTER_THRESHOLD = 4
-ALIGNMENT_SPEED = 1.5
 ALIGNMENT_WAIT = 2
+ALIGNMENT_TIMEOUT = 20      # Max duration of an alignment in seconds
+ALIGNMENT_KALMAN = False    # Filter and predict the object position during the alignments
 GALERE_TOLERANCE = 3
+NBV_COVERAGE_TARGET = 0.95  # Fraction of the object surface the view planner covers before stopping
+
+# Camera config
+CAM_MAX_FPS = 30
 
 # LEDs config
 LED_BRIGHTNESS = 4
@@ -0,0 +1,91 @@
+import numpy as np
+
+from controllers.view_planner import PARK_POSITION
+
+ARM_CLEARANCE = 15      # Min distance in cm between the arm and an obstacle while the body moves with the arm out
+
+
+def sweep_order(arm_positions, arm_pos):
+    """
+    Returns the arm positions of a reach point in the order of their path or in the reverse one, starting
+    with the end closest to the current arm position. Successive identical sweeps alternate their direction.
+    arm_positions (list): The (x, y) arm positions of the reach point along their path, e.g. from generate_path.
+    arm_pos (np.ndarray): The current (x, y) arm position.
+    """
+    if len(arm_positions) < 2:
+        return list(arm_positions)
+    first, last = np.asarray(arm_positions[0], dtype=float), np.asarray(arm_positions[-1], dtype=float)
+    if np.linalg.norm(last - arm_pos) < np.linalg.norm(first - arm_pos):
+        return list(arm_positions[::-1])
+    return list(arm_positions)
+
+
+def arm_tip_positions(body_positions, obj_pos, arm_x):
+    """
+    Returns the ground positions of the arm along the body positions, the arm x axis points toward the object.
+    body_positions (np.ndarray): The positions of the body in cm, of shape (n, 2).
+    obj_pos (np.ndarray): The position of the object in cm.
+    arm_x (float): The x arm coordinate in cm.
+    """
+    body_positions = np.asarray(body_positions, dtype=float).reshape(-1, 2)
+    to_obj = np.asarray(obj_pos, dtype=float) - body_positions
+    norm = np.linalg.norm(to_obj, axis=1, keepdims=True)
+    return body_positions + arm_x * np.divide(to_obj, norm, out=np.zeros_like(to_obj), where=norm > 0)
+
+
+class ArmSchedule:
+    def __init__(self, clearance=ARM_CLEARANCE):
+        """
+        Order of the arm moves of a scan: the sweep of each reach point starts where the previous one ended, and the
+        arm only goes back to its parking position when it would hit an obstacle while the body moves.
+        Keeps the total arm travel and settle time of the scan.
+        clearance (float): The min distance in cm between the arm and the obstacles while the body moves.
+        """
+        self.clearance = clearance
+        self.arm_pos = np.array(PARK_POSITION, dtype=float)
+        self.parked = True
+        self.travel = 0.        # Distance travelled by the arm in cm
+        self.settle_time = 0.   # Time waited for the arm to settle in seconds
+        self.moves = 0
+        self.parks = 0
+
+    def order(self, arm_positions):
+        """
+        Returns the arm positions of the next reach point in the order of the sweep.
+        """
+        return sweep_order(arm_positions, self.arm_pos)
+
+    def move_to(self, arm_pos):
+        self.travel += float(np.linalg.norm(np.asarray(arm_pos, dtype=float) - self.arm_pos))
+        self.arm_pos = np.array(arm_pos, dtype=float)
+        self.parked = False
+        self.moves += 1
+
+    def park(self):
+        self.move_to(PARK_POSITION)
+        self.parked = True
+        self.parks += 1
+
+    def add_settle_time(self, duration):
+        self.settle_time += duration
+
+    def must_park(self, body_positions, obj_pos, obstacles):
+        """
+        Returns True if the arm out would come closer than the clearance to an obstacle along the body positions.
+        body_positions (np.ndarray): The positions of the body along its next move in cm, of shape (n, 2).
+        obj_pos (np.ndarray): The position of the object in cm.
+        obstacles (ObstacleStore): The obstacles around the body.
+        """
+        if self.parked:
+            return False
+        tips = arm_tip_positions(body_positions, obj_pos, self.arm_pos[0])
+        return any(obstacles.any_within(tip, self.clearance) for tip in tips)
+
+    def as_dict(self):
+        return {'travel_cm': self.travel, 'settle_time_s': self.settle_time, 'moves': self.moves, 'parks': self.parks}
+
+    def summary(self):
+        """
+        Returns a one line summary of the arm moves of the scan, for the debug prints.
+        """
+        return f"arm travel {self.travel:.0f} cm, settle {self.settle_time:.1f} s, {self.moves} moves, {self.parks} parks"
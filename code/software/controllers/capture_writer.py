@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+
+import cv2
+
+from config.dev_config import DEBUG_CAM
+
+DEFAULT_QUEUE_SIZE = 32     # Max number of captures waiting to be written
+DEFAULT_FSYNC_BATCH = 8     # Number of files written before they are synced to the disk
+
+
+class CaptureWriter:
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, fsync_batch=DEFAULT_FSYNC_BATCH):
+        """
+        Writes the captures to the disk in a background thread.
+        The callers only block when the queue is full.
+        queue_size (int): The max number of captures waiting to be written.
+        fsync_batch (int): The number of files synced together, 0 to never sync.
+        """
+        self.queue = queue.Queue(queue_size)
+        self.fsync_batch = fsync_batch
+        self.thread = None
+        self.lock = threading.Lock()  # Lock to start the writer thread once
+
+        self.written_files = 0
+        self.written_bytes = 0
+        self.failed_files = 0
+        self.max_queue_depth = 0
+
+    def _ensure_running(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._write_loop, name="capture-writer", daemon=True)
+                self.thread.start()
+
+    def write_bytes(self, path, data):
+        """
+        Queues already encoded data (e.g. the JPEG received from the camera) to be written verbatim.
+        path (str): The path of the file.
+        data (bytes): The content of the file.
+        """
+        self._put(path, data, None)
+
+    def write_png(self, path, img):
+        """
+        Queues an image to be PNG encoded and written in the background.
+        The image must not be modified in place afterwards.
+        path (str): The path of the file.
+        img (cv2.typing.MatLike): The image to encode.
+        """
+        self._put(path, None, img)
+
+    def _put(self, path, data, img):
+        self._ensure_running()
+        self.queue.put((path, data, img))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def queue_depth(self):
+        """
+        Returns the number of captures waiting to be written.
+        """
+        return self.queue.unfinished_tasks
+
+    def flush(self):
+        """
+        Blocks until all the queued captures are written and synced.
+        """
+        if self.thread is not None:
+            self.queue.join()
+
+    def _write_loop(self):
+        unsynced = []
+        while True:
+            path, data, img = self.queue.get()
+            try:
+                if img is not None:
+                    success, buffer = cv2.imencode('.png', img)
+                    if not success:
+                        raise ValueError("PNG encoding failed")
+                    data = buffer.tobytes()
+
+                file = open(path, 'wb')
+                try:
+                    file.write(data)
+                except Exception:
+                    file.close()
+                    raise
+                self.written_files += 1
+                self.written_bytes += len(data)
+
+                if self.fsync_batch > 0:
+                    unsynced.append(file)
+                else:
+                    file.close()
+            except Exception as e:
+                self.failed_files += 1
+                print(f"Error while writing {path}: {e}")
+
+            # Sync when the batch is full or the queue is empty, before marking the capture as done
+            # so that flush() also waits for the disk
+            if unsynced and (len(unsynced) >= self.fsync_batch or self.queue.unfinished_tasks == 1):
+                self._sync(unsynced)
+                unsynced = []
+            self.queue.task_done()
+
+    def _sync(self, files):
+        for file in files:
+            try:
+                file.flush()
+                os.fsync(file.fileno())
+            except OSError as e:
+                print(f"Error while syncing {file.name}: {e}")
+            finally:
+                file.close()
+
+        if DEBUG_CAM:
+            print(f"Synced {len(files)} captures to the disk")
+
+
+capture_writer = CaptureWriter() # Shared by the receivers and the segmenter
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from controllers.stream_metrics import Histogram
+from controllers.tracer import tracer
+
+DEFAULT_TIMEOUT = (1, 2)    # (connect, read) timeouts in seconds
+DEFAULT_RETRIES = 2         # Max number of retries of a failed request
+DEFAULT_POOL_SIZE = 4       # Max number of kept alive connections
+RETRY_BACKOFF = 0.05        # Base delay between the retries in seconds
+
+# Read timeouts of the routes that take longer than the default to answer
+ROUTE_TIMEOUTS = {
+    "/arm/goto": (1, 3),    # Solves the inverse kinematics before answering
+    "/text": (1, 3),        # The LCD is written before answering
+    "/progress": (1, 3),
+    "/scroll": (1, 3),
+}
+
+# Routes that can be sent twice without side effects, so they are also retried when the answer is lost.
+# The other routes are only retried when the connection failed, i.e. when the request was never received.
+IDEMPOTENT_ROUTES = {
+    "/status", "/stp", "/speed",
+    "/arm/status", "/arm/goto", "/arm/stp",
+    "/cam/status", "/cam/goto", "/cam/stp",
+    "/text", "/progress", "/scroll",
+    "/led/set", "/led/rainbow",
+}
+
+
+def _never_sent(error):
+    """
+    Returns True if the request failed before reaching the ESP32-S2, in which case any route can be retried.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class CommandClient:
+    def __init__(self, base_url=None, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES):
+        """
+        HTTP client of the SS8 control API keeping its connections alive.
+        base_url (str): The URL of the ESP32-S2, can be set later with set_base_url.
+        pool_size (int): The max number of connections kept alive.
+        retries (int): The max number of retries of a failed request.
+        """
+        self.base_url = base_url
+        self.retries = retries
+        self.session = requests.Session()
+        # The retries are all done by request, urllib3 doesn't retry on its own
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+
+        self.lock = threading.Lock()
+        self.latencies = {}     # route -> Histogram of the round trips in ms
+        self.errors = {}        # route -> number of failed requests
+
+    def set_base_url(self, base_url):
+        self.base_url = base_url
+
+    def post(self, route, json=None, timeout=None):
+        """
+        Sends a POST request to the given route.
+        route (str): The route, e.g. "/fwd".
+        json (dict): The body of the request.
+        timeout (tuple): The (connect, read) timeouts, the timeout of the route if None.
+        Returns:
+            requests.Response: The response.
+        """
+        return self.request("POST", route, json, timeout)
+
+    def get(self, route, timeout=None):
+        return self.request("GET", route, None, timeout)
+
+    def request(self, method, route, json=None, timeout=None):
+        if timeout is None:
+            timeout = ROUTE_TIMEOUTS.get(route, DEFAULT_TIMEOUT)
+        attempts = 1 + self.retries
+
+        with tracer.span(route, 'http', method=method) as span:
+            for attempt in range(attempts):
+                start = time.perf_counter()
+                try:
+                    res = self.session.request(method, self.base_url + route, json=json, timeout=timeout)
+                except (requests.ConnectionError, requests.Timeout) as error:
+                    self._record(route, None)
+                    if attempt == attempts - 1 or (route not in IDEMPOTENT_ROUTES and not _never_sent(error)):
+                        raise
+                    time.sleep(RETRY_BACKOFF * 2**attempt)
+                    continue
+
+                self._record(route, time.perf_counter() - start)
+                span.set(status=res.status_code, attempts=attempt + 1)
+                return res
+
+    def _record(self, route, duration):
+        with self.lock:
+            if duration is None:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            else:
+                self.latencies.setdefault(route, Histogram()).add(duration * 1000)
+
+    def snapshot(self):
+        """
+        Returns the latency histograms and error counts of each route as a JSON serializable dict.
+        """
+        with self.lock:
+            routes = set(self.latencies) | set(self.errors)
+            return {
+                route: {
+                    'latency': self.latencies[route].snapshot() if route in self.latencies else None,
+                    'errors': self.errors.get(route, 0),
+                }
+                for route in sorted(routes)
+            }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,164 @@
+import collections
+import threading
+import time
+
+from config.dev_config import DEBUG_SS8
+
+# Slot of each coalesced route, a queued command is replaced by the next one sent to the same slot
+COMMAND_SLOTS = {
+    "/cam/goto": "cam",
+    "/arm/goto": "arm",
+    "/led/set": "led",
+    "/led/rainbow": "led",
+    "/led/flash": "flash",
+    "/text": "display",
+    "/progress": "display",
+    "/scroll": "display",
+}
+
+# Slots holding a state of the SS8, a command setting the state it already has is dropped
+STATE_SLOTS = {"led", "display"}
+
+# Min time between two commands of the cosmetic routes in seconds, the latest one is sent when it expires
+RATE_LIMITS = {
+    "/led/flash": 0.5,
+    "/progress": 0.25,
+}
+
+
+class CommandCoalescer:
+    def __init__(self, send_func, rate_limits=RATE_LIMITS):
+        """
+        Sends the SS8 output commands in order from a background thread, merging the ones that are superseded
+        before they are sent: a camera or arm target replaces the queued one, a LED or display state already
+        shown is dropped and the cosmetic commands are rate limited.
+        send_func (function): Sends a command, called with the route and the JSON body.
+        rate_limits (dict): The min time between two commands of a route in seconds.
+        """
+        self.send_func = send_func
+        self.rate_limits = rate_limits
+
+        self.cond = threading.Condition()
+        self.pending = collections.OrderedDict()   # slot -> (route, json, not_before, on_sent)
+        self.in_flight = 0
+        self.last_state = {}                        # slot -> (route, json) last sent
+        self.last_sent_time = {}                    # slot -> time.monotonic() of the last sent command
+        self.thread = None
+
+        self.requested = 0      # Commands given to send
+        self.sent = 0           # Requests actually sent
+        self.merged = 0         # Commands replaced by a newer one before being sent
+        self.deduplicated = 0   # Commands dropped because the SS8 already is in that state
+
+    def send(self, route, json=None, on_sent=None):
+        """
+        Queues a command, it is sent after the ones already queued unless superseded. A command replacing a
+        queued one takes its place at the end of the queue.
+        route (str): The route of the command.
+        json (dict): The body of the command.
+        on_sent (function): Called once the command is sent, not called if it is merged or dropped.
+        """
+        slot = COMMAND_SLOTS.get(route)
+        with self.cond:
+            self.requested += 1
+            if slot is None:
+                slot = object() # Never coalesced
+
+            if slot in STATE_SLOTS and self.last_state.get(slot) == (route, json):
+                if slot in self.pending:
+                    # Going back to the current state cancels the queued change
+                    del self.pending[slot]
+                    self.merged += 1
+                self.deduplicated += 1
+                return
+
+            if slot in self.pending:
+                self.merged += 1
+            not_before = self.last_sent_time.get(slot, 0.) + self.rate_limits.get(route, 0.)
+            self.pending[slot] = (route, json, not_before, on_sent)
+            # The command replacing a queued one is sent after the commands queued before it
+            self.pending.move_to_end(slot)
+            self._ensure_running()
+            self.cond.notify()
+
+    def reset(self):
+        """
+        Forgets the state of the SS8, e.g. after a reconnection, so that the next state commands are sent.
+        """
+        with self.cond:
+            self.last_state.clear()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until all the queued commands are sent, including the rate limited ones.
+        timeout (float): The maximum time to wait in seconds, None to wait forever.
+        Returns:
+            bool: False if the timeout expired.
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and self.in_flight == 0, timeout)
+
+    def snapshot(self):
+        """
+        Returns the counters of the requests saved by the coalescing.
+        """
+        with self.cond:
+            return {
+                'requested': self.requested,
+                'sent': self.sent,
+                'saved': self.requested - self.sent - len(self.pending) - self.in_flight,
+                'merged': self.merged,
+                'deduplicated': self.deduplicated,
+                'pending': len(self.pending),
+            }
+
+    def _ensure_running(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._send_loop, name="command-coalescer", daemon=True)
+            self.thread.start()
+
+    def _next_ready(self):
+        """
+        Returns the first queued command whose rate limit expired, or the time to wait for one.
+        """
+        now = time.monotonic()
+        next_time = None
+        for slot, (route, json, not_before, on_sent) in self.pending.items():
+            if not_before <= now:
+                del self.pending[slot]
+                return slot, route, json, on_sent
+            next_time = not_before if next_time is None else min(next_time, not_before)
+        return next_time
+
+    def _send_loop(self):
+        while True:
+            with self.cond:
+                while True:
+                    ready = self._next_ready()
+                    if isinstance(ready, tuple):
+                        break
+                    self.cond.wait(None if ready is None else max(ready - time.monotonic(), 0))
+                slot, route, json, on_sent = ready
+                self.in_flight += 1
+                if slot in COMMAND_SLOTS.values():
+                    self.last_sent_time[slot] = time.monotonic()
+
+            success = False
+            try:
+                self.send_func(route, json)
+                success = True
+                if on_sent is not None:
+                    on_sent()
+            except Exception as e:
+                print(f"An error occurred when sending {route}: {e}")
+
+            with self.cond:
+                # Only a state the SS8 received is deduplicated, a failed one is sent again when asked
+                if success and slot in STATE_SLOTS:
+                    self.last_state[slot] = (route, json)
+                self.in_flight -= 1
+                self.sent += 1
+                self.cond.notify_all()
+
+            if DEBUG_SS8:
+                print(f"Sent {route} {json}")
@@ -0,0 +1,261 @@
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+
+from controllers.stream_metrics import Histogram
+from controllers.tracer import tracer
+
+DEFAULT_RESOLUTION = 5          # Side of a cell in cm, the same as the occupancy grid
+DEFAULT_ROBOT_RADIUS = 15       # The obstacles are inflated by this radius in cm
+DEFAULT_SEARCH_RADIUS = 300     # The search is bounded to this distance around the goal in cm
+DEFAULT_MAX_EXPANSIONS = 5000   # Max cells expanded per replanning, the search resumes on the next call
+
+SQRT2 = math.sqrt(2)
+NEIGHBORS = [(-1, -1, SQRT2), (-1, 0, 1.), (-1, 1, SQRT2), (0, -1, 1.),
+             (0, 1, 1.), (1, -1, SQRT2), (1, 0, 1.), (1, 1, SQRT2)]
+INF = float('inf')
+KEY_DECIMALS = 9    # The keys are rounded so that equal path costs summed in another order compare equal
+
+
+def inflate(cells, radius):
+    """
+    Returns the set of cells closer than radius (in cells) to any of the given cells.
+    cells (np.ndarray): The (i, j) cells, of shape (n, 2).
+    radius (float): The inflation radius in cells.
+    """
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+    r = int(math.ceil(radius))
+    di, dj = np.mgrid[-r:r + 1, -r:r + 1]
+    disk = np.stack([di.ravel(), dj.ravel()], axis=1)
+    disk = disk[np.hypot(disk[:, 0], disk[:, 1]) <= radius]
+    inflated = np.unique((cells[:, None, :] + disk[None]).reshape(-1, 2), axis=0)
+    return set(map(tuple, inflated.tolist()))
+
+
+class DStarLite:
+    def __init__(self, max_expansions=DEFAULT_MAX_EXPANSIONS, search_radius=INF):
+        """
+        D* Lite search on an 8-connected grid (Koenig and Likhachev). The costs are searched from the goal,
+        so that when the start moves or cells change, only the affected part of the search is repaired.
+        max_expansions (int): The max number of cells expanded per call of compute.
+        search_radius (float): The cells farther than this from the goal, in cells, are blocked.
+        """
+        self.max_expansions = max_expansions
+        self.search_radius = search_radius
+        self.blocked = set()
+        self.start = None
+        self.goal = None
+        self.expansions = 0     # Cells expanded by the last compute
+
+    def reset(self, start, goal, blocked):
+        """
+        Starts a new search.
+        start (tuple): The start cell.
+        goal (tuple): The goal cell.
+        blocked (set): The cells that can't be crossed.
+        """
+        self.start = start
+        self.goal = goal
+        self.blocked = blocked
+        self.last_start = start
+        self.km = 0.
+        self.g = {}
+        self.rhs = {goal: 0.}
+        self.open = {}          # cell -> key of its up to date entry in the heap
+        self.heap = []
+        self._push(goal)
+
+    @staticmethod
+    def heuristic(a, b):
+        di, dj = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return max(di, dj) + (SQRT2 - 1) * min(di, dj)
+
+    def is_blocked(self, cell):
+        return (cell in self.blocked or abs(cell[0] - self.goal[0]) > self.search_radius
+                or abs(cell[1] - self.goal[1]) > self.search_radius)
+
+    def _key(self, cell):
+        m = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        return (round(m + self.heuristic(self.start, cell) + self.km, KEY_DECIMALS), round(m, KEY_DECIMALS))
+
+    def _push(self, cell):
+        key = self._key(cell)
+        self.open[cell] = key
+        heapq.heappush(self.heap, (key, cell))
+
+    def _best_neighbor(self, cell):
+        """
+        Returns the neighbor minimizing the step cost plus its cost to the goal, and that sum.
+        """
+        g = self.g
+        best, best_cost = None, INF
+        i, j = cell
+        for di, dj, step in NEIGHBORS:
+            n = (i + di, j + dj)
+            cost = g.get(n, INF) + step
+            # Most neighbors are unexplored, the blocked check is only done for the improving ones
+            if cost < best_cost and not self.is_blocked(n):
+                best, best_cost = n, cost
+        return best, best_cost
+
+    def _update_vertex(self, cell):
+        if cell != self.goal:
+            self.rhs[cell] = INF if self.is_blocked(cell) else self._best_neighbor(cell)[1]
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            self._push(cell)
+        else:
+            self.open.pop(cell, None)
+
+    def _top_key(self):
+        # Drop the entries superseded by a newer push or removed from the open list
+        while self.heap and self.open.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else (INF, INF)
+
+    def move_start(self, start):
+        """
+        Moves the start of the search, e.g. to the new position of the robot.
+        """
+        self.km += self.heuristic(self.last_start, start)
+        self.last_start = start
+        self.start = start
+
+    def set_blocked(self, blocked):
+        """
+        Replaces the blocked cells and repairs the search around the cells that changed.
+        """
+        changed = blocked ^ self.blocked
+        self.blocked = blocked
+        for cell in changed:
+            self._update_vertex(cell)
+            for di, dj, _ in NEIGHBORS:
+                self._update_vertex((cell[0] + di, cell[1] + dj))
+
+    def compute(self):
+        """
+        Expands the cells until the cost of the start is known, or max_expansions is reached.
+        Returns:
+            bool: True if the search is complete, the start may still be unreachable.
+        """
+        self.expansions = 0
+        while (self._top_key() < self._key(self.start)
+               or self.rhs.get(self.start, INF) != self.g.get(self.start, INF)):
+            if self.expansions >= self.max_expansions:
+                return False
+            self.expansions += 1
+
+            k_old, cell = heapq.heappop(self.heap)
+            k_new = self._key(cell)
+            if k_old < k_new:
+                self._push(cell)
+                continue
+            del self.open[cell]
+
+            if self.g.get(cell, INF) > self.rhs[cell]:
+                self.g[cell] = self.rhs[cell]
+            else:
+                self.g[cell] = INF
+                self._update_vertex(cell)
+            for di, dj, _ in NEIGHBORS:
+                self._update_vertex((cell[0] + di, cell[1] + dj))
+        return True
+
+    def path(self, max_length=10000):
+        """
+        Returns the cells from the start to the goal following the computed costs, None if there is no path.
+        """
+        if self.g.get(self.start, INF) == INF or self.is_blocked(self.start):
+            return None
+        cell = self.start
+        path = [cell]
+        visited = {cell}
+        while cell != self.goal and len(path) < max_length:
+            best, _ = self._best_neighbor(cell)
+            if best is None or best in visited:
+                return None
+            visited.add(best)
+            cell = best
+            path.append(cell)
+        return path if cell == self.goal else None
+
+    def cost(self):
+        return self.g.get(self.start, INF)
+
+
+class GridPlanner:
+    def __init__(self, resolution=DEFAULT_RESOLUTION, robot_radius=DEFAULT_ROBOT_RADIUS,
+                 search_radius=DEFAULT_SEARCH_RADIUS, max_expansions=DEFAULT_MAX_EXPANSIONS):
+        """
+        Collision free paths on the occupancy map, repaired incrementally when the obstacles change.
+        The cells are absolute (floor of the world position / resolution), so that the rolling window
+        of the occupancy grid doesn't invalidate the search.
+        resolution (float): The side of a cell in cm.
+        robot_radius (float): The obstacles are inflated by this radius in cm.
+        search_radius (float): The cells farther than this from the goal (in cm) are not explored.
+        max_expansions (int): The max number of cells expanded per replanning, to bound its latency.
+        """
+        self.resolution = resolution
+        self.robot_radius = robot_radius
+        self.blocked = set()
+        self.pending = None     # Blocked cells received since the last plan
+        self.lock = threading.Lock()
+        self.search = DStarLite(max_expansions, search_radius / resolution)
+        self.latency = Histogram()
+        self.replans = 0
+        self.repairs = 0
+
+    def to_cell(self, pos):
+        return (math.floor(pos[0] / self.resolution), math.floor(pos[1] / self.resolution))
+
+    def to_world(self, cell):
+        return np.array([(cell[0] + 0.5) * self.resolution, (cell[1] + 0.5) * self.resolution])
+
+    def set_obstacles(self, points):
+        """
+        Sets the occupied points (in cm), e.g. OccupancyGrid.occupied_points(). They are inflated by the robot
+        radius and applied on the next plan. Can be called from another thread.
+        """
+        cells = np.floor(np.asarray(points, dtype=float).reshape(-1, 2) / self.resolution)
+        blocked = inflate(cells, self.robot_radius / self.resolution) if len(cells) > 0 else set()
+        with self.lock:
+            self.pending = blocked
+
+    def plan(self, start, goal):
+        """
+        Returns the path from start to goal as world positions (cm), None if it is unreachable or if the search
+        needs more than max_expansions, in which case it goes on at the next call.
+        start (np.ndarray): The position of the robot.
+        goal (np.ndarray): The position to reach.
+        """
+        begin = time.perf_counter()
+        with tracer.span('replan', 'planning') as span:
+            start_cell, goal_cell = self.to_cell(start), self.to_cell(goal)
+            with self.lock:
+                pending, self.pending = self.pending, None
+            if pending is not None:
+                self.blocked = pending
+
+            if self.search.goal != goal_cell:
+                self.search.reset(start_cell, goal_cell, self.blocked)
+                self.replans += 1
+            else:
+                if start_cell != self.search.start:
+                    self.search.move_start(start_cell)
+                if pending is not None:
+                    self.search.set_blocked(self.blocked)
+                    self.repairs += 1
+
+            complete = self.search.compute()
+            path = self.search.path() if complete else None
+            span.set(expansions=self.search.expansions, complete=complete)
+
+        self.latency.add((time.perf_counter() - begin) * 1000)
+        if path is None:
+            return None
+        return np.array([self.to_world(cell) for cell in path])
+
+    def is_blocked(self, pos):
+        return self.to_cell(pos) in self.blocked
@@ -4,7 +4,10 @@ import cv2
 from sam2 import build_sam
 import os, tempfile, shutil
 import base64
+import threading
 from config.dev_config import DEBUG_CAM
+from controllers.capture_writer import capture_writer
+from controllers.tracer import tracer
 
 # use bfloat16 for the entire notebook
 torch.autocast(device_type="cuda", dtype=torch.bfloat16).__enter__()
@@ -19,6 +22,8 @@ class ImageSegmenter:
         self.is_init = False
         self.expand_pixels = expand_pixels  
         self.all_mask = None
+        self.mask_frame_id = None  # Id of the camera frame the current mask was computed on
+        self.lock = threading.Lock()  # The preview and the navigation threads both propagate
         self.frame_counter = 0
 
     def initialize(self, frame, points=None, bbox=None):
@@ -27,6 +32,7 @@ class ImageSegmenter:
 
         self.predictor.load_first_frame(frame)
         self.is_init = True
+        self.mask_frame_id = None
 
         ann_frame_idx = 0  # the frame index we interact with
         ann_obj_id = 1  # give a unique id to each object we interact with (it can be any integers)
@@ -46,10 +52,19 @@ class ImageSegmenter:
         center_point = np.array([[width // 2, height // 2]], dtype=np.float32)
         self.initialize(frame, points=center_point)
 
-    def propagate(self, img:cv2.typing.MatLike):
+    def propagate(self, img:cv2.typing.MatLike, frame_id=None):
         """
         Get the mask for the given image
+            frame_id (int): The id of the camera frame. If the mask was already computed for it, it is reused.
         """
+        with self.lock:
+            if frame_id is None or frame_id != self.mask_frame_id:
+                with tracer.span('propagate', 'segmentation', frame_id=frame_id):
+                    self._track(img)
+                self.mask_frame_id = frame_id
+            return cv2.cvtColor(self.all_mask, cv2.COLOR_GRAY2RGB)
+
+    def _track(self, img:cv2.typing.MatLike):
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         out_obj_ids, out_mask_logits = self.predictor.track(img)
 
@@ -64,16 +79,16 @@ class ImageSegmenter:
             all_mask = cv2.bitwise_or(all_mask, out_mask)
 
         self.all_mask = all_mask
-        return cv2.cvtColor(self.all_mask, cv2.COLOR_GRAY2RGB)
     
-    def mask_img(self, img:cv2.typing.MatLike) -> cv2.typing.MatLike:
+    def mask_img(self, img:cv2.typing.MatLike, frame_id=None) -> cv2.typing.MatLike:
         """
         Masks the given image with the object mask.
             img (cv2.typing.MatLike): The image to mask.
+            frame_id (int): The id of the camera frame, to reuse its mask if already computed.
         """
 
         # Only keep pixels from frame that are selected in all_mask
-        mask = cv2.cvtColor(self.propagate(img), cv2.COLOR_RGB2GRAY)
+        mask = cv2.cvtColor(self.propagate(img, frame_id), cv2.COLOR_RGB2GRAY)
         return cv2.bitwise_and(img, img, mask=mask)
     
     def save_mask(self):
@@ -85,6 +100,7 @@ class ImageSegmenter:
             if not os.path.exists(temp_dir):
                 os.makedirs(temp_dir)
             elif self.frame_counter == 0:
+                capture_writer.flush()
                 shutil.rmtree(temp_dir)
                 os.makedirs(temp_dir)
             else:
@@ -93,22 +109,22 @@ class ImageSegmenter:
             # Construct the full path for the file with a numbered filename
             filename = f"{self.frame_counter}.mask.png"
             temp_file_path = os.path.join(temp_dir, filename)
-            # Save theself.current_frame to the temporary folder
-            cv2.imwrite(temp_file_path, self.all_mask)
+            # Queue the mask to be encoded and written to the temporary folder, it is replaced and never modified in place
+            capture_writer.write_png(temp_file_path, self.all_mask)
             if DEBUG_CAM:
-                print(f"Saved self.all_mask {self.frame_counter} to {temp_file_path}")
+                print(f"Queued self.all_mask {self.frame_counter} to {temp_file_path}")
             # Increment theself.current_frame counter
             self.frame_counter += 1
         else:
             if DEBUG_CAM:
                 print("No frame available to save.")
         
-    def get_object_coords(self, img, update_mask=False):
+    def get_object_coords(self, img, update_mask=False, frame_id=None):
         """
         Get the coordinates of the object in the image.
         """
         if update_mask:
-            self.propagate(img)
+            self.propagate(img, frame_id)
         
         if self.all_mask is None: #TODO: Check with Mateo
             return None
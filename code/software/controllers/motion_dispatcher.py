@@ -0,0 +1,229 @@
+import queue
+import threading
+import time
+
+from config.dev_config import DEBUG_SS8
+
+STATUS_POLL_PERIOD = 0.05   # Time between two /status requests in seconds
+STATUS_POLL_LEAD = 0.1      # Start polling this long before the expected end of the motion, in seconds
+STATUS_TIMEOUT = 1.         # Time after the expected end after which the motion is considered done, in seconds
+CONTINUOUS_OVERLAP = 0.1    # A continuous motion lasts this much longer on the SS8, so that the next one takes over before it stops, in seconds
+
+
+class MotionHandle:
+    def __init__(self, route, ms, continuous=False):
+        """
+        Handle on a motion command, returned by MotionDispatcher.submit.
+        route (str): The route of the command, e.g. "/fwd".
+        ms (float): The duration of the motion in milliseconds.
+        continuous (bool): If the next motion takes over without the wheels stopping in between.
+        """
+        self.route = route
+        self.ms = ms
+        self.continuous = continuous
+        self.start_time = None  # time.monotonic() when the command was sent
+        self.sent = False       # False if only the duration of the motion is waited
+        self.end_time = None    # time.monotonic() when the motion was detected as done
+        self.cancelled = False
+        self.finished = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def done(self):
+        """
+        Returns True if the motion is finished or was cancelled.
+        """
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the motion is finished or cancelled.
+        timeout (float): The maximum time to wait in seconds, None to wait forever.
+        Returns:
+            bool: True if the motion completed, False if it was cancelled or the timeout expired.
+        """
+        return self.finished.wait(timeout) and not self.cancelled
+
+    def then(self, callback):
+        """
+        Calls the given function with this handle once the motion is finished or cancelled.
+        The callback is called right away if it already is.
+        callback (function): The function to call.
+        Returns:
+            MotionHandle: This handle, to chain the calls.
+        """
+        with self.lock:
+            if not self.finished.is_set():
+                self.callbacks.append(callback)
+                return self
+        callback(self)
+        return self
+
+    def _finish(self, cancelled=False):
+        with self.lock:
+            if self.finished.is_set():
+                return
+            self.cancelled = cancelled
+            self.end_time = time.monotonic()
+            self.finished.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class MotionDispatcher:
+    def __init__(self, send_func, status_func, on_motion=lambda: None):
+        """
+        Sends the timed motion commands one after the other in a background thread, so that the caller
+        can plan, capture or segment while the SS8 moves.
+        The end of a motion is detected by polling /status, or from its duration when the status is unavailable.
+        send_func (function): Sends a command, called with the route and the JSON body.
+        status_func (function): Returns the direction of the wheels ("stop" when idle), None if unavailable.
+        on_motion (function): Called when a motion starts and when it ends.
+        """
+        self.send_func = send_func
+        self.status_func = status_func
+        self.on_motion = on_motion
+
+        self.queue = queue.Queue()
+        self.current = None
+        self.generation = 0     # Incremented by cancel_all, the motions queued before are skipped
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()   # A motion is either sent before its cancel or not sent at all
+        self.thread = None
+
+    def submit(self, route, ms, send=True, continuous=False):
+        """
+        Queues a timed motion command after the ones already queued.
+        route (str): The route of the command, e.g. "/fwd".
+        ms (float): The duration of the motion in milliseconds.
+        send (bool): If False, the command is not sent and only its duration is waited, e.g. when the SS8 can't move.
+        continuous (bool): If True, the next motion is sent at the expected end of this one instead of once the
+            wheels stopped. The SS8 runs it CONTINUOUS_OVERLAP longer, so it must be followed by a motion or a stop.
+        Returns:
+            MotionHandle: The handle on the motion.
+        """
+        handle = MotionHandle(route, ms, continuous)
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._dispatch_loop, name="motion-dispatcher", daemon=True)
+                self.thread.start()
+            self.queue.put((handle, send, self.generation))
+        return handle
+
+    def cancel(self, handle, stop=True):
+        """
+        Cancels the given motion, the SS8 is stopped if it is the current one.
+        stop (bool): If False, the SS8 is not stopped, e.g. when the caller stops it itself.
+        Returns:
+            bool: True if the motion was running or queued.
+        """
+        if handle.done():
+            return False
+        with self.lock:
+            is_current = handle is self.current
+        with self.send_lock:
+            # A queued motion is skipped by the dispatch loop
+            handle._finish(cancelled=True)
+            if is_current and handle.sent and stop:
+                self.send_func("/stp", None)
+        return True
+
+    def cancel_all(self, stop=True):
+        """
+        Cancels the current and the queued motions.
+        stop (bool): If False, the SS8 is not stopped, e.g. when the caller stops it itself.
+        """
+        with self.lock:
+            # A motion already taken from the queue by the dispatch loop but not started yet is skipped too
+            self.generation += 1
+        while True:
+            try:
+                handle, _, _ = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            handle._finish(cancelled=True)
+            self.queue.task_done()
+
+        with self.lock:
+            current = self.current
+        if current is not None:
+            self.cancel(current, stop)
+
+    def idle(self):
+        """
+        Returns True if no motion is running or queued.
+        """
+        return self.queue.unfinished_tasks == 0
+
+    def wait_idle(self):
+        """
+        Blocks until all the queued motions are finished.
+        """
+        self.queue.join()
+
+    def _dispatch_loop(self):
+        while True:
+            handle, send, generation = self.queue.get()
+            with self.lock:
+                cancelled = generation != self.generation
+                started = not cancelled and not handle.done()
+                if started:
+                    self.current = handle
+            if cancelled:
+                handle._finish(cancelled=True)
+            elif started:
+                try:
+                    self._run(handle, send)
+                except Exception as e:
+                    print(f"An error occurred during the motion {handle.route}: {e}")
+                finally:
+                    with self.lock:
+                        self.current = None
+                    handle._finish()
+                    self.on_motion()
+            self.queue.task_done()
+
+    def _run(self, handle, send):
+        handle.start_time = time.monotonic()
+        with self.send_lock:
+            handle.sent = send and not handle.done()
+            if handle.sent:
+                overlap = CONTINUOUS_OVERLAP * 1000 if handle.continuous else 0
+                self.send_func(handle.route, {"ms": handle.ms + overlap})
+        self.on_motion()
+        expected_end = handle.start_time + handle.ms * 0.001
+
+        if DEBUG_SS8:
+            print(f"Started {handle.route} for {handle.ms:.0f} ms")
+
+        if handle.continuous:
+            # The next motion replaces this one on the SS8 without stopping the wheels
+            self._sleep_until(handle, expected_end)
+            return
+
+        # Nothing to poll before the end of the motion given by the time model
+        if self._sleep_until(handle, expected_end - STATUS_POLL_LEAD) or not send:
+            self._sleep_until(handle, expected_end)
+            return
+
+        while not handle.done():
+            direction = self.status_func()
+            if direction is None:
+                # Fall back to the time model
+                self._sleep_until(handle, expected_end)
+                return
+            if direction == "stop" or time.monotonic() > expected_end + STATUS_TIMEOUT:
+                return
+            handle.finished.wait(STATUS_POLL_PERIOD)
+
+    def _sleep_until(self, handle, deadline):
+        """
+        Sleeps until the deadline or until the motion is cancelled.
+        Returns:
+            bool: True if the motion was cancelled.
+        """
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            return handle.finished.wait(delay)
+        return handle.done()
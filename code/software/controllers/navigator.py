@@ -2,11 +2,22 @@ import math
 import numpy as np
 import asyncio
 import time
+from typing import TYPE_CHECKING
 
 import config.dev_config as dconfig
 from controllers.arm_positions import generate_path
-from controllers.ss8 import SS8
-from controllers.image_segmenter import ImageSegmenter
+from controllers.arm_schedule import ArmSchedule
+from controllers.ss8 import SS8, TRACK_WIDTH, MAX_DUTY_CYCLE
+from controllers.obstacle_store import ObstacleStore
+from controllers.occupancy_grid import OccupancyGrid
+from controllers.grid_planner import GridPlanner
+from controllers.trajectory import Trajectory
+from controllers.view_planner import ViewPlanner
+from controllers.tracer import tracer
+
+if TYPE_CHECKING:
+    # Only for the annotations, the segmenter loads torch
+    from controllers.image_segmenter import ImageSegmenter
 
 
 STEP_DISTANCE = 5
@@ -14,23 +25,38 @@ DEFAULT_CALLIBRATION_DISTANCE = 50
 DEFAULT_CALLIBRATION_ITERATION = 3
 CENTER_THRESHOLD = 25
 ANGLE_TOLERANCE = 0.05
+OBSTACLE_FORCE = -100000
+OBSTACLE_DIST_ORDER = 3
+OBSTACLE_MIN_SPACING = 20 # Min distance between two obstacles in cm, closer detections are merged
+MAX_OBSTACLE_AGE = 50 # Number of planning steps an obstacle is kept
+OBSTACLE_RANGE = 150 # Distance in cm beyond which the force of an obstacle is negligible
+PLANNER_LOOKAHEAD = 2 # Number of cells of the planned path ahead of the ss8 to aim at
+VIEW_ARM_STEPS = 7 # Number of steps of the arm path among which the view planner picks
+HARD_TURN_ANGLE = math.radians(30) # In continuous motion, larger heading corrections are done turning on itself
+MIN_PIVOT_ANGLE = math.radians(8) # In continuous motion, smaller heading corrections are left to the next steps, a motion can't be shorter than a request
 
 class Navigator:
-    def __init__(self, ss8: SS8, segmenter: ImageSegmenter):
+    def __init__(self, ss8: SS8, segmenter: 'ImageSegmenter'):
         self.ss8 = ss8
         self.segmenter = segmenter
 
-        self.trajectory = []
+        self.trajectory = Trajectory()
         self.arm_positions = []
+        self.arm_schedule = ArmSchedule()
+        self.stop_arm_positions = None # Arm positions of each reach point picked by the view planner
+        self.reached_points = [] # Indices of the trajectory points reached by the last step
         self.ss8_pos = np.array([0., 0.])
         self.ss8_angle = math.pi / 2
         self.obj_pos = np.array([0., 0.])
-        self.obstacles = np.array([])
+        self.obstacles = ObstacleStore()
+        self.occupancy = OccupancyGrid()
+        self.planner = GridPlanner(resolution=self.occupancy.resolution)
         self.moving = False
 
         self.vertical_precision = dconfig.DEFAULT_VERTICAL_PRECISION
         self.horizontal_precision = dconfig.DEFAULT_HORIZONTAL_PRECISION
         self.taken_picture = 0
+        self.total_pictures = self.horizontal_precision*self.vertical_precision
 
     def set_precision(self, vertical, horizontal):
         """
@@ -41,6 +67,7 @@ class Navigator:
         self.vertical_precision = vertical
         self.horizontal_precision = horizontal
 
+    @tracer.traced('callibrate', 'nav')
     def _callibrate(self, iteration=DEFAULT_CALLIBRATION_ITERATION, distance=DEFAULT_CALLIBRATION_DISTANCE):
         """
         Start the callibration of the device.
@@ -62,8 +89,7 @@ class Navigator:
                 print(f'{len(self.trajectory)} added to the trajectory reach points :')
             
             if dconfig.DEBUG_NAV:
-                for point in self.trajectory:
-                    print(point[0].get_pos())
+                print(self.trajectory.positions)
                     
             return
 
@@ -90,7 +116,7 @@ class Navigator:
             y_pos = -(i+1)*iteration_dist
 
             #The angle measure angle
-            time.sleep(dconfig.ALIGNMENT_WAIT/2)
+            self.ss8.sleep(dconfig.ALIGNMENT_WAIT/2, 'alignment wait')
             theta = self.ss8.align_to(mode='cam')
             
             distances = np.append(distances, np.abs(y_pos))
@@ -101,7 +127,7 @@ class Navigator:
 
         self.ss8.goto_cam(0, 90)
         self.ss8.move_forward(distance)
-        time.sleep(dconfig.ALIGNMENT_WAIT)
+        self.ss8.sleep(dconfig.ALIGNMENT_WAIT, 'alignment wait')
         self.ss8.align_to('body')
 
         if dconfig.DEBUG_NAV:
@@ -117,50 +143,51 @@ class Navigator:
 
         self.ss8.display_text(f'Radius : {np.round(mean_radius)} cm')
 
-    def add_obstacle(self, absolute_position, size=1):
+    def update_occupancy(self, sensor_pos, hits):
         """
-        Add an obstacle to the navigator.
-        relative_position (NDArray[Any]): The relative position in sheeric coords of the obstacle to the ss8 (in cm).
+        Integrate the points seen by the front camera in the occupancy grid, then sync the obstacles of the force
+        field with the occupied cells around the ss8: the new cells are added, the obstacles still occupied are kept
+        young and the ones seen as free again disappear. The obstacles out of range age until they are culled.
+        sensor_pos (NDArray[Any]): The position of the camera (in cm).
+        hits (NDArray[Any]): The positions of the points seen (in cm), of shape (n, 2).
         """
-        if self._assert_no_obstacle(absolute_position, 20): 
-            #print(f'Obstacle added at position {absolute_position}')
-            self.obstacles = np.append(self.obstacles, {"force_point": ForcePoint(absolute_position, size, 3), "age": 0})
+        self.occupancy.follow(self.ss8_pos)
+        self.occupancy.update(sensor_pos, hits)
+
+        added, _ = self.obstacles.sync(self.occupancy.occupied_within(self.ss8_pos, OBSTACLE_RANGE), self.ss8_pos,
+                                       OBSTACLE_RANGE, OBSTACLE_FORCE, OBSTACLE_DIST_ORDER, OBSTACLE_MIN_SPACING)
+        if added > 0:
             self.ss8.flash_led(1 * dconfig.LED_BRIGHTNESS, 0, 0, 125)
+        self.planner.set_obstacles(self.occupancy.occupied_points())
 
-    def _age_obstacles(self):
-        for obs in self.obstacles:
-            obs.birthday()
+    def get_occupancy_plot_data(self):
+        return self.occupancy.probability(), self.occupancy.extent()
 
-    def _cull_old_obstacles(self, max_age):
-        self.obstacles = np.array([obs for obs in self.obstacles if obs.age < max_age])
-    
-    def _assert_no_obstacle(self, pos, radius = 25):
+    def get_obstacles_in_range(self, distance):
         """
-        Check if there is no obstacle in the sphere of radius around the position.
-        pos (NDArray[Any]): The position to check.
-        radius (int): The radius of the circle.
+        Returns the positions of the obstacles closer than the given distance (in cm) to the ss8.
         """
-        
-        for obs in self.obstacles:
-            if np.linalg.norm(obs.get_pos() - pos) < radius:
-                return False
-        
-        return True
+        return self.obstacles.positions[self.obstacles.within(self.ss8_pos, distance)]
+
+    def _age_obstacles(self):
+        self.obstacles.age()
+
+    def _cull_old_obstacles(self, max_age=MAX_OBSTACLE_AGE):
+        self.obstacles.cull(max_age)
     
     def get_obstacle_plot_data(self):
-        obstacle_contributions = np.array([obs.get_contribution(self.ss8_pos) for obs in self.obstacles])
+        obstacle_contributions = self.obstacles.contributions(self.ss8_pos)
         return self.ss8_pos, self.ss8_angle, self._get_obstacles_pos(), obstacle_contributions
 
     def get_trajectory_plot_data(self):
-        trajectory_positions = np.array([point[0].get_pos() for point in self.trajectory])
-        trajectory_contributions = np.array([point[0].get_contribution(self.ss8_pos) for point in self.trajectory])
-        return trajectory_positions, trajectory_contributions
+        return self.trajectory.positions.copy(), self.trajectory.contributions(self.ss8_pos)
 
     def _get_obstacles_pos(self):
-        return np.array([obs.get_pos() for obs in self.obstacles])
+        return self.obstacles.positions.copy()
 
     def start_moving(self, on_finish):
         self._set_arm_positions(self.vertical_precision)
+        self.arm_schedule = ArmSchedule()
 
         if(dconfig.SKIP_CALLIBRATION_STEP):
             if dconfig.CONNECT_TO_TOP_CAM:
@@ -173,15 +200,25 @@ class Navigator:
         self._move_one_turn()
             
         self.ss8.goto_arm(0, 0)
+        if not self.arm_schedule.parked:
+            self.arm_schedule.park()
+        print(f'End of the turn, {self.arm_schedule.summary()}')
+        tracer.instant('arm schedule', 'arm', **self.arm_schedule.as_dict())
         self.ss8.display_text('End of the turn')
+        self.ss8.flush_captures() # The reconstruction reads the saved images
         on_finish()
         return
     
     def _move_one_turn(self):
         next_dep = None
+        previous_motion = None
         if dconfig.DEBUG_NAV:
             print('Start the turn')
 
+        if dconfig.CONTINUOUS_MOTION:
+            # The durations of the continuous motions are computed at full speed
+            self.ss8.set_speed(MAX_DUTY_CYCLE)
+
         while self.moving:
             if(dconfig.OBSTACLES_AVOIDANCE):
                 self._age_obstacles()
@@ -190,13 +227,40 @@ class Navigator:
             if(dconfig.DEBUG_NAV):
                 print('Start new dep :', next_dep)
                 
-            if next_dep is not None:
-                abs_angle = math.atan2(next_dep[1], next_dep[0])
-                diff_angle = abs_angle - self.ss8_angle
-                norm = np.abs(np.linalg.norm(next_dep))
-                self._move_of(diff_angle, norm)
-
+            if next_dep is not None and self.arm_schedule.must_park([self.ss8_pos, self.ss8_pos + next_dep], self.obj_pos, self.obstacles):
+                # An obstacle appeared along the arm, the body only moves once the arm is parked
+                if dconfig.CONTINUOUS_MOTION and previous_motion is not None:
+                    # Nothing takes over the queued continuous motion while the arm parks
+                    previous_motion.wait()
+                    self.ss8.stop_mov()
+                    previous_motion = None
+                self._park_arm()
+
+            motion = None
+            if next_dep is not None and dconfig.CONTINUOUS_MOTION:
+                motion = self._move_continuously(next_dep)
+            elif next_dep is not None:
+                aim = self._aim_with_pivot(next_dep)
+                if aim is None:
+                    # The pivot can't lead to the target, turn on itself toward it
+                    self._turn_of(math.atan2(next_dep[1], next_dep[0]) - self.ss8_angle)
+                    aim = 0., np.linalg.norm(next_dep)
+                motion = self._move_of(*aim, wait_for_completion=False)
+
+            # Plan the next step from the expected position while the current one executes
             next_dep, must_take_break = self._compute_next_deplacement()
+            if motion is not None or (must_take_break and previous_motion is not None):
+                with tracer.span('wait motion', 'motion'):
+                    if dconfig.CONTINUOUS_MOTION and not must_take_break:
+                        # Only wait for the previous step, so that the next one is queued before this one ends
+                        if previous_motion is not None:
+                            previous_motion.wait()
+                    else:
+                        # A step without motion still lets the previous continuous one end before the break
+                        (motion if motion is not None else previous_motion).wait()
+                        if dconfig.CONTINUOUS_MOTION:
+                            self.ss8.stop_mov()
+                previous_motion = None if must_take_break else motion
 
             #time.sleep(0.5)
 
@@ -216,14 +280,29 @@ class Navigator:
         """
         
         self.obj_pos = self.ss8_pos - np.array([radius, 0])
-        self.trajectory = []
-        step_angle = 360//step_nbr
-        for a in range(0, 360, step_angle):
-            x = radius * (math.cos(math.radians(a))-1)
-            y = radius * math.sin(math.radians(a))
-            self.trajectory.append((ForcePoint(np.array([x, y]), 40, 0), math.radians(a)))
-        
-        self.trajectory.append((ForcePoint(np.array([0, 0]), 40, 0), 0))
+        if dconfig.NEXT_BEST_VIEW:
+            self._set_view_trajectory(radius)
+            return
+
+        self.trajectory = Trajectory.circle(radius, step_nbr)
+        self.stop_arm_positions = None
+        self.total_pictures = self.horizontal_precision*self.vertical_precision
+
+    def _set_view_trajectory(self, radius):
+        """
+        Compute the trajectory through the stops of the views picked by the view planner.
+        radius (int): The radius of the circle.
+        """
+        planner = ViewPlanner(radius, generate_path(VIEW_ARM_STEPS), coverage_target=dconfig.NBV_COVERAGE_TARGET)
+        views, duration = planner.plan()
+
+        angles = sorted(set(angle for angle, _ in views))
+        self.trajectory = Trajectory.on_circle(radius, angles)
+        self.stop_arm_positions = [[arm for angle, arm in views if angle == stop] for stop in angles]
+        self.total_pictures = len(views)
+
+        if dconfig.DEBUG_NAV:
+            print(f'{len(views)} views at {len(angles)} stops, {planner.coverage():.0%} coverage in about {duration:.0f} s')
     
     def _set_arm_positions(self, step_nbr):
         self.arm_positions = generate_path(step_nbr)
@@ -240,58 +319,151 @@ class Navigator:
         """
         Get the next deplacement to reach the next point in the trajectory while avoiding the obstacles.
         """
-        new_reach_point = False
-
         # Get the next point in the trajectory (the one with the closest angle above the current angle)
-        reach_point = None
-        while reach_point is None:
-            if(len(self.trajectory) == 0):
-                self.moving = False
-                return None, True
-            
-            if(np.linalg.norm(self.trajectory[0][0].get_pos() - self.ss8_pos) < STEP_DISTANCE/2) or self._get_trajectory_angle() > self.trajectory[0][1]:
-                self.trajectory.pop(0)
-                new_reach_point = True
-            else:
-                reach_point = self.trajectory[0][0]
+        # A step can pass several points, all of them are reached
+        skipped = self.trajectory.advance(self.ss8_pos, self._get_trajectory_angle(), STEP_DISTANCE/2)
+        new_reach_point = skipped > 0
+        if new_reach_point:
+            self.reached_points = list(range(self.trajectory.cursor - skipped, self.trajectory.cursor))
+        if(len(self.trajectory) == 0):
+            self.moving = False
+            return None, True
+        reach_pos = self.trajectory.current_pos()
 
         if dconfig.DEBUG_NAV and False:
-            print(f'\n\nCurrent position : {self.ss8_pos} || Current angle : {angle} \nReach point : {reach_point.get_pos()} || Reach angle : {self.trajectory[0][1]} \n')
+            print(f'\n\nCurrent position : {self.ss8_pos} || Reach point : {reach_pos} || Reach angle : {self.trajectory.current_angle()} \n')
+
+        next_dep = None
+        if dconfig.OBSTACLES_AVOIDANCE and dconfig.GRID_PLANNER:
+            next_dep = self._get_planned_deplacement(reach_pos)
 
-        # Compute the next deplacement with the contribution of the obstacles and the reach point
-        next_dep = reach_point.get_contribution(self.ss8_pos)
-        for obs in self.obstacles:
-            next_dep += obs.get_contribution(self.ss8_pos)
+        if next_dep is None:
+            # Compute the next deplacement with the contribution of the obstacles and the reach point
+            next_dep = self.trajectory.contribution(self.ss8_pos) + self.obstacles.total_contribution(self.ss8_pos, OBSTACLE_RANGE)
 
         if np.linalg.norm(next_dep) > STEP_DISTANCE:
             next_dep = (next_dep / np.linalg.norm(next_dep)) * STEP_DISTANCE
 
         return next_dep, new_reach_point
+
+    def _get_planned_deplacement(self, goal):
+        """
+        Get the deplacement toward the path planned on the occupancy grid to the goal, None if there is no path
+        yet, in which case the force field is used.
+        goal (NDArray[Any]): The position to reach (in cm).
+        """
+        path = self.planner.plan(self.ss8_pos, goal)
+        if path is None or len(path) < 2:
+            if dconfig.DEBUG_NAV:
+                print('No planned path, fallback to the force field')
+            return None
+
+        # The path goes through the cell centers, the last point is the goal itself
+        path[-1] = goal
+        return path[min(PLANNER_LOOKAHEAD, len(path) - 1)] - self.ss8_pos
     
-    def _move_of(self, angle, distance):
+    def _move_of(self, angle, distance, wait_for_completion=True):
         """
-        Move the device of a given angle and distance.
+        Move the device of a given angle and distance. The rotation pivots around the left wheel, see _aim_with_pivot.
         angle (float): The angle to move.
         distance (float): The distance to move.
+        wait_for_completion (bool): If False, returns right away while the device moves.
+        Returns the MotionHandle of the last motion, None if the device doesn't move.
         """
 
         # Rotate the ss8 to the given angle (rotate left if the angle smaller than PI, right otherwise)
         angle = angle % (2*np.pi)
         
         if angle < np.pi:
-            self.ss8.rotate_left(angle)
+            motion = self.ss8.rotate_left(angle, wait_for_completion)
+            self._pivot(angle)
         else:
-            self.ss8.rotate_right(2*np.pi - angle)
+            motion = self.ss8.rotate_right(2*np.pi - angle, wait_for_completion)
+            self._pivot(angle - 2*np.pi)
         
         self.ss8_angle = (self.ss8_angle + angle) % (2*np.pi)
         
-        # Move the ss8 forward
+        # Move the ss8 forward, the motion is queued after the rotation
         if(distance>00.1):
-            self.ss8.move_forward(distance)
+            motion = self.ss8.move_forward(distance, wait_for_completion)
             self.ss8_pos += np.array([distance * math.cos(self.ss8_angle), distance * math.sin(self.ss8_angle)])
         
-        return
+        return motion
     
+    def _aim_with_pivot(self, dep):
+        """
+        Get the angle and distance of _move_of that reach the end of the deplacement. The rotation pivots around the
+        left wheel, so the device heads to the target from where the pivot leaves it, i.e. the target must be on the
+        line at TRACK_WIDTH/2 on the right of the left wheel.
+        dep (NDArray[Any]): The deplacement (in cm).
+        Returns None if the target is too close to the left wheel to be reached after a pivot.
+        """
+        target = self.ss8_pos + dep
+        wheel = self.ss8_pos + TRACK_WIDTH / 2 * np.array([-math.sin(self.ss8_angle), math.cos(self.ss8_angle)])
+        to_target = target - wheel
+        dist = np.linalg.norm(to_target)
+        if dist <= TRACK_WIDTH / 2:
+            return None
+
+        heading = math.atan2(to_target[1], to_target[0]) + math.asin(TRACK_WIDTH / 2 / dist)
+        return heading - self.ss8_angle, math.sqrt(dist**2 - (TRACK_WIDTH / 2)**2)
+
+    def _move_continuously(self, dep):
+        """
+        Move the device of the given deplacement without stopping the wheels, the motions are chained to the queued
+        ones. The heading is corrected by pivoting around a wheel, which follows an arc, or by turning on itself for
+        the large corrections, then the device goes straight to the end of the deplacement. The small corrections are
+        skipped: a motion shorter than the request round trip would last until the next request arrives.
+        dep (NDArray[Any]): The deplacement (in cm).
+        Returns the MotionHandle of the last motion, None if the device doesn't move.
+        """
+        target = self.ss8_pos + dep
+        angle = (math.atan2(dep[1], dep[0]) - self.ss8_angle + np.pi) % (2*np.pi) - np.pi
+        motion = None
+
+        if abs(angle) > HARD_TURN_ANGLE:
+            turn = self.ss8.turn_left if angle > 0 else self.ss8.turn_right
+            motion = turn(abs(angle), wait_for_completion=False, continuous=True)
+        elif abs(angle) > MIN_PIVOT_ANGLE:
+            rotate = self.ss8.rotate_left if angle > 0 else self.ss8.rotate_right
+            motion = rotate(abs(angle), wait_for_completion=False, continuous=True)
+            self._pivot(angle)
+        else:
+            angle = 0.
+        self.ss8_angle = (self.ss8_angle + angle) % (2*np.pi)
+
+        # The pivot already moved the device along its arc
+        heading = np.array([math.cos(self.ss8_angle), math.sin(self.ss8_angle)])
+        distance = np.dot(target - self.ss8_pos, heading)
+        if distance > 0.01:
+            motion = self.ss8.move_forward(distance, wait_for_completion=False, continuous=True)
+            self.ss8_pos = self.ss8_pos + distance * heading
+
+        return motion
+
+    def _turn_of(self, angle):
+        """
+        Turn the device on itself of the given angle, both wheels turn so that its position doesn't change.
+        """
+        angle = (angle + np.pi) % (2*np.pi) - np.pi
+        if angle > 0:
+            self.ss8.turn_left(angle)
+        else:
+            self.ss8.turn_right(-angle)
+        self.ss8_angle = (self.ss8_angle + angle) % (2*np.pi)
+
+    def _pivot(self, angle):
+        """
+        Update the position of the device rotated by the given angle around its left wheel. The firmware only turns
+        the right wheel for both rotate_left and rotate_right, so the pivot is the same for both signs.
+        The heading is not updated.
+        """
+        pivot = self.ss8_pos + TRACK_WIDTH / 2 * np.array([-math.sin(self.ss8_angle), math.cos(self.ss8_angle)])
+        c, s = math.cos(angle), math.sin(angle)
+        offset = self.ss8_pos - pivot
+        self.ss8_pos = pivot + np.array([c * offset[0] - s * offset[1], s * offset[0] + c * offset[1]])
+
+    @tracer.traced('reach point', 'nav')
     def _on_reach_point(self):
         """
         Pause the movement and restart it.
@@ -299,30 +471,82 @@ class Navigator:
         # Try to be in the right direction to look at the object
         correction_angle = self._get_trajectory_angle() - self.ss8_angle + np.pi/2
         
-        time.sleep(dconfig.ARM_MOV_WAITING_TIME)
-        self._move_of(correction_angle, 0)
-        self.ss8.align_to(mode='body')
+        if dconfig.CONTINUOUS_MOTION:
+            self._turn_of(correction_angle)
+        else:
+            self._move_of(correction_angle, 0)
+        # The arm left out aims at the object, the body is aligned with it
+        self._align_body(keep_arm_cam_settings=not self.arm_schedule.parked)
 
-        for arm_pos in self.arm_positions:
+        if self.stop_arm_positions is None:
+            arm_positions = self.arm_positions
+        else:
+            # The views of the stops passed in the same step are taken here, the closing point has none
+            arm_positions = [arm for i in self.reached_points if i < len(self.stop_arm_positions)
+                             for arm in self.stop_arm_positions[i]]
+        if dconfig.SERPENTINE_ARM:
+            # Start the sweep where the previous one ended
+            arm_positions = self.arm_schedule.order(arm_positions)
+        for arm_pos in arm_positions:
             if(dconfig.NAVIGATION_ONLY):
                 break
 
-            time.sleep(dconfig.ARM_MOV_WAITING_TIME)
             self.ss8.goto_arm(arm_pos[0], arm_pos[1])
-            time.sleep(12)
+            self.arm_schedule.move_to(arm_pos)
+            # Wait for the arm to reach the position and stop shaking
+            start = self.ss8.clock()
+            self.ss8.wait_settled()
+            self.arm_schedule.add_settle_time(self.ss8.clock() - start)
             self.ss8.align_to(mode='cam', keep_arm_cam_settings=True, tolerance_ratio=2)
             self.ss8.capture_image(save_to_dir=True)
             self.taken_picture += 1
             
-        self.ss8.goto_arm(0, 0)
-        self.ss8.goto_cam(0, 90)
-        time.sleep(5)
+        if not dconfig.SERPENTINE_ARM or len(self.trajectory) == 0 or \
+                self.arm_schedule.must_park(self._get_arc_to(self.trajectory.current_pos()), self.obj_pos, self.obstacles):
+            self._park_arm()
 
-        tot_pics = self.horizontal_precision*self.vertical_precision
-        self.ss8.display_progress_bar(f"Picture : {self.taken_picture}/{tot_pics}", self.taken_picture/tot_pics)
+        self.ss8.display_progress_bar(f"Picture : {self.taken_picture}/{self.total_pictures}", self.taken_picture/self.total_pictures)
 
         return
 
+    def _align_body(self, keep_arm_cam_settings):
+        """
+        Rotate the body to center the object in the top camera. The rotations of the alignment pivot around the
+        left wheel like the ones of _move_of, so they are added to the position and heading of the device.
+        """
+        start = self.ss8.alignment_rotation
+        self.ss8.align_to(mode='body', keep_arm_cam_settings=keep_arm_cam_settings)
+        angle = self.ss8.alignment_rotation - start
+        self._pivot(angle)
+        self.ss8_angle = (self.ss8_angle + angle) % (2*np.pi)
+
+    def _park_arm(self):
+        """
+        Move the arm back to its parking position and the camera to its default orientation, and wait for them
+        to stop so that the body never moves with the arm out toward an obstacle.
+        """
+        self.ss8.goto_arm(0, 0)
+        self.ss8.goto_cam(0, 90)
+        self.arm_schedule.park()
+        start = self.ss8.clock()
+        self.ss8.wait_settled(stable_frames=0)
+        self.arm_schedule.add_settle_time(self.ss8.clock() - start)
+
+    def _get_arc_to(self, goal):
+        """
+        Returns the positions every STEP_DISTANCE along the circle around the object from the ss8 to the goal,
+        of shape (n, 2).
+        goal (NDArray[Any]): The position to reach (in cm).
+        """
+        start, end = self.ss8_pos - self.obj_pos, goal - self.obj_pos
+        start_angle = math.atan2(start[1], start[0])
+        arc_angle = (math.atan2(end[1], end[0]) - start_angle) % (2*np.pi)
+        radius = np.linalg.norm(start)
+        count = int(radius * arc_angle / STEP_DISTANCE) + 2
+        angles = start_angle + np.linspace(0, arc_angle, count)
+        radii = np.linspace(radius, np.linalg.norm(end), count)
+        return self.obj_pos + radii[:, None] * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
 DEFAULT_FORCE_NORM = 1000
 DEFAULT_DIST_ORDER = 1
 
@@ -4,6 +4,7 @@ import torch
 from controllers.image_segmenter import ImageSegmenter
 from controllers.navigator import Navigator
 from controllers.ss8 import SS8
+from controllers.tracer import tracer
 import sys, pathlib, asyncio
 
 path_to_da = pathlib.Path(__file__).parent / "packages/depth_anything_v2"
@@ -27,6 +28,7 @@ class Object_Detector:
             rr.init("Occupancy Map", spawn=True)
 
         self.must_detect = False
+        self.last_frame_id = 0 # Id of the last front camera frame processed
         self._init_depth_anything()
 
 
@@ -118,6 +120,12 @@ class Object_Detector:
     def get_frame(self):
         return self.frame
     
+    def _get_camera_position(self, T):
+        '''
+        T: 2D position of the ss8
+        '''
+        return T + np.array([np.cos(self.navigator.ss8_angle) * 22, np.sin(self.navigator.ss8_angle) * -13])
+
     def _project_to_world(self, pixel_index, T, R, depth, hfov, frame):
         '''
         pixel_index: 3x1 array with the pixel index
@@ -137,7 +145,7 @@ class Object_Detector:
         Yc = (pixel_index[0] - cy) * depth / (focal_length/sensor_pixel_size)
         camera_position = np.array([Xc, Yc[0]])
 
-        T = T + np.array([np.cos(self.navigator.ss8_angle) * 22, np.sin(self.navigator.ss8_angle) * -13])
+        T = self._get_camera_position(T)
         
 
         world_position = R @ camera_position + T #np.linalg.inv(R) @
@@ -221,14 +229,20 @@ class Object_Detector:
         return top_view, pixelated_depth, np.array(pos_3d), np.array(colors)
 
     def _request_frame(self):
-        
-        frame = self.ss8.capture_image('front')
+        """
+        Returns the latest front camera frame, or None if it was already processed.
+        """
+        res = self.ss8.capture_latest('front', after_id=self.last_frame_id)
+        if res is None:
+            return None
+        self.last_frame_id, _, frame = res
         if frame is not None:
             # rotate 90 degrees
             frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         return frame
 
+    @tracer.traced('start_detection', 'detection')
     def start_detection(self):
         frame = self._request_frame()
         if frame is not None:
@@ -259,9 +273,9 @@ class Object_Detector:
             #self.depth = pixelated_depth
             
 
-            for pos in pos_3d:
-                if np.linalg.norm(pos - T) > 15:
-                    self.navigator.add_obstacle(pos, -100000)
+            if len(pos_3d) > 0:
+                far = np.linalg.norm(pos_3d - T, axis=1) > 15
+                self.navigator.update_occupancy(self._get_camera_position(T), pos_3d[far])
         
 
 
@@ -0,0 +1,218 @@
+import threading
+
+import numpy as np
+
+from controllers.spatial_index import GridIndex
+
+INITIAL_CAPACITY = 64   # Obstacles allocated before the first growth, the capacity doubles when full
+DEFAULT_CELL_SIZE = 20  # Side of the cells of the spatial index in cm
+
+
+def norms(vectors, orders):
+    """
+    Norms of the given vectors, each with its own order, same as np.linalg.norm(vector, ord=order).
+    vectors (np.ndarray): The vectors, of shape (n, d).
+    orders (np.ndarray): The order of the norm of each vector, of shape (n,). 0 counts the non zero coordinates.
+    """
+    res = np.empty(len(vectors))
+    for order in np.unique(orders):
+        mask = orders == order
+        res[mask] = np.linalg.norm(vectors[mask], ord=order, axis=1)
+    return res
+
+
+def force_contributions(positions, forces, orders, pos):
+    """
+    Contribution of each force point to the global force at the given position, like ForcePoint.get_contribution.
+    A point exactly at the position has no direction and contributes nothing.
+    positions (np.ndarray): The positions of the points, of shape (n, 2).
+    forces (np.ndarray): The force norms, negative for obstacles, of shape (n,).
+    orders (np.ndarray): The orders of the distance norms, of shape (n,).
+    pos (np.ndarray): The position where the force is computed.
+    """
+    dist = positions - np.asarray(pos, dtype=float)
+    dist_norm = norms(dist, orders)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = forces / dist_norm**orders / dist_norm
+    scale[dist_norm == 0] = 0.
+    return dist * scale[:, None]
+
+
+class ObstacleStore:
+    def __init__(self, capacity=INITIAL_CAPACITY, cell_size=DEFAULT_CELL_SIZE):
+        """
+        Obstacles stored as contiguous arrays of positions, forces, distance orders and ages,
+        so that their force field is evaluated in a few vectorized operations.
+        A grid index of the positions answers the proximity queries without scanning all the obstacles.
+        capacity (int): The number of obstacles allocated at first.
+        cell_size (float): The side of the cells of the index, about the usual query radius.
+        """
+        self.lock = threading.Lock()
+        self.index = GridIndex(cell_size)
+        self._positions = np.empty((capacity, 2))
+        self._forces = np.empty(capacity)
+        self._orders = np.empty(capacity)
+        self._ages = np.empty(capacity, dtype=np.int64)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def positions(self):
+        return self._positions[:self.count]
+
+    @property
+    def forces(self):
+        return self._forces[:self.count]
+
+    @property
+    def orders(self):
+        return self._orders[:self.count]
+
+    @property
+    def ages(self):
+        return self._ages[:self.count]
+
+    def add(self, pos, force, dist_order):
+        """
+        Adds an obstacle, the arrays grow geometrically so that insertions are amortized O(1).
+        pos (np.ndarray): The position of the obstacle.
+        force (float): The force norm, negative to repel.
+        dist_order (float): The order of the distance norm.
+        """
+        with self.lock:
+            self._add(np.asarray(pos, dtype=float)[:2], force, dist_order)
+
+    def _add(self, pos, force, dist_order):
+        if self.count == len(self._forces):
+            self._grow(max(2 * self.count, INITIAL_CAPACITY))
+        i = self.count
+        self._positions[i] = pos
+        self._forces[i] = force
+        self._orders[i] = dist_order
+        self._ages[i] = 0
+        self.index.insert(i, pos)
+        self.count += 1
+
+    def add_many(self, positions, force, dist_order, min_spacing=0.):
+        """
+        Adds a batch of obstacles, skipping the ones closer than min_spacing to an obstacle already stored
+        or added before them in the batch.
+        positions (np.ndarray): The positions, of shape (n, 2) or more coordinates.
+        force (float): The force norm of the obstacles.
+        dist_order (float): The order of the distance norm.
+        min_spacing (float): The min distance between two obstacles, 0 to add them all.
+        Returns:
+            int: The number of obstacles added.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, np.shape(positions)[-1])[:, :2]
+        with self.lock:
+            added = 0
+            for pos in positions:
+                if min_spacing > 0 and len(self.index.within(self._positions, pos, min_spacing)) > 0:
+                    continue
+                self._add(pos, force, dist_order)
+                added += 1
+            return added
+
+    def _grow(self, capacity):
+        for name in ('_positions', '_forces', '_orders', '_ages'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def age(self):
+        """
+        Increments the age of all the obstacles.
+        """
+        with self.lock:
+            self._ages[:self.count] += 1
+
+    def cull(self, max_age):
+        """
+        Removes the obstacles whose age reached max_age, keeping the others in order.
+        """
+        with self.lock:
+            self._keep(np.flatnonzero(self._ages[:self.count] < max_age))
+
+    def _keep(self, keep):
+        if len(keep) == self.count:
+            return
+        for array in (self._positions, self._forces, self._orders, self._ages):
+            array[:len(keep)] = array[keep]
+        self.count = len(keep)
+        self.index.rebuild(self._positions[:self.count])
+
+    def sync(self, points, pos, radius, force, dist_order, min_spacing):
+        """
+        Matches the obstacles closer than radius to the position with the given points, e.g. the occupied cells of
+        a map around the robot. The obstacles closer than min_spacing to a point are seen again and their age is
+        reset, the other ones in range are removed, and the points away from all the obstacles are added.
+        The obstacles out of range are left to age.
+        points (np.ndarray): The positions of the points, all closer than radius to the position, of shape (n, 2).
+        pos (np.ndarray): The center of the range.
+        radius (float): The range of the points.
+        force (float): The force norm of the added obstacles.
+        dist_order (float): The order of the distance norm of the added obstacles.
+        min_spacing (float): The min distance between two obstacles.
+        Returns:
+            tuple: The numbers of obstacles added and removed.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        with self.lock:
+            ids = self.index.within(self._positions, np.asarray(pos, dtype=float), radius)
+            seen = np.zeros(len(ids), dtype=bool)
+            if len(ids) and len(points):
+                dists = np.linalg.norm(self._positions[ids][:, None] - points[None], axis=2)
+                seen = dists.min(axis=1) < min_spacing
+            self._ages[ids[seen]] = 0
+            removed = len(ids) - np.count_nonzero(seen)
+            if removed:
+                self._keep(np.setdiff1d(np.arange(self.count), ids[~seen]))
+
+            added = 0
+            for point in points:
+                if len(self.index.within(self._positions, point, min_spacing)) > 0:
+                    continue
+                self._add(point, force, dist_order)
+                added += 1
+            return added, removed
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+            self.index.rebuild(self._positions[:0])
+
+    def any_within(self, pos, radius):
+        """
+        Returns True if an obstacle is closer than radius to the position.
+        """
+        return len(self.within(pos, radius)) > 0
+
+    def within(self, pos, radius):
+        """
+        Returns the indices of the obstacles closer than radius to the position.
+        """
+        with self.lock:
+            return self.index.within(self._positions, np.asarray(pos, dtype=float), radius)
+
+    def contributions(self, pos, max_range=None):
+        """
+        Returns the contribution of the obstacles to the force at the given position, of shape (n, 2).
+        pos (np.ndarray): The position where the force is computed.
+        max_range (float): If given, only the obstacles within this distance are taken into account.
+        """
+        with self.lock:
+            if max_range is None:
+                ids = slice(0, self.count)
+            else:
+                ids = self.index.within(self._positions, np.asarray(pos, dtype=float), max_range)
+            return force_contributions(self._positions[ids], self._forces[ids], self._orders[ids], pos)
+
+    def total_contribution(self, pos, max_range=None):
+        """
+        Returns the sum of the contributions of the obstacles at the given position.
+        """
+        return self.contributions(pos, max_range).sum(axis=0)
@@ -0,0 +1,183 @@
+import threading
+
+import numpy as np
+
+DEFAULT_RESOLUTION = 5      # Side of a cell in cm
+DEFAULT_SIZE = 600          # Side of the mapped window in cm, the window follows the robot
+DEFAULT_MAX_RANGE = 300     # Depth beyond which the measures are only used to clear the free space, in cm
+
+# Log-odds updates of a cell for each measure, and bounds so that the map can change its mind
+LOG_ODDS_HIT = 0.85
+LOG_ODDS_MISS = -0.4
+LOG_ODDS_MIN = -2.
+LOG_ODDS_MAX = 3.5
+OCCUPIED_LOG_ODDS = 0.85    # Cells above are occupied, i.e. a probability of 0.7
+
+
+class OccupancyGrid:
+    def __init__(self, resolution=DEFAULT_RESOLUTION, size=DEFAULT_SIZE, center=(0., 0.), max_range=DEFAULT_MAX_RANGE):
+        """
+        Log-odds occupancy grid in world coordinates (cm), over a square window that rolls with the robot
+        so that the memory stays bounded.
+        resolution (float): The side of a cell in cm.
+        size (float): The side of the window in cm.
+        center (tuple): The world position of the center of the window.
+        max_range (float): The max trusted depth in cm, farther hits only clear the cells before max_range.
+        """
+        self.resolution = resolution
+        self.cells = int(np.ceil(size / resolution))
+        self.max_range = max_range
+        self.log_odds = np.zeros((self.cells, self.cells), dtype=np.float32)
+        self.origin = self._snap(np.asarray(center, dtype=float)) - self.cells // 2 * resolution
+        self.lock = threading.Lock()
+
+    def _snap(self, pos):
+        return np.floor(pos / self.resolution) * self.resolution
+
+    @property
+    def size(self):
+        return self.cells * self.resolution
+
+    @property
+    def center(self):
+        return self.origin + self.cells // 2 * self.resolution
+
+    def extent(self):
+        """
+        Returns the (x_min, x_max, y_min, y_max) world bounds of the window, e.g. for matplotlib's imshow.
+        """
+        return self.origin[0], self.origin[0] + self.size, self.origin[1], self.origin[1] + self.size
+
+    def world_to_cell(self, points):
+        """
+        Returns the (i, j) indices of the cells containing the points, i along X and j along Y.
+        """
+        return np.floor((np.asarray(points, dtype=float)[..., :2] - self.origin) / self.resolution).astype(np.int64)
+
+    def cell_to_world(self, cells):
+        """
+        Returns the world positions of the centers of the cells.
+        """
+        return self.origin + (np.asarray(cells) + 0.5) * self.resolution
+
+    def _in_bounds(self, cells):
+        return np.all((cells >= 0) & (cells < self.cells), axis=-1)
+
+    def follow(self, pos):
+        """
+        Moves the window so that it is centered on the position if the position is a quarter of the window away.
+        The rows and columns entering the window are unknown.
+        """
+        pos = np.asarray(pos, dtype=float)[:2]
+        if np.all(np.abs(pos - self.center) < self.size / 4):
+            return
+        with self.lock:
+            self._recenter(pos)
+
+    def _recenter(self, pos):
+        new_origin = self._snap(pos) - self.cells // 2 * self.resolution
+        shift = np.round((new_origin - self.origin) / self.resolution).astype(int)
+        self.origin = new_origin
+        if np.any(np.abs(shift) >= self.cells):
+            self.log_odds[:] = 0
+            return
+
+        for axis, s in enumerate(shift):
+            if s == 0:
+                continue
+            self.log_odds = np.roll(self.log_odds, -s, axis=axis)
+            index = [slice(None), slice(None)]
+            index[axis] = slice(self.cells - s, None) if s > 0 else slice(0, -s)
+            self.log_odds[tuple(index)] = 0
+
+    def update(self, origin, hits):
+        """
+        Integrates a depth scan: the cells of the hits become more occupied and the cells crossed by the rays
+        from the origin to the hits become more free. Each cell is updated once per scan.
+        origin (np.ndarray): The world position of the sensor.
+        hits (np.ndarray): The world positions of the measured points, of shape (n, 2).
+        """
+        hits = np.asarray(hits, dtype=float).reshape(-1, 2)
+        origin = np.asarray(origin, dtype=float)[:2]
+        if len(hits) == 0:
+            return
+
+        # Farther than the max range, the hit isn't trusted but the cells before it are free
+        delta = hits - origin
+        dist = np.linalg.norm(delta, axis=1)
+        trusted = dist <= self.max_range
+        scale = np.where(trusted, 1., self.max_range / np.maximum(dist, 1e-9))
+        ends = origin + delta * scale[:, None]
+
+        with self.lock:
+            free = self._ray_cells(origin, ends)
+            hit_cells = self.world_to_cell(hits[trusted])
+            hit_cells = hit_cells[self._in_bounds(hit_cells)]
+            hit_index = np.unique(hit_cells[:, 0] * self.cells + hit_cells[:, 1])
+            free = np.setdiff1d(free, hit_index, assume_unique=True)
+
+            flat = self.log_odds.reshape(-1)
+            flat[free] = np.maximum(flat[free] + LOG_ODDS_MISS, LOG_ODDS_MIN)
+            flat[hit_index] = np.minimum(flat[hit_index] + LOG_ODDS_HIT, LOG_ODDS_MAX)
+
+    def _ray_cells(self, origin, ends):
+        """
+        Returns the flat indices of the cells crossed by the rays from the origin to the ends, excluding the ends.
+        The rays are sampled once per cell along their major axis, all at once.
+        """
+        start = (origin - self.origin) / self.resolution
+        delta = (ends - self.origin) / self.resolution - start
+        counts = np.ceil(np.abs(delta).max(axis=1)).astype(np.int64)
+        counts = np.maximum(counts, 1)
+
+        ray = np.repeat(np.arange(len(counts)), counts)
+        step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        samples = start + delta[ray] * (step / counts[ray])[:, None]
+        cells = np.floor(samples).astype(np.int64)
+        cells = cells[self._in_bounds(cells)]
+        return np.unique(cells[:, 0] * self.cells + cells[:, 1])
+
+    def probability(self):
+        """
+        Returns the occupancy probability of each cell, 0.5 for the unknown ones.
+        """
+        with self.lock:
+            return 1. - 1. / (1. + np.exp(self.log_odds))
+
+    def occupied_cells(self, threshold=OCCUPIED_LOG_ODDS):
+        with self.lock:
+            return np.argwhere(self.log_odds > threshold)
+
+    def occupied_points(self, threshold=OCCUPIED_LOG_ODDS):
+        """
+        Returns the world positions of the centers of the occupied cells, of shape (n, 2).
+        """
+        with self.lock:
+            return self.cell_to_world(np.argwhere(self.log_odds > threshold))
+
+    def is_occupied(self, points, threshold=OCCUPIED_LOG_ODDS):
+        """
+        Returns for each point if its cell is occupied, the points outside the window are unknown hence not occupied.
+        """
+        with self.lock:
+            cells = self.world_to_cell(np.asarray(points, dtype=float).reshape(-1, 2))
+            inside = self._in_bounds(cells)
+            res = np.zeros(cells.shape[:-1], dtype=bool)
+            res[inside] = self.log_odds[cells[inside][:, 0], cells[inside][:, 1]] > threshold
+            return res
+
+    def occupied_within(self, pos, radius, threshold=OCCUPIED_LOG_ODDS):
+        """
+        Returns the world positions of the occupied cells whose center is closer than radius to the position.
+        """
+        pos = np.asarray(pos, dtype=float)[:2]
+        with self.lock:
+            low = np.clip(self.world_to_cell(pos - radius), 0, self.cells)
+            high = np.clip(self.world_to_cell(pos + radius) + 1, 0, self.cells)
+            cells = np.argwhere(self.log_odds[low[0]:high[0], low[1]:high[1]] > threshold) + low
+            points = self.cell_to_world(cells)
+        return points[np.linalg.norm(points - pos, axis=1) < radius]
+
+    def clear(self):
+        with self.lock:
+            self.log_odds[:] = 0
@@ -2,6 +2,8 @@ import os
 import subprocess
 import pathlib
 
+from controllers.tracer import tracer
+
 class open_mvs:
     def __init__(self, mvs_bin_dir: pathlib.Path, working_dir: pathlib.Path, use_masks=False):
         #Colmap directory
@@ -10,6 +12,7 @@ class open_mvs:
         self.use_masks = use_masks
 
 
+    @tracer.traced('Interface COLMAP', 'reconstruction')
     def interface_colmap(self):
         cmd_path = self.mvs_bin_dir / "InterfaceCOLMAP"
         output_path = self.working_dir / pathlib.Path("model_colmap.mvs")
@@ -24,6 +27,7 @@ class open_mvs:
         return_code = subprocess.call(command)
         return return_code
     
+    @tracer.traced('Densifying Point Cloud', 'reconstruction')
     def densify_point_cloud(self):
         cmd_path = self.mvs_bin_dir / "DensifyPointCloud"
         input_file = self.working_dir / pathlib.Path("model_colmap.mvs")
@@ -48,6 +52,7 @@ class open_mvs:
         return_code = subprocess.call(command)
         return return_code
     
+    @tracer.traced('Reconstructing Mesh', 'reconstruction')
     def reconstruct_mesh(self):
         cmd_path = self.mvs_bin_dir / "ReconstructMesh"
         input_file = self.working_dir / "model_dense.mvs"
@@ -64,6 +69,7 @@ class open_mvs:
         return_code = subprocess.call(command)
         return return_code
     
+    @tracer.traced('Refining Mesh', 'reconstruction')
     def refine_mesh(self):
         cmd_path = self.mvs_bin_dir / "RefineMesh"
 
@@ -89,6 +95,7 @@ class open_mvs:
         return_code = subprocess.call(command)
         return return_code
     
+    @tracer.traced('Texturing Mesh', 'reconstruction')
     def texture_mesh(self, output_path="model.obj"):
         cmd_path = self.mvs_bin_dir / "TextureMesh"
 
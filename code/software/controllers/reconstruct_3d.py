@@ -4,6 +4,7 @@ import cv2
 import pathlib
 import pycolmap
 from controllers.open_mvs import open_mvs
+from controllers.tracer import tracer
 
 class Reconstruct:
 
@@ -35,26 +36,31 @@ class Reconstruct:
         
         if scale_factor != 1:
             self.status = "Resizing images"
-            # Reduce image size by half
-            images = self.open_images_in_folder()
+            with tracer.span(self.status, 'reconstruction'):
+                # Reduce image size by half
+                images = self.open_images_in_folder()
 
-            images = [cv2.resize(img, (0,0), fx=scale_factor, fy=scale_factor) for img in images]
-            # Delete images folder
-            os.system(f"rm -r {images_path}")
-            os.mkdir(images_path)
-            self.save_images_to_folder(images)
+                images = [cv2.resize(img, (0,0), fx=scale_factor, fy=scale_factor) for img in images]
+                # Delete images folder
+                os.system(f"rm -r {images_path}")
+                os.mkdir(images_path)
+                self.save_images_to_folder(images)
 
         self.status = "Extracting features"
-        pycolmap.extract_features(database_path=database_path, image_path=images_path, camera_model="PINHOLE")
+        with tracer.span(self.status, 'reconstruction'):
+            pycolmap.extract_features(database_path=database_path, image_path=images_path, camera_model="PINHOLE")
         self.status = "Matching features"
-        pycolmap.match_exhaustive(database_path=database_path)
+        with tracer.span(self.status, 'reconstruction'):
+            pycolmap.match_exhaustive(database_path=database_path)
 
         if not os.path.exists(self.folder_path / "sparse"):
             os.mkdir(self.folder_path / "sparse")
         self.status = "Mapping"
-        subprocess.call(["colmap", "mapper", "--database_path", database_path, "--image_path", images_path, "--output_path", self.folder_path / "sparse"])
+        with tracer.span(self.status, 'reconstruction'):
+            subprocess.call(["colmap", "mapper", "--database_path", database_path, "--image_path", images_path, "--output_path", self.folder_path / "sparse"])
         self.status = "Converting openMVS"
-        subprocess.call(["colmap", "model_converter", "--input_path", self.folder_path / "sparse/0", "--output_path", self.folder_path / "sparse", "--output_type", "TXT"])
+        with tracer.span(self.status, 'reconstruction'):
+            subprocess.call(["colmap", "model_converter", "--input_path", self.folder_path / "sparse/0", "--output_path", self.folder_path / "sparse", "--output_type", "TXT"])
 
     def reconstruction_open_mvs(self, mvs_path: pathlib.Path, low_poly=False): 
         open_mvs_obj = open_mvs(mvs_path, self.folder_path)
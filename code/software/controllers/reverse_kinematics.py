@@ -1,69 +1,138 @@
 import numpy as np
-from scipy.spatial.transform import Rotation as Rot
-import scipy.optimize  as opt
-
-def get_top_cam_angles(hor_angle, vert_angle, arm_angle):
-    # Given final rotation matrix
-    R_final = Rot.from_euler('xyz', [hor_angle, 0, vert_angle], degrees=True).as_matrix()
-
-    # Fixed angle alpha: defines the axis of R1 on the XY plane
+from scipy.interpolate import RegularGridInterpolator
+
+REFINE_ITERATIONS = 8  # Alternated closed form updates of alpha and beta, only needed for unreachable targets
+
+
+def rot_x(angle):
+    """
+    Rotation matrices around the X axis, for an array of angles in radians.
+    """
+    c, s = np.cos(angle), np.sin(angle)
+    o, z = np.ones_like(c), np.zeros_like(c)
+    return np.stack([o, z, z, z, c, -s, z, s, c], axis=-1).reshape(c.shape + (3, 3))
+
+
+def rot_z(angle):
+    """
+    Rotation matrices around the Z axis, for an array of angles in radians.
+    """
+    c, s = np.cos(angle), np.sin(angle)
+    o, z = np.ones_like(c), np.zeros_like(c)
+    return np.stack([c, -s, z, s, c, z, z, z, o], axis=-1).reshape(c.shape + (3, 3))
+
+
+def rot_axis(u, angle):
+    """
+    Rotation matrices around the given unit axes (Rodrigues formula).
+    u (np.ndarray): The axes, of shape (..., 3).
+    angle (np.ndarray): The angles in radians, of shape (...).
+    """
+    c, s = np.cos(angle)[..., None, None], np.sin(angle)[..., None, None]
+    skew = np.zeros(u.shape + (3,))
+    skew[..., 0, 1], skew[..., 0, 2] = -u[..., 2], u[..., 1]
+    skew[..., 1, 0], skew[..., 1, 2] = u[..., 2], -u[..., 0]
+    skew[..., 2, 0], skew[..., 2, 1] = -u[..., 1], u[..., 0]
+    return c * np.eye(3) + s * skew + (1 - c) * np.einsum('...i,...j->...ij', u, u)
+
+
+def target_rotation(hor_angle, vert_angle):
+    """
+    Rotation of the camera for the given angles in degrees, same as Rotation.from_euler('xyz', [hor, 0, vert]).
+    """
+    return rot_z(np.radians(vert_angle)) @ rot_x(np.radians(hor_angle))
+
+
+def solve_top_cam_angles(hor_angle, vert_angle, arm_angle, iterations=REFINE_ITERATIONS):
+    """
+    Decomposes the target rotation into a rotation alpha around the arm axis followed by a rotation beta around Z,
+    minimizing the Frobenius norm of the difference like the previous optimizer did.
+    The inputs are broadcast together so that many targets are solved in one call.
+    hor_angle (np.ndarray): The rotation of the target around X, in degrees.
+    vert_angle (np.ndarray): The rotation of the target around Z, in degrees.
+    arm_angle (np.ndarray): The angle of the arm axis in the XY plane, in degrees.
+    iterations (int): The number of refinements for the targets that can't be reached exactly.
+    Returns:
+        tuple: (alpha, beta) arrays in radians, in [0, 2pi).
+    """
+    hor_angle, vert_angle, arm_angle = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (hor_angle, vert_angle, arm_angle)))
+    r_final = target_rotation(hor_angle, vert_angle)
     gamma = np.radians(arm_angle)
-    u1 = np.array([np.cos(gamma), np.sin(gamma), 0])  # Rotation axis for R1
-    print(u1)
-
-    # Function to compute the error between R_final and R2 @ R1
-    def error_function(params):
-        alpha, beta = params  # Rotation angles for R1 and R2
+    u = np.stack([np.cos(gamma), np.sin(gamma), np.zeros_like(gamma)], axis=-1)
 
-        # R1: Rotation around custom axis u1
-        R1 = Rot.from_rotvec(alpha * u1).as_matrix()
-        print(f'R1 :\n{np.round(R1, 3)}')
-        
-        # R2: Rotation around Z-axis
-        R2 = Rot.from_euler('z', beta).as_matrix()
-        print(f'R2 :\n{np.round(R2, 3)}')
+    # Rz(beta) @ Ru(alpha) maps u to Rz(beta) @ u, so beta is the angle between u and r_final @ u in the XY plane.
+    # This is exact when the target is reachable, the refinement below handles the others.
+    v = np.einsum('...ij,...j->...i', r_final, u)
+    beta = np.arctan2(v[..., 1], v[..., 0]) - gamma
 
-        # Combined rotation
-        R_combined = R2 @ R1
+    for _ in range(max(iterations, 1)):
+        # Best alpha for this beta: maximize tr(Ru(alpha) @ C) with C = r_final^T @ Rz(beta)
+        c = np.einsum('...ji,...jk->...ik', r_final, rot_z(beta))
+        trace = np.einsum('...ii->...', c)
+        utcu = np.einsum('...i,...ij,...j->...', u, c, u)
+        skew_trace = u[..., 1] * (c[..., 2, 0] - c[..., 0, 2]) + u[..., 0] * (c[..., 1, 2] - c[..., 2, 1])
+        alpha = np.arctan2(skew_trace, trace - utcu)
 
-        # Compute error as Frobenius norm
-        error = np.linalg.norm(R_final - R_combined, ord='fro')
-        print(f'RF :\n{np.round(R_final, 3)}')
-        print(f'RC :\n{np.round(R_combined, 3)}')
-        return error
+        # Best beta for this alpha: maximize tr(Rz(beta) @ B) with B = Ru(alpha) @ r_final^T
+        b = rot_axis(u, alpha) @ np.swapaxes(r_final, -1, -2)
+        beta = np.arctan2(b[..., 0, 1] - b[..., 1, 0], b[..., 0, 0] + b[..., 1, 1])
 
-    initial_guess = [0, 0]
+    return alpha % (2*np.pi), beta % (2*np.pi)
 
-    result = opt.minimize(error_function, initial_guess)
-    alpha, beta = result.x % (2*np.pi)
 
-    return alpha, beta
-
-
-if __name__ == "__main__":
-    get_top_cam_angles(90, 0, 89)
+def decomposition_error(hor_angle, vert_angle, arm_angle, alpha, beta):
+    """
+    Returns the Frobenius norm between the target rotation and Rz(beta) @ Ru(alpha).
+    """
+    gamma = np.radians(np.asarray(arm_angle, dtype=float))
+    u = np.stack([np.cos(gamma), np.sin(gamma), np.zeros_like(gamma)], axis=-1)
+    r_combined = rot_z(np.asarray(beta)) @ rot_axis(u, np.asarray(alpha))
+    return np.linalg.norm(target_rotation(hor_angle, vert_angle) - r_combined, axis=(-2, -1))
 
-""" # Initial guess for theta1 and beta
-  # Start with 0 degrees for both rotations
 
-# Solve the optimization problem
-
-
-# Reconstruct the rotations
-R1_optimal = R.from_rotvec(optimal_theta1 * u1).as_matrix()
-R2_optimal = R.from_euler('z', optimal_theta2, degrees=True).as_matrix()
-R_combined_optimal = R2_optimal @ R1_optimal
-
-# Print results
-print("Optimal Angles:")
-print(f"R1 (around custom axis at {np.degrees(alpha)}° with Y): {np.degrees(optimal_theta1)} degrees")
-print(f"R2 (around Z-axis): {optimal_theta2} degrees")
-
-print("\nReconstructed R_final:")
-print(R_combined_optimal)
+def get_top_cam_angles(hor_angle, vert_angle, arm_angle):
+    """
+    Returns the (alpha, beta) angles in radians of the top camera motors reaching the given orientation.
+    hor_angle (float): The rotation of the target around X, in degrees.
+    vert_angle (float): The rotation of the target around Z, in degrees.
+    arm_angle (float): The angle of the arm axis in the XY plane, in degrees.
+    """
+    alpha, beta = solve_top_cam_angles(hor_angle, vert_angle, arm_angle)
+    return float(alpha), float(beta)
+
+
+class ReverseKinematicsTable:
+    def __init__(self, step=5):
+        """
+        Precomputed solutions over a grid of (arm_angle, hor_angle, vert_angle), interpolated on lookup.
+        The sines and cosines of the angles are interpolated so that the wrap around 2pi is continuous.
+        step (float): The grid step in degrees.
+        """
+        self.step = step
+        self.arm_angles = np.arange(-180, 180 + step, step, dtype=float)
+        self.hor_angles = np.arange(-180, 180 + step, step, dtype=float)
+        self.vert_angles = np.arange(-180, 180 + step, step, dtype=float)
+
+        arm, hor, vert = np.meshgrid(self.arm_angles, self.hor_angles, self.vert_angles, indexing='ij')
+        alpha, beta = solve_top_cam_angles(hor, vert, arm)
+        values = np.stack([np.cos(alpha), np.sin(alpha), np.cos(beta), np.sin(beta)], axis=-1)
+        self.interpolator = RegularGridInterpolator((self.arm_angles, self.hor_angles, self.vert_angles), values)
+
+    def lookup(self, hor_angle, vert_angle, arm_angle):
+        """
+        Returns the interpolated (alpha, beta) arrays in radians, in [0, 2pi).
+        The angles are in degrees and broadcast together like for solve_top_cam_angles.
+        """
+        hor_angle, vert_angle, arm_angle = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (hor_angle, vert_angle, arm_angle)))
+        wrap = lambda a: (a + 180) % 360 - 180
+        points = np.stack([wrap(arm_angle), wrap(hor_angle), wrap(vert_angle)], axis=-1)
+        values = self.interpolator(points)
+        alpha = np.arctan2(values[..., 1], values[..., 0])
+        beta = np.arctan2(values[..., 3], values[..., 2])
+        return alpha % (2*np.pi), beta % (2*np.pi)
 
-print("\nOriginal R_final:")
-print(R_final)
 
-# Verify error
-print("\nError:", np.linalg.norm(R_final - R_combined_optimal, ord='fro')) """
+if __name__ == "__main__":
+    alpha, beta = get_top_cam_angles(90, 0, 89)
+    print(f"alpha : {np.degrees(alpha):.2f}, beta : {np.degrees(beta):.2f}, "
+          f"error : {decomposition_error(90, 0, 89, alpha, beta):.2e}")
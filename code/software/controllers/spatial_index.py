@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+
+
+class GridIndex:
+    def __init__(self, cell_size):
+        """
+        Uniform grid hash of 2D points, the proximity queries only look at the cells overlapping the query circle.
+        The points are identified by their row in the caller's arrays.
+        cell_size (float): The side of a cell, about the usual query radius.
+        """
+        self.cell_size = cell_size
+        self.cells = {}     # (i, j) -> list of point ids
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.cells.values())
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, point_id, pos):
+        self.cells.setdefault(self._cell(pos[0], pos[1]), []).append(point_id)
+
+    def rebuild(self, positions):
+        """
+        Indexes the given points from scratch, with ids 0..n-1, e.g. after a batch removal compacted the arrays.
+        positions (np.ndarray): The positions, of shape (n, 2).
+        """
+        self.cells = {}
+        if len(positions) == 0:
+            return
+        keys = np.floor(np.asarray(positions) / self.cell_size).astype(np.int64)
+        cells, inverse = np.unique(keys, axis=0, return_inverse=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        bounds = np.cumsum(np.bincount(inverse.ravel(), minlength=len(cells)))[:-1]
+        for cell, ids in zip(cells.tolist(), np.split(order, bounds)):
+            self.cells[tuple(cell)] = ids.tolist()
+
+    def candidates(self, pos, radius):
+        """
+        Returns the ids of the points in the cells overlapping the circle, a superset of the points within radius.
+        """
+        i0, j0 = self._cell(pos[0] - radius, pos[1] - radius)
+        i1, j1 = self._cell(pos[0] + radius, pos[1] + radius)
+        ids = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = self.cells.get((i, j))
+                if cell:
+                    ids.extend(cell)
+        return np.array(ids, dtype=np.int64)
+
+    def within(self, positions, pos, radius):
+        """
+        Returns the ids of the points closer than radius to the position.
+        positions (np.ndarray): The positions of the indexed points, indexed by id.
+        """
+        ids = self.candidates(pos, radius)
+        if len(ids) == 0:
+            return ids
+        diff = positions[ids] - np.asarray(pos, dtype=float)[:2]
+        return ids[np.einsum('ij,ij->i', diff, diff) < radius**2]
@@ -3,12 +3,17 @@ import time
 import cv2
 import os
 import numpy as np
-from scipy.spatial.transform import Rotation as Rot
-import scipy.optimize as opt
 
 import config.dev_config as dconfig
 
 from controllers.udp_receiver import UDPReceiver
+from controllers.stream_metrics import dump_metrics
+from controllers.command_client import CommandClient
+from controllers.motion_dispatcher import MotionDispatcher
+from controllers.command_coalescer import CommandCoalescer
+from controllers.visual_servo import VisualServo, PID, CentroidKalman
+from controllers.reverse_kinematics import get_top_cam_angles
+from controllers.tracer import tracer
 
 # SS8 connection constants
 DEFAULT_API_URL = "http://superscanner8000:80"
@@ -22,7 +27,23 @@ DEFAULT_ROTATING_ANGLE = 2*np.pi
 BODY_ANGLE_TO_TIME = 510 # Time to rotate the body by 1 radian            TODO: Update this value
 BODY_DIST_TO_TIME = 24 # Time to move the body by 1 cm                   TODO: Update this value
 TOP_CAM_ANGLE_TO_TIME = 1 # Time to rotate the top camera by 1 radian
+TRACK_WIDTH = 26 # Distance between the wheels in cm, turning one wheel pivots around the other one
+MAX_DUTY_CYCLE = 255 # Duty cycle of the wheels at which the time constants are measured
 TOP_CAM_FOV = 60
+FRAME_TIMEOUT = 1 # Max time to wait for a new camera frame in seconds
+CAM_SETTLE_TIME = 0.3 # Time for the camera motors to reach a new target in seconds
+MOTOR_STATUS_PERIOD = 0.1 # Period of the arm and camera status polling while waiting for them to stop in seconds
+STABLE_FRAME_DIFF = 2. # Mean absolute difference in grey levels between two frames of a still image
+STABLE_FRAMES = 2 # Number of consecutive still frames before the image is considered stable
+STABILITY_SCALE = 4 # Reduction factor of the frames compared for the stability
+
+# PID (kp, ki, kd, output limit) of each alignment mode, the error is the angle of the object from the center
+# in degrees. The output is in degrees for 'cam' and 'body' and in cm for 'pos'.
+SERVO_GAINS = {
+    'cam': (0.8, 0.2, 0., 30),
+    'body': (0.7, 0., 0., 30),
+    'pos': (1., 0., 0., 20),
+}
 
 # Dev config constants
 TEST_CONNECTION_TIMEOUT = 3
@@ -39,9 +60,21 @@ class SS8:
 
         self.top_cam_angles = np.array([0,0])
         self.is_aligning = False
-
-        self.top_cam_udp_receiver = UDPReceiver(12346, "0.0.0.0")
-        self.front_cam_udp_receiver = UDPReceiver(12349, "0.0.0.0")
+        self.servo = None # VisualServo of the current alignment
+        self.alignment_reports = [] # ServoReport of each blocking alignment
+        self.alignment_rotation = 0. # Sum of the body rotations of the alignments in radians, positive to the left
+        self.last_motion_time = 0. # time.monotonic() of the last motion command sent
+        self.tracking_scale = 1 # Reduction factor of the top cam frames given to the segmenter
+        self.duty_cycle = MAX_DUTY_CYCLE
+
+        self.fake_frame_id = 0
+        self.fake_frame_timestamp = 0.
+
+        self.client = CommandClient()
+        self.commands = CommandCoalescer(self._send_req)
+        self.motion = MotionDispatcher(self._send_req, self._get_direction, on_motion=self._update_motion_time)
+        self.top_cam_udp_receiver = UDPReceiver(12346, "0.0.0.0", max_fps=dconfig.CAM_MAX_FPS, name="arm")
+        self.front_cam_udp_receiver = UDPReceiver(12349, "0.0.0.0", max_fps=dconfig.CAM_MAX_FPS, name="front")
 
     # Connection methods
 
@@ -67,6 +100,8 @@ class SS8:
         """
 
         self.api_url = api_url
+        self.client.set_base_url(api_url)
+        self.commands.reset()
         self.top_cam_url = top_cam_url
         self.front_cam_url = front_cam_url
 
@@ -95,7 +130,7 @@ class SS8:
             bool: True if the connection is successful.
         """
         try:
-            res = requests.get(self.api_url+"/status", timeout=TEST_CONNECTION_TIMEOUT)
+            res = self.client.get("/status", timeout=TEST_CONNECTION_TIMEOUT)
             if res.status_code == 200:
                 print("Connection successful! Server is reachable.")
             else:
@@ -160,6 +195,8 @@ class SS8:
 
             #cv2.imshow('Frame', frame)
             self.fake_current_frame = frame
+            self.fake_frame_id += 1
+            self.fake_frame_timestamp = time.monotonic()
 
             self.controller.after(int(1000 // video_fps), update_current_frame)
 
@@ -169,17 +206,17 @@ class SS8:
 
     # Instrucitons methods
 
-    def _send_req(self, req_func, on_error=lambda: None):
+    def _send_req(self, route, json=None, on_error=lambda: None):
         """
-        Send a request to the connected device.
+        Send a request to the connected device, on a kept alive connection.
 
         Args:
-            req_func (function): The request function to call.
+            route (str): The route of the request, e.g. "/fwd".
+            json (dict): The body of the request.
             on_error (function): The error callback function.
-            on_success (function): The success callback function.
         """
         try:
-            res = req_func()
+            res = self.client.post(route, json)
             if res.status_code == 200:
                 return res.json()
             else:
@@ -190,93 +227,172 @@ class SS8:
             print(f"An error occurred when sending req : {e}")
             self.connection_lost_callback()
     
-    def move_forward(self, dist=DEFAULT_MOVING_DIST, wait_for_completion=True):
+    def _get_direction(self):
+        """
+        Returns the current direction of the wheels ("stop" when idle), None if it is unavailable.
+        """
+        if not dconfig.CAN_MOVE:
+            return None
+        try:
+            res = self.client.get("/status")
+            if res.status_code == 200:
+                return res.json()["direction"]
+        except Exception as e:
+            if dconfig.DEBUG_SS8:
+                print(f"Could not get the status: {e}")
+        return None
+
+    def _update_motion_time(self):
+        self.last_motion_time = time.monotonic()
+
+    def _move(self, route, ms, wait_for_completion, continuous=False):
+        """
+        Queues a timed motion of the wheels.
+
+        Args:
+            route (str): The route of the motion.
+            ms (float): The duration of the motion at full duty cycle in milliseconds.
+            wait_for_completion (bool): If True, blocks until the motion is finished.
+            continuous (bool): If True, the wheels don't stop before the next motion, see MotionDispatcher.submit.
+        Returns:
+            MotionHandle: The handle on the motion, None if it is shorter than a millisecond.
+        """
+        ms = ms * MAX_DUTY_CYCLE / self.duty_cycle
+        if ms < 1:
+            # The firmware reads whole milliseconds, and moves until stopped for 0 ms
+            return None
+        handle = self.motion.submit(route, ms, send=dconfig.CAN_MOVE, continuous=continuous)
+        self.last_motion_time = time.monotonic()
+        if wait_for_completion:
+            handle.wait()
+        return handle
+
+    def move_forward(self, dist=DEFAULT_MOVING_DIST, wait_for_completion=True, continuous=False):
         """
         Move the device forward.
         dist (int): The distance or duration to move. If positive, the device moves for the given time.
+        wait_for_completion (bool): If False, returns right away, the motion is queued after the current ones.
+        continuous (bool): If True, the wheels don't stop before the next motion.
+        Returns the MotionHandle of the motion.
         """
         ms = dist*BODY_DIST_TO_TIME
 
-        if dconfig.CAN_MOVE:
-            self._send_req(lambda: requests.post(self.api_url + "/fwd", json={"ms": ms}))
-        
         if dconfig.DEBUG_SS8:
             print(f"Moving forward of {dist} cm")
-        
-        if wait_for_completion:
-            time.sleep(ms*0.001)
-        return
+
+        return self._move("/fwd", ms, wait_for_completion, continuous)
 
     def move_backward(self, dist=DEFAULT_MOVING_DIST, wait_for_completion=True):
         """
         Move the device backward.
         dist (int): The distance or duration to move. If positive, the device moves for the given time.
+        wait_for_completion (bool): If False, returns right away, the motion is queued after the current ones.
+        Returns the MotionHandle of the motion.
         """
         ms=dist*BODY_DIST_TO_TIME
 
-        if dconfig.CAN_MOVE:
-            self._send_req(lambda: requests.post(self.api_url + "/bwd", json={"ms": ms}))
-        
-        
         if dconfig.DEBUG_SS8:
             print(f"Moving backward of {dist} cm")
 
-        if wait_for_completion:
-            time.sleep(ms*0.001)
-
-        return
+        return self._move("/bwd", ms, wait_for_completion)
         
-    def rotate_left(self, angle=DEFAULT_ROTATING_ANGLE, wait_for_completion=True):
+    def rotate_left(self, angle=DEFAULT_ROTATING_ANGLE, wait_for_completion=True, continuous=False):
         """
-        Rotate the device to the left.
+        Rotate the device to the left, only the right wheel turns forward (motor1 in wheels.cpp) so it pivots
+        around its left wheel.
         angle (int): The angleance or duration to rotate. If positive, the device rotates for the given time. 
                     If negative, the device rotates until it stops.
+        wait_for_completion (bool): If False, returns right away, the motion is queued after the current ones.
+        continuous (bool): If True, the wheels don't stop before the next motion.
+        Returns the MotionHandle of the motion, None if the angle is null.
         """
         ms=angle*BODY_ANGLE_TO_TIME
 
         if(angle < 0.000001):
-            return
+            return None
 
-        if dconfig.CAN_MOVE:
-            self._send_req(lambda: requests.post(self.api_url + "/lft", json={"ms": angle*BODY_ANGLE_TO_TIME}))
-        
         if dconfig.DEBUG_SS8:
             print(f"Rotating left of {round(angle*180/np.pi)} degrees")
 
-        if wait_for_completion:
-            time.sleep(ms*0.001)
-
-        return
+        return self._move("/lft", ms, wait_for_completion, continuous)
         
-    def rotate_right(self, angle=DEFAULT_ROTATING_ANGLE, wait_for_completion=True):
+    def rotate_right(self, angle=DEFAULT_ROTATING_ANGLE, wait_for_completion=True, continuous=False):
         """
-        Rotate the device to the right.
+        Rotate the device to the right, only the right wheel turns backward (motor1 in wheels.cpp) so it pivots
+        around its left wheel too, backing up.
         angle (int): The angleance or duration to rotate. If positive, the device rotates for the given time. 
                     If negative, the device rotates until it stops.
-        
+        wait_for_completion (bool): If False, returns right away, the motion is queued after the current ones.
+        continuous (bool): If True, the wheels don't stop before the next motion.
+        Returns the MotionHandle of the motion, None if the angle is null.
         """
         ms=angle*BODY_ANGLE_TO_TIME
 
         if(angle < 0.000001):
-            return
+            return None
 
-        if dconfig.CAN_MOVE:
-            self._send_req(lambda: requests.post(self.api_url + "/rgt", json={"ms": angle*BODY_ANGLE_TO_TIME}))
-        
         if dconfig.DEBUG_SS8:
             print(f"Rotating right of {round(angle*180/np.pi, 1)} degrees")
 
-        if wait_for_completion:
-            time.sleep(ms*0.001)
+        return self._move("/rgt", ms, wait_for_completion, continuous)
 
-        return
+    def turn_left(self, angle, wait_for_completion=True, continuous=False):
+        """
+        Turn the device on itself to the left, both wheels turn so it is twice as fast as rotate_left.
+        angle (float): The angle to turn in radians.
+        wait_for_completion (bool): If False, returns right away, the motion is queued after the current ones.
+        continuous (bool): If True, the wheels don't stop before the next motion.
+        Returns the MotionHandle of the motion, None if the angle is null.
+        """
+        if(angle < 0.000001):
+            return None
+
+        if dconfig.DEBUG_SS8:
+            print(f"Turning left of {round(angle*180/np.pi, 1)} degrees")
+
+        return self._move("/hlft", angle*BODY_ANGLE_TO_TIME/2, wait_for_completion, continuous)
+
+    def turn_right(self, angle, wait_for_completion=True, continuous=False):
+        """
+        Turn the device on itself to the right, both wheels turn so it is twice as fast as rotate_right.
+        angle (float): The angle to turn in radians.
+        wait_for_completion (bool): If False, returns right away, the motion is queued after the current ones.
+        continuous (bool): If True, the wheels don't stop before the next motion.
+        Returns the MotionHandle of the motion, None if the angle is null.
+        """
+        if(angle < 0.000001):
+            return None
+
+        if dconfig.DEBUG_SS8:
+            print(f"Turning right of {round(angle*180/np.pi, 1)} degrees")
+
+        return self._move("/hrgt", angle*BODY_ANGLE_TO_TIME/2, wait_for_completion, continuous)
+
+    def set_speed(self, duty_cycle):
+        """
+        Set the duty cycle of the wheels, the durations of the next motions are scaled accordingly.
+        The queued motions are finished first, as their durations are computed at the current duty cycle.
+        duty_cycle (int): The duty cycle, from 1 to MAX_DUTY_CYCLE.
+        """
+        duty_cycle = int(min(max(duty_cycle, 1), MAX_DUTY_CYCLE))
+        if duty_cycle == self.duty_cycle:
+            return
+
+        self.motion.wait_idle()
+        if dconfig.CONNECT_TO_MOV_API:
+            self._send_req("/speed", {"speed": duty_cycle})
+        self.duty_cycle = duty_cycle
+
+        if dconfig.DEBUG_SS8:
+            print(f"Wheels duty cycle set to {duty_cycle}")
 
     def stop_mov(self):
         """
-        Stop the device movement.
+        Stop the device movement and cancel the queued motions.
         """
+        self.motion.cancel_all(stop=False)
         if dconfig.CONNECT_TO_MOV_API:
-            self._send_req(lambda: requests.post(self.api_url + "/stp"))
+            self._send_req("/stp")
 
         if dconfig.DEBUG_SS8:
             print("Stopping movement")
@@ -291,10 +407,12 @@ class SS8:
         """
             
         if dconfig.CONNECT_TO_MOV_API:
+            # A target still queued is replaced by the new one
             if (x == 0 and y == 0):
-                self._send_req(lambda: requests.post(self.api_url + "/arm/goto", json={"x": 0, "y": 0, "angles": True}))
+                self.commands.send("/arm/goto", {"x": 0, "y": 0, "angles": True}, on_sent=self._update_motion_time)
             else:
-                self._send_req(lambda: requests.post(self.api_url + "/arm/goto", json={"x": x, "y": y}))
+                self.commands.send("/arm/goto", {"x": x, "y": y}, on_sent=self._update_motion_time)
+        self.last_motion_time = time.monotonic()
         
         if dconfig.DEBUG_SS8:
             print(f"Moving arm to position {x},{y}")
@@ -307,7 +425,8 @@ class SS8:
         """
         
         if dconfig.CONNECT_TO_MOV_API:
-            self._send_req(lambda: requests.post(self.api_url + "/arm/stp"))
+            self.commands.flush()
+            self._send_req("/arm/stp")
 
         if dconfig.DEBUG_SS8:
             print("Stopping arm movement")
@@ -315,40 +434,11 @@ class SS8:
         return
         
     def _get_reverse_kin_angle(self, x_angle, y_angle):
-        # Given final rotation matrix
-        R_final = Rot.from_euler('xyz', [x_angle, 0, y_angle], degrees=True).as_matrix()
-
-        # Fixed angle alpha: defines the axis of R1 on the XY plane
-        gamma = np.radians(self.top_cam_angles[1])
-        u1 = np.array([np.cos(gamma), np.sin(gamma), 0])  # Rotation axis for R1
-        print(u1)
-        # Function to compute the error between R_final and R2 @ R1
-        def error_function(params):
-            alpha, beta = params  # Rotation angles for R1 and R2
-
-            # R1: Rotation around custom axis u1
-            R1 = Rot.from_rotvec(alpha * u1).as_matrix()
-            
-            # R2: Rotation around Z-axis
-            R2 = Rot.from_euler('z', beta).as_matrix()
-
-            # Combined rotation
-            R_combined = R2 @ R1
-
-            # Compute error as Frobenius norm
-            error = np.linalg.norm(R_final - R_combined, ord='fro')
-
-            print(f'RC :\n{np.round(R_combined, 3)}')
-            return error
-
-        initial_guess = [0.1, 0.1]
-
-        result = opt.minimize(error_function, initial_guess, method='Nelder-Mead')
-        opt_alpha, opt_beta = result.x % (2*np.pi)
-
-        print(f'RF :\n{np.round(R_final, 3)}')
-
-        return np.array([opt_alpha, opt_beta])
+        """
+        Returns the (alpha, beta) angles in radians of the camera motors reaching the given orientation,
+        solved in closed form around the current axis of the camera.
+        """
+        return np.array(get_top_cam_angles(x_angle, y_angle, self.top_cam_angles[1]))
     
     def goto_cam(self, x_angle, y_angle, relative=False):
         """
@@ -372,7 +462,9 @@ class SS8:
             print(f"Moving camera to position {int(alpha)}, {int(beta)}")
         
         if dconfig.CONNECT_TO_MOV_API:
-            self._send_req(lambda: requests.post(self.api_url + "/cam/goto", json={"alpha": int(alpha), "beta": int(beta)}))
+            # A target still queued is replaced by the new one
+            self.commands.send("/cam/goto", {"alpha": int(alpha), "beta": int(beta)}, on_sent=self._update_motion_time)
+        self.last_motion_time = time.monotonic()
         
         self.top_cam_angles = np.array([alpha, beta])
         return 
@@ -383,7 +475,8 @@ class SS8:
         """
         
         if dconfig.CONNECT_TO_MOV_API:
-            data = self._send_req(lambda: requests.post(self.api_url + "/cam/stp"))
+            self.commands.flush()
+            data = self._send_req("/cam/stp")
 
             if data is not None:
                 self.top_cam_angles = np.array([data['alpha'], data['beta']])
@@ -398,7 +491,7 @@ class SS8:
         text (str): The text to display.
         """
         if dconfig.CONNECT_TO_MOV_API:
-            requests.post(self.api_url + "/text", json={"text": text})
+            self.commands.send("/text", {"text": text})
         
         if(dconfig.DEBUG_SS8):
             print(f"Displaying text: {text}")
@@ -411,7 +504,7 @@ class SS8:
         text (str): The text to display.
         """
         if dconfig.CONNECT_TO_MOV_API:
-            requests.post(self.api_url + "/progress", json={"text": text, "progress": progress})
+            self.commands.send("/progress", {"text": text, "progress": progress})
         
         if(dconfig.DEBUG_SS8):
             print(f"Displaying text: {text}")
@@ -426,7 +519,7 @@ class SS8:
         line2 (str): The text to display on the second line.
         """
         if dconfig.CONNECT_TO_MOV_API:
-            requests.post(self.api_url + "/scroll", json={"text1": line1, "text2": line2})
+            self.commands.send("/scroll", {"text1": line1, "text2": line2})
         
         if(dconfig.DEBUG_SS8):
             print(f"Displaying text: {line1}, {line2}")
@@ -443,7 +536,7 @@ class SS8:
         b (int): The blue value. range [0, 255]
         """
         if dconfig.CONNECT_TO_MOV_API:
-            requests.post(self.api_url + "/led/set", json={"r": r, "g": g, "b": b})
+            self.commands.send("/led/set", {"r": r, "g": g, "b": b})
         
         if(dconfig.DEBUG_SS8):
             print(f"Set LED color to {r}, {g}, {b}")
@@ -455,7 +548,7 @@ class SS8:
         Set the LED to rainbow mode.
         """
         if dconfig.CONNECT_TO_MOV_API:
-            requests.post(self.api_url + "/led/rainbow", json={"rainbow": True})
+            self.commands.send("/led/rainbow", {"rainbow": True})
         
         if(dconfig.DEBUG_SS8):
             print("Set LED to rainbow mode")
@@ -471,7 +564,7 @@ class SS8:
         duration (int): The duration of the flash in milliseconds.
         """
         if dconfig.CONNECT_TO_MOV_API:
-            requests.post(self.api_url + "/led/flash", json={"r": r, "g": g, "b": b, "duration": duration})
+            self.commands.send("/led/flash", {"r": r, "g": g, "b": b, "duration": duration})
         if dconfig.DEBUG_SS8:
             print(f"Flashing LED with color {r}, {g}, {b} for {duration} ms")
     
@@ -486,129 +579,110 @@ class SS8:
     def is_top_cam_vertical(self):
         return np.abs(self.top_cam_angles[0]) > np.abs(self.top_cam_angles[0] + 90)
     
+    def _get_alignment_axis(self, mode):
+        return 0 if mode == 'pos' else int(self.is_top_cam_vertical())
+
+    def _make_alignment_servo(self, mode, measure, tolerance, timeout=None, kalman=None):
+        """
+        Builds the VisualServo of align_to, which moves the body or the camera according to the mode.
+
+        Args:
+            mode (str): One of the modes of SERVO_GAINS.
+            measure (function): Returns the (error in degrees, timestamp) of the object on the alignment axis.
+            tolerance (float): The error in degrees below which the object is centered.
+            timeout (float): The max duration of the alignment in seconds, None for no limit.
+            kalman (CentroidKalman): The filter of the errors, None to use them as measured.
+        Returns:
+            VisualServo: The servo, not started.
+        """
+        def actuate(output):
+            if mode == 'cam':
+                self.goto_cam(0, output, relative=True)
+            elif mode == 'body':
+                # The object moves the other way on the vertical axis of the rotated image
+                angle = np.radians(output) if self._get_alignment_axis(mode) == 0 else -np.radians(output)
+                if angle > 0:
+                    self.rotate_left(angle)
+                else:
+                    self.rotate_right(-angle)
+                self.alignment_rotation += angle
+            elif output > 0:
+                self.move_backward(dist=output)
+            else:
+                self.move_forward(dist=-output)
+
+        def on_lost():
+            if(dconfig.DEBUG_NAV):
+                print('Obj tracked not found')
+            if mode == 'cam':
+                self.goto_cam(0, 30, relative=True)
+            elif mode == 'body':
+                self.rotate_left(np.radians(10))
+                self.alignment_rotation += np.radians(10)
+
+        kp, ki, kd, output_limit = SERVO_GAINS[mode]
+        return VisualServo(
+            mode, measure, actuate, PID(kp, ki, kd, output_limit),
+            tolerance=tolerance,
+            timeout=timeout,
+            max_lost=dconfig.GALERE_TOLERANCE if mode != 'pos' else None,
+            on_lost=on_lost,
+            kalman=kalman,
+        )
+
     def align_to(self, mode='pos', wait_for_completion=True, keep_arm_cam_settings=False, tolerance_ratio=1):
-        if(not dconfig.CONNECT_TO_TOP_CAM):
-            return
         """
         Start the object tracking. The camera will try to keep the object in the center of its view.
+        A correction is sent for each new mask computed after the previous correction, until the object
+        is centered or ALIGNMENT_TIMEOUT expires.
+
+        Args:
+            mode (str): 'pos' to move the body along its axis, 'body' to rotate it, otherwise the camera is rotated.
+            wait_for_completion (bool): If False, keeps tracking the object in the background until stop_align_to.
+            keep_arm_cam_settings (bool): If False, the arm and the camera are reset before aligning.
+            tolerance_ratio (float): The factor applied to the centering tolerance.
+        Returns:
+            float: The angle of the second camera motor at the end of the alignment.
         """
-        def get_diff():
-            frame = self.capture_image()
+        if(not dconfig.CONNECT_TO_TOP_CAM):
+            return
+        if mode not in SERVO_GAINS:
+            mode = 'cam'
+
+        # Degrees per full resolution pixel, updated from the frames
+        deg_per_px = [TOP_CAM_FOV / 320]
+
+        def measure():
+            # Only use a frame captured after the last correction
+            settle = CAM_SETTLE_TIME if mode == 'cam' else 0.
+            res = self.wait_for_new_image(after_motion=True, scale=self.tracking_scale, settle=settle)
+            if res is None:
+                return None
+            frame_id, timestamp, frame = res
+            deg_per_px[0] = TOP_CAM_FOV / (frame.shape[1] * self.tracking_scale)
 
             if(self.is_top_cam_vertical()):
                 frame = self.controller.segmenter.rotate_crop_image_of_90_clockwise(frame)
             
-            obj_coords = self.controller.segmenter.get_object_coords(frame, False)
+            obj_coords = self.controller.segmenter.get_object_coords(frame, True, frame_id)
             if obj_coords is None:
-                return np.array(['not found', 'not found'])
+                return None, timestamp
             
             [height, width] = frame.shape[:2]
+            # Diff in full resolution pixels, so that the thresholds don't depend on the tracking scale
+            diff = (obj_coords - np.array([width, height])/2) * self.tracking_scale
 
             if(dconfig.DEBUG_NAV):
-                print(f'Obj coords : {obj_coords}')
-                print(f'Frame center : {np.array([width, height])/2}')
-                print(f'Cam is vertical : {self.is_top_cam_vertical()}')
-
-            return (obj_coords - np.array([width, height])/2)
-
-        def update_cam_angle(): 
-            curr_diff = get_diff()
-            if(dconfig.DEBUG_NAV):
-                print('Aligning cam angle to obj')
-
-            if(curr_diff[0]=='not found'):
-                if(dconfig.DEBUG_NAV):
-                    print('Obj tracked not found', self.galere_counter)
-                if(self.galere_counter>dconfig.GALERE_TOLERANCE):
-                    self.goto_cam(0, 30, relative=True)
-                    self.galere_counter=0
-                else:
-                    self.galere_counter+=1
-                
-                return
-            
-            if(self.is_top_cam_vertical()):
-                diff_axis = 1
-                diff_angle = np.power(np.abs(curr_diff[1]), 1/2.5)/2
-            else :
-                diff_axis = 0
-                diff_angle = np.power(np.abs(curr_diff[0]), 1/2.5)/2
-            
-            self.galere_counter=0
-
-            if (dconfig.DEBUG_NAV):
-                print(f'Current diff : {curr_diff[diff_axis]}, will move of {diff_angle} degrees')
-                print(f'Current saved angle : {self.top_cam_angles[1]}') 
-
-            if(curr_diff[diff_axis] > center_threshold):
-                self.goto_cam(0, diff_angle, relative=True)
-            elif(curr_diff[diff_axis] < -center_threshold):
-                self.goto_cam(0, -diff_angle, relative=True)
-            elif(wait_for_completion):
-                if(dconfig.DEBUG_NAV):
-                    print(f'Alignment finished with angle : {self.top_cam_angles[1]}, diff {curr_diff[0]}')
-                
-                self.is_aligning=False
-                return self.top_cam_angles[1]
-        
-        def update_body_angle(): 
-            curr_diff = get_diff()
-            
-            alpha = self.top_cam_angles[0]
+                print(f'Obj coords : {obj_coords}, diff : {diff}, cam is vertical : {self.is_top_cam_vertical()}')
 
-            if(not self.is_top_cam_vertical()):
-                diff_axis = 0
-            else :
-                diff_axis=1
+            return diff[self._get_alignment_axis(mode)] * deg_per_px[0], timestamp
 
-            if(dconfig.DEBUG_NAV):
-                print('Align body angle to obj')
-            
-            if(curr_diff[diff_axis]=='not found'):
-                if(self.galere_counter>dconfig.GALERE_TOLERANCE):
-                    self.rotate_left(10)
-                    self.galere_counter=0
-                else:
-                    self.galere_counter+=1
-                return
-                        
-            self.galere_counter=0
-            diff_angle = np.sqrt((np.abs(curr_diff[diff_axis]))*np.pi/2000)
-            if(curr_diff[diff_axis] > center_threshold):
-                self.stop_mov()
-                if(diff_axis==0):
-                    self.rotate_left(diff_angle)
-                else:
-                    self.rotate_right(diff_angle)
-            elif(curr_diff[diff_axis] < -center_threshold):
-                self.stop_mov()
-                if(diff_axis==0):
-                    self.rotate_right(diff_angle)
-                else:
-                    self.rotate_left(diff_angle)
-            else:
-                self.is_aligning=False
-                return self.top_cam_angles[1]
-        
-        def update_pos_alignment():
-            curr_diff = get_diff()
-            if(dconfig.DEBUG_SS8):
-                print('Align body position to obj')
-            
-            if(curr_diff[0]=='not found'):
-                return
-                
-            elif(curr_diff[0] > center_threshold):
-                self.stop_mov()
-                self.move_backward(dist=np.sqrt(np.abs(curr_diff[0]))*dconfig.ALIGNMENT_SPEED, wait_for_completion=False)
-            elif(curr_diff[0] < -center_threshold):
-                self.stop_mov()
-                self.move_forward(dist=np.sqrt(np.abs(curr_diff[0]))*dconfig.ALIGNMENT_SPEED, wait_for_completion=False)
-            else:
-                self.is_aligning=False
-                return self.top_cam_angles[1]
-            
-        center_threshold = dconfig.CENTER_THRESHOLD * tolerance_ratio
+        self.servo = self._make_alignment_servo(
+            mode, measure,
+            tolerance=dconfig.CENTER_THRESHOLD * tolerance_ratio * deg_per_px[0],
+            timeout=dconfig.ALIGNMENT_TIMEOUT if wait_for_completion else None,
+            kalman=CentroidKalman() if dconfig.ALIGNMENT_KALMAN else None,
+        )
 
         if dconfig.DEBUG_NAV:
             print(f"Start tracking the object. Keep arm cam settings : {keep_arm_cam_settings}. Mode : {mode}")
@@ -618,55 +692,42 @@ class SS8:
             self.goto_cam(0, 90)
 
         self.is_aligning = True
-        self.galere_counter = 0
-        res = None
         self.stop_cam()
 
-        def update_align_to():
-            if mode=='pos':
-                return update_pos_alignment()
-            elif mode =='body':
-                return update_body_angle()
-            else:
-                return update_cam_angle()
-
-        if(wait_for_completion):
-            while self.is_aligning:
-                res = update_align_to()
-                time.sleep(dconfig.ALIGNMENT_WAIT)
-
-        else:
-            def loop():
-                update_align_to()
-                if self.is_aligning:
-                    self.controller.after(dconfig.ALIGNMENT_WAIT*1000, loop)
-
-            loop()
+        if not wait_for_completion:
+            self.servo.start()
+            return None
 
-
-        if(dconfig.DEBUG_NAV and res is not None and False):
-            print(f'Aligned with angle {res}')
-        
-        return res
+        with tracer.span('align_to', 'align', mode=mode) as span:
+            report = self.servo.run()
+            span.set(**report.as_dict())
+        self.alignment_reports.append(report)
+        self.is_aligning = False
+        return self.top_cam_angles[1]
         
     def stop_align_to(self):
         self.is_aligning = False
+        if self.servo is not None:
+            self.servo.stop()
         
-    def capture_image(self, src='arm', save_to_dir=False):
+    @tracer.traced('capture_image', 'capture')
+    def capture_image(self, src='arm', save_to_dir=False, scale=1):
         """
         Captures an image from the ESP32.
         
         Args:
             src (str): The source from which to capture the image. Default is 'arm'.
+            save_to_dir (bool): If True, the full resolution image is also saved.
+            scale (int): The reduction factor of the returned image, one of 1, 2, 4 or 8.
         Returns:
             cv2.typing.MatLike: The captured image in a format compatible with OpenCV.
         """
         if(dconfig.TEST_SEG_WITH_VID):
-            img = self.fake_current_frame
+            img = self._scale_fake_frame(scale)
         elif src == 'arm':
-            img = self.top_cam_udp_receiver.get_current_frame()
+            img = self.top_cam_udp_receiver.get_current_frame(scale)
         elif src == 'front':
-            img = self.front_cam_udp_receiver.get_current_frame()
+            img = self.front_cam_udp_receiver.get_current_frame(scale)
 
         if save_to_dir:
             self.top_cam_udp_receiver.save_frame()
@@ -674,3 +735,180 @@ class SS8:
             #self.controller.segmenter.save_mask()
         
         return img
+
+    def flush_captures(self):
+        """
+        Blocks until all the saved images are written to the disk.
+        """
+        self.top_cam_udp_receiver.writer.flush()
+
+    def get_command_stats(self):
+        """
+        Returns the counters of the requests to the ESP32-S2 saved by the command coalescing.
+        """
+        return self.commands.snapshot()
+
+    def get_stream_metrics(self, src='arm'):
+        """
+        Returns the health metrics of a camera stream.
+
+        Args:
+            src (str): The camera, 'arm' or 'front'.
+        Returns:
+            StreamMetrics: The metrics, use snapshot() or summary() to read them.
+        """
+        return self._get_receiver(src).metrics
+
+    def dump_stream_metrics(self, path):
+        """
+        Writes the metrics of both camera streams to a JSON file.
+
+        Args:
+            path (str): The path of the file.
+        """
+        dump_metrics([self.top_cam_udp_receiver.metrics, self.front_cam_udp_receiver.metrics], path)
+
+    def _get_receiver(self, src):
+        return self.top_cam_udp_receiver if src == 'arm' else self.front_cam_udp_receiver
+
+    def _scale_fake_frame(self, scale):
+        frame = self.fake_current_frame
+        if scale == 1 or frame is None:
+            return frame
+        return cv2.resize(frame, (frame.shape[1] // scale, frame.shape[0] // scale), interpolation=cv2.INTER_AREA)
+
+    def capture_latest(self, src='arm', after_id=0, scale=1):
+        """
+        Returns the latest image of the given camera if it is newer than after_id, without blocking.
+
+        Args:
+            src (str): The camera, 'arm' or 'front'.
+            after_id (int): The id of the last frame already processed by the caller.
+            scale (int): The reduction factor of the returned image, one of 1, 2, 4 or 8.
+        Returns:
+            tuple: (frame_id, timestamp, image), or None if there is no new image.
+        """
+        if(dconfig.TEST_SEG_WITH_VID):
+            if self.fake_frame_id <= after_id:
+                return None
+            return self.fake_frame_id, self.fake_frame_timestamp, self._scale_fake_frame(scale)
+
+        return self._get_receiver(src).latest(after_id, scale)
+
+    def wait_for_new_image(self, src='arm', after_id=0, timeout=FRAME_TIMEOUT, after_motion=False, scale=1, settle=0.):
+        """
+        Waits for an image of the given camera newer than after_id.
+
+        Args:
+            src (str): The camera, 'arm' or 'front'.
+            after_id (int): The id of the last frame already processed by the caller.
+            timeout (float): The maximum time to wait in seconds.
+            after_motion (bool): If True, also wait for an image received after the last motion command.
+            scale (int): The reduction factor of the returned image, one of 1, 2, 4 or 8.
+            settle (float): With after_motion, the time the motion takes to settle after the last command in seconds.
+        Returns:
+            tuple: (frame_id, timestamp, image), or None if the timeout expired.
+        """
+        not_before = self.last_motion_time + settle if after_motion else None
+
+        if(dconfig.TEST_SEG_WITH_VID):
+            deadline = time.monotonic() + timeout
+            while self.fake_frame_id <= after_id or (not_before is not None and self.fake_frame_timestamp <= not_before):
+                if time.monotonic() > deadline:
+                    return None
+                time.sleep(0.01)
+            return self.fake_frame_id, self.fake_frame_timestamp, self._scale_fake_frame(scale)
+
+        return self._get_receiver(src).wait_for_new_frame(after_id, timeout, not_before, scale)
+
+    def clock(self):
+        """
+        Returns the current time of the device in seconds, to measure the durations of the scan.
+        """
+        return time.monotonic()
+
+    def sleep(self, duration, name='sleep'):
+        """
+        Waits for the given duration in seconds, recorded in the timeline of the scan.
+        """
+        tracer.sleep(duration, name)
+
+    def wait_settled(self, timeout=None, stable_frames=STABLE_FRAMES):
+        """
+        Blocks until the wheels, the arm and the camera stopped and the top cam image stopped changing.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds, ARM_SETTLE_TIMEOUT by default.
+            stable_frames (int): The number of consecutive still frames needed, 0 to only wait for the motors.
+        Returns:
+            bool: False if the timeout expired before.
+        """
+        if timeout is None:
+            timeout = dconfig.ARM_SETTLE_TIMEOUT
+        deadline = time.monotonic() + timeout
+
+        with tracer.span('wait settled', 'settle') as span:
+            settled = self._wait_motors_stopped(deadline)
+            span.set(motors_time=timeout - (deadline - time.monotonic()))
+            if settled and stable_frames > 0 and dconfig.CONNECT_TO_TOP_CAM:
+                settled = self._wait_stable_image(deadline, stable_frames)
+            span.set(settled=settled)
+
+        if dconfig.DEBUG_SS8:
+            print(f"Settled : {settled} after {timeout - (deadline - time.monotonic()):.2f} s")
+        return settled
+
+    def _get_motors_moving(self):
+        """
+        Returns True if the arm or the camera motors are moving, None if their status is unavailable.
+        """
+        try:
+            moving = False
+            for route in ("/arm/status", "/cam/status"):
+                res = self.client.get(route)
+                if res.status_code != 200:
+                    return None
+                moving = moving or res.json()["moving"]
+            return moving
+        except Exception as e:
+            if dconfig.DEBUG_SS8:
+                print(f"Could not get the motors status: {e}")
+            return None
+
+    def _wait_motors_stopped(self, deadline):
+        if not dconfig.CONNECT_TO_MOV_API:
+            return True
+
+        # The queued targets must be sent before the status means anything
+        if not self.commands.flush(max(deadline - time.monotonic(), 0)):
+            return False
+
+        while time.monotonic() < deadline:
+            moving = self._get_motors_moving()
+            if moving is None:
+                time.sleep(min(dconfig.ARM_MOV_WAITING_TIME, max(deadline - time.monotonic(), 0)))
+                return True
+            if not moving and self.motion.idle():
+                return True
+            time.sleep(MOTOR_STATUS_PERIOD)
+        return False
+
+    def _wait_stable_image(self, deadline, stable_frames):
+        """
+        Waits for consecutive frames whose mean difference is under STABLE_FRAME_DIFF, i.e. the arm stopped shaking.
+        """
+        frame_id = 0
+        prev = None
+        stable = 0
+        while stable < stable_frames:
+            res = self.wait_for_new_image(after_id=frame_id, timeout=max(deadline - time.monotonic(), 0), scale=STABILITY_SCALE)
+            if res is None:
+                return False
+            frame_id, _, frame = res
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if prev is not None and gray.shape == prev.shape and cv2.absdiff(gray, prev).mean() < STABLE_FRAME_DIFF:
+                stable += 1
+            else:
+                stable = 0
+            prev = gray
+        return True
@@ -0,0 +1,190 @@
+import bisect
+import collections
+import json
+import threading
+import time
+
+DEFAULT_RATE_WINDOW = 5     # Window of the rolling rates in seconds
+
+# Bucket upper bounds of the latency histograms in milliseconds, the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class RollingRate:
+    def __init__(self, window=DEFAULT_RATE_WINDOW):
+        """
+        Counts events over a sliding time window.
+        window (float): The duration of the window in seconds.
+        """
+        self.window = window
+        self.events = collections.deque()   # (timestamp, amount)
+        self.window_total = 0
+        self.total = 0
+
+    def add(self, amount=1, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.events.append((now, amount))
+        self.window_total += amount
+        self.total += amount
+        self._expire(now)
+
+    def rate(self, now=None):
+        """
+        Returns the amount per second over the window.
+        """
+        if now is None:
+            now = time.monotonic()
+        self._expire(now)
+        return self.window_total / self.window
+
+    def _expire(self, now):
+        while self.events and self.events[0][0] < now - self.window:
+            self.window_total -= self.events.popleft()[1]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        """
+        Fixed bucket histogram of durations.
+        buckets (tuple): The sorted upper bounds of the buckets in milliseconds.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def add(self, value_ms):
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, p):
+        """
+        Returns the upper bound of the bucket holding the given percentile, the max for the last bucket.
+        p (float): The percentile, between 0 and 100.
+        """
+        if self.count == 0:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.sum / self.count if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max,
+            'buckets_ms': [[bound, count] for bound, count in zip(self.buckets + ('inf',), self.counts)],
+        }
+
+
+class StreamMetrics:
+    def __init__(self, name, window=DEFAULT_RATE_WINDOW):
+        """
+        Health metrics of a camera stream: rates of the network and counts of the failures,
+        decode time and age of the frames when they are read.
+        name (str): The name of the stream in the snapshots.
+        window (float): The duration of the window of the rates in seconds.
+        """
+        self.name = name
+        self.lock = threading.Lock()    # Updated by the event loop and by the readers of the frames
+
+        self.datagrams = RollingRate(window)
+        self.bytes = RollingRate(window)
+        self.frames = RollingRate(window)   # Complete frames kept for the readers
+        self.dropped_frames = 0             # Complete frames discarded by the max_fps limit
+        self.truncated_frames = 0           # Frames whose end was lost
+        self.corrupt_frames = 0             # Complete frames that could not be decoded
+        self.last_datagram_time = None
+        self.decode_time = Histogram()
+        self.frame_age = Histogram()
+
+    def record_datagram(self, nbytes):
+        now = time.monotonic()
+        with self.lock:
+            self.datagrams.add(1, now)
+            self.bytes.add(nbytes, now)
+            self.last_datagram_time = now
+
+    def record_frame(self):
+        with self.lock:
+            self.frames.add()
+
+    def record_dropped(self, count=1):
+        with self.lock:
+            self.dropped_frames += count
+
+    def set_truncated(self, count):
+        with self.lock:
+            self.truncated_frames = count
+
+    def record_decode(self, duration, success):
+        """
+        duration (float): The decode time in seconds.
+        success (bool): False if the frame could not be decoded.
+        """
+        with self.lock:
+            self.decode_time.add(duration * 1000)
+            if not success:
+                self.corrupt_frames += 1
+
+    def record_frame_age(self, timestamp):
+        """
+        timestamp (float): The time.monotonic() reception time of the frame being read.
+        """
+        age = time.monotonic() - timestamp
+        with self.lock:
+            self.frame_age.add(age * 1000)
+
+    def snapshot(self):
+        """
+        Returns the current metrics as a JSON serializable dict.
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                'name': self.name,
+                'datagrams_per_s': self.datagrams.rate(now),
+                'bytes_per_s': self.bytes.rate(now),
+                'fps': self.frames.rate(now),
+                'datagrams': self.datagrams.total,
+                'bytes': self.bytes.total,
+                'frames': self.frames.total,
+                'dropped_frames': self.dropped_frames,
+                'truncated_frames': self.truncated_frames,
+                'corrupt_frames': self.corrupt_frames,
+                'since_last_datagram_s': now - self.last_datagram_time if self.last_datagram_time else None,
+                'decode_time': self.decode_time.snapshot(),
+                'frame_age': self.frame_age.snapshot(),
+            }
+
+    def summary(self):
+        """
+        Returns a one line summary of the snapshot, for the GUI and the debug prints.
+        """
+        snapshot = self.snapshot()
+        decode = snapshot['decode_time']['p50_ms']
+        age = snapshot['frame_age']['p50_ms']
+        return (f"{self.name}: {snapshot['fps']:.1f} fps, {snapshot['bytes_per_s'] / 1024:.0f} KiB/s, "
+                f"{snapshot['truncated_frames'] + snapshot['corrupt_frames']} lost, "
+                f"decode {'-' if decode is None else f'{decode:.0f} ms'}, age {'-' if age is None else f'{age:.0f} ms'}")
+
+
+def dump_metrics(metrics, path):
+    """
+    Writes the snapshots of the given metrics to a JSON file.
+    metrics (list[StreamMetrics]): The metrics to dump.
+    path (str): The path of the file.
+    """
+    with open(path, 'w') as file:
+        json.dump({'time': time.time(), 'streams': [m.snapshot() for m in metrics]}, file, indent=2)
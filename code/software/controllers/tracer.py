@@ -0,0 +1,177 @@
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+from config.dev_config import TRACE_SCAN
+
+MAX_EVENTS = 200000     # Events kept per trace, the oldest ones are dropped after that
+
+
+class _Span:
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._add({
+            'name': self.name, 'cat': self.cat, 'ph': 'X',
+            'ts': self.tracer._us(self.start), 'dur': (end - self.start) * 1e6,
+            'pid': self.tracer.pid, 'tid': threading.get_ident(), 'args': self.args,
+        })
+        return False
+
+    def set(self, **args):
+        """
+        Adds arguments known only inside the span, e.g. its result.
+        """
+        self.args.update(args)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    def __init__(self, enabled=TRACE_SCAN):
+        """
+        Records the timeline of a scan as a Chrome trace, to open with chrome://tracing or ui.perfetto.dev.
+        When disabled, spans cost a single attribute check.
+        enabled (bool): If the events are recorded.
+        """
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events = collections.deque(maxlen=MAX_EVENTS)
+        self.thread_names = {}
+        self.dropped_events = 0
+        self.origin = time.perf_counter()
+
+    def start(self):
+        """
+        Clears the recorded events to start a new trace.
+        """
+        with self.lock:
+            self.events.clear()
+            self.thread_names = {}
+            self.dropped_events = 0
+            self.origin = time.perf_counter()
+
+    def span(self, name, cat='scan', **args):
+        """
+        Returns a context manager recording the duration of its block.
+        name (str): The name of the span.
+        cat (str): The category, e.g. 'http', 'align' or 'sleep'.
+        args: Values shown with the span.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def traced(self, name=None, cat='scan'):
+        """
+        Decorator recording a span for each call of the function.
+        name (str): The name of the span, the name of the function by default.
+        """
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, span_name, cat, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def sleep(self, duration, name='sleep'):
+        """
+        time.sleep recorded as a span, to see the time spent waiting in the timeline.
+        """
+        with self.span(name, 'sleep', duration=duration):
+            time.sleep(duration)
+
+    def instant(self, name, cat='scan', **args):
+        """
+        Records an event without duration.
+        """
+        if not self.enabled:
+            return
+        self._add({'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'ts': self._us(time.perf_counter()),
+                   'pid': self.pid, 'tid': threading.get_ident(), 'args': args})
+
+    def counter(self, name, **values):
+        """
+        Records the values of a counter, shown as a graph in the timeline.
+        """
+        if not self.enabled:
+            return
+        self._add({'name': name, 'ph': 'C', 'ts': self._us(time.perf_counter()), 'pid': self.pid, 'args': values})
+
+    def save(self, path):
+        """
+        Writes the recorded events to a Chrome trace JSON file. Does nothing if the tracer is disabled.
+        path (str): The path of the file.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+            dropped = self.dropped_events
+
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': thread_name}}
+                    for tid, thread_name in thread_names.items()]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': dropped}}, file)
+
+    def summary(self):
+        """
+        Returns the total duration in seconds and the count of the spans of each category.
+        """
+        totals = {}
+        with self.lock:
+            for event in self.events:
+                if event['ph'] == 'X':
+                    total, count = totals.get(event['cat'], (0., 0))
+                    totals[event['cat']] = (total + event['dur'] / 1e6, count + 1)
+        return totals
+
+    def _us(self, t):
+        return (t - self.origin) * 1e6
+
+    def _add(self, event):
+        with self.lock:
+            tid = event.get('tid')
+            if tid is not None and tid not in self.thread_names:
+                self.thread_names[tid] = threading.current_thread().name
+            if len(self.events) == self.events.maxlen:
+                self.dropped_events += 1
+            self.events.append(event)
+
+
+tracer = Tracer()
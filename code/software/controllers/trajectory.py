@@ -0,0 +1,97 @@
+import numpy as np
+
+from controllers.obstacle_store import force_contributions
+
+REACH_FORCE = 40        # Force norm of the reach points
+REACH_DIST_ORDER = 0    # Order of the distance norm of the reach points, the force doesn't decrease with the distance
+
+
+class Trajectory:
+    def __init__(self, positions=np.empty((0, 2)), angles=np.empty(0), force=REACH_FORCE, dist_order=REACH_DIST_ORDER):
+        """
+        Reach points stored as contiguous arrays of positions and angles, with a cursor on the next point to reach.
+        Reaching a point moves the cursor instead of removing the point.
+        positions (np.ndarray): The positions of the reach points in cm, of shape (n, 2).
+        angles (np.ndarray): The angle around the object at which each point is reached, of shape (n,).
+        force (float): The force norm of the reach points.
+        dist_order (int): The order of the distance norm of the reach points.
+        """
+        self._positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self._angles = np.asarray(angles, dtype=float)
+        self._forces = np.full(len(self._angles), float(force))
+        self._orders = np.full(len(self._angles), float(dist_order))
+        self.cursor = 0
+
+    @classmethod
+    def circle(cls, radius, step_nbr):
+        """
+        Returns the trajectory of a circle starting and ending at (0, 0), with the object at (-radius, 0).
+        radius (float): The radius of the circle.
+        step_nbr (int): The number of reach points on the circle.
+        """
+        return cls.on_circle(radius, np.linspace(0, 2 * np.pi, step_nbr, endpoint=False))
+
+    @classmethod
+    def on_circle(cls, radius, angles):
+        """
+        Returns the trajectory through the points of the circle at the given angles, ending back at (0, 0).
+        radius (float): The radius of the circle.
+        angles (np.ndarray): The increasing angles of the reach points around the object, 0 at (0, 0).
+        """
+        angles = np.asarray(angles, dtype=float)
+        positions = radius * np.stack([np.cos(angles) - 1, np.sin(angles)], axis=1)
+        # Back to the start to close the circle, at the end of the turn so that the last stops aren't skipped
+        return cls(np.vstack([positions, [0., 0.]]), np.append(angles, 2 * np.pi))
+
+    def __len__(self):
+        return len(self._angles) - self.cursor
+
+    @property
+    def positions(self):
+        """
+        The positions of the points left to reach, a view on the trajectory.
+        """
+        return self._positions[self.cursor:]
+
+    @property
+    def angles(self):
+        return self._angles[self.cursor:]
+
+    def current_pos(self):
+        return self._positions[self.cursor]
+
+    def current_angle(self):
+        return self._angles[self.cursor]
+
+    def advance(self, pos, angle, reach_distance):
+        """
+        Moves the cursor past the points already reached: the ones closer than reach_distance to the position,
+        or whose angle is below the current angle around the object. Stops at the first point not reached.
+        pos (np.ndarray): The current position.
+        angle (float): The current angle around the object.
+        reach_distance (float): The distance below which a point is reached.
+        Returns:
+            int: The number of points reached.
+        """
+        if len(self) == 0:
+            return 0
+        dist = np.linalg.norm(self.positions - np.asarray(pos, dtype=float), axis=1)
+        reached = (dist < reach_distance) | (angle > self.angles)
+        # The first point not reached, all of them if there is none
+        skipped = len(reached) if reached.all() else int(np.argmin(reached))
+        self.cursor += skipped
+        return skipped
+
+    def contribution(self, pos):
+        """
+        The contribution of the current point to the global force at the position, like ForcePoint.get_contribution.
+        """
+        i = self.cursor
+        return force_contributions(self._positions[i:i + 1], self._forces[i:i + 1], self._orders[i:i + 1], pos)[0]
+
+    def contributions(self, pos):
+        """
+        The contributions of all the points left to reach at the position, of shape (n, 2).
+        """
+        i = self.cursor
+        return force_contributions(self._positions[i:], self._forces[i:], self._orders[i:], pos)
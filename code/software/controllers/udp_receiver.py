@@ -1,30 +1,246 @@
 import socket
+import asyncio
 import cv2
 import numpy as np
 import threading
+import time
 from urllib.parse import urlparse
 import tempfile
 import os, shutil
 
 from config.dev_config import DEBUG_CAM
+from controllers.udp_recorder import UDPRecorder
+from controllers.capture_writer import capture_writer
+from controllers.stream_metrics import StreamMetrics
 
 
 DEFAULT_UDP_IP = "0.0.0.0"  # Listen on all available interfaces
 DEFAULT_UDP_PORT = 12346    # Port used for receiving the stream
 DEFAULT_UDP_PORT = 12349   # Port used for receiving the stream
 
+MAX_DATAGRAM_SIZE = 65536           # Max size of a single UDP datagram
+DEFAULT_BUFFER_SIZE = 4 * 1024**2   # Size of the preallocated reassembly buffer
+JPEG_SOI = b'\xff\xd8'              # Start of JPEG marker
+JPEG_EOI = b'\xff\xd9'              # End of JPEG marker
+
+# imdecode flags for each scale, libjpeg downscales in the DCT domain so smaller frames are cheaper to decode
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class JpegAssembler:
+    def __init__(self, capacity=DEFAULT_BUFFER_SIZE):
+        """
+        Reassembles JPEG frames from a stream of datagrams inside a preallocated buffer.
+        capacity (int): The size of the buffer in bytes. Must hold at least one frame and one datagram.
+        """
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.write_pos = 0      # End of the received data
+        self.frame_start = -1   # Start of the frame being received, -1 if none
+        self.dropped_bytes = 0  # Bytes discarded because a frame did not fit in the buffer
+        self.truncated_frames = 0  # Frames discarded because the next one started before their end marker
+
+    def writable(self, min_size=MAX_DATAGRAM_SIZE):
+        """
+        Returns a view on the free part of the buffer, wrapping the pending data back to the start if needed.
+        The views returned by the previous commit are invalidated by this call.
+        min_size (int): The minimum number of free bytes needed.
+        """
+        if len(self.buffer) - self.write_pos < min_size:
+            self._wrap()
+        return self.view[self.write_pos:]
+
+    def commit(self, nbytes):
+        """
+        Registers the bytes written in the view returned by writable and returns the completed frames.
+        Only the new bytes are scanned for JPEG markers.
+        nbytes (int): The number of bytes written.
+        Returns:
+            list[memoryview]: Views on the completed JPEG frames, valid until the next call to writable.
+        """
+        end = self.write_pos + nbytes
+        # Start one byte early since a marker can be split between two datagrams
+        pos = max(self.write_pos - 1, 0)
+        frames = []
+
+        while True:
+            if self.frame_start < 0:
+                index = self.buffer.find(JPEG_SOI, pos, end)
+                if index < 0:
+                    break
+                self.frame_start = index
+                pos = index + 2
+            else:
+                pos = max(pos, self.frame_start + 2)
+                index = self.buffer.find(JPEG_EOI, pos, end)
+                # A start marker before the end marker means the end of the current frame was lost
+                restart = self.buffer.find(JPEG_SOI, pos, end if index < 0 else index)
+                if restart >= 0:
+                    self.truncated_frames += 1
+                    self.frame_start = restart
+                    pos = restart + 2
+                    continue
+                if index < 0:
+                    break
+                frames.append(self.view[self.frame_start:index + 2])
+                self.frame_start = -1
+                pos = index + 2
+
+        self.write_pos = end
+        return frames
+
+    def feed(self, data):
+        """
+        Copies the given datagram in the buffer and returns the completed frames.
+        data (bytes): The datagram received.
+        """
+        view = self.writable(len(data))
+        view[:len(data)] = data
+        return self.commit(len(data))
+
+    def _wrap(self):
+        """
+        Moves the pending frame (if any) back to the start of the buffer.
+        """
+        if self.frame_start < 0:
+            # Keep the last byte, it may be the first half of a start marker
+            self.buffer[0] = self.buffer[self.write_pos - 1] if self.write_pos > 0 else 0
+            self.write_pos = 1
+            return
+
+        pending = self.write_pos - self.frame_start
+        if pending > len(self.buffer) - MAX_DATAGRAM_SIZE:
+            # The frame is bigger than the buffer, it can't be completed
+            self.dropped_bytes += pending
+            self.frame_start = -1
+            self.write_pos = 0
+            return
+
+        self.view[:pending] = self.view[self.frame_start:self.write_pos]
+        self.frame_start = 0
+        self.write_pos = pending
+
+
+class StreamProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        """
+        Forwards the datagrams of one camera stream to its UDPReceiver.
+        receiver (UDPReceiver): The receiver of the stream.
+        """
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver._on_datagram(data)
+
+    def error_received(self, exc):
+        if DEBUG_CAM:
+            print(f"Error on UDP port {self.receiver.udp_port}: {exc}")
+
+
+class StreamHub:
+    def __init__(self):
+        """
+        Receives all the camera streams on a single asyncio event loop running in a background thread.
+        """
+        self.loop = None
+        self.thread = None
+        self.transports = {}            # UDPReceiver -> DatagramTransport
+        self.lock = threading.Lock()    # Lock to start and stop the loop thread once
+
+    def _ensure_running(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            # The selector loop supports UDP on every platform
+            self.loop = asyncio.SelectorEventLoop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name="camera-streams", daemon=True)
+            self.thread.start()
+
+    def add_stream(self, receiver, sock):
+        """
+        Starts receiving the datagrams of the given bound socket. Blocks until the stream is registered.
+        receiver (UDPReceiver): The receiver to forward the datagrams to.
+        sock (socket.socket): The bound UDP socket of the stream.
+        """
+        self._ensure_running()
+        asyncio.run_coroutine_threadsafe(self._add_stream(receiver, sock), self.loop).result()
+
+    async def _add_stream(self, receiver, sock):
+        transport, _ = await self.loop.create_datagram_endpoint(lambda: StreamProtocol(receiver), sock=sock)
+        self.transports[receiver] = transport
+
+    def remove_stream(self, receiver):
+        """
+        Stops receiving the stream of the given receiver and closes its socket. Blocks until it is done.
+        """
+        if self.loop is None or not self.loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._remove_stream(receiver), self.loop).result()
+
+    async def _remove_stream(self, receiver):
+        transport = self.transports.pop(receiver, None)
+        if transport is not None:
+            transport.close()
+
+    def stop(self):
+        """
+        Closes all the streams and stops the loop thread.
+        """
+        with self.lock:
+            if self.thread is None:
+                return
+            for receiver in list(self.transports):
+                self.remove_stream(receiver)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+            self.thread = None
+
+
+stream_hub = StreamHub() # Shared by all the receivers, so that adding a camera doesn't add a thread
+
 
 class UDPReceiver:
-    def __init__(self, udp_port=DEFAULT_UDP_PORT, udp_ip=DEFAULT_UDP_IP):
+    def __init__(self, udp_port=DEFAULT_UDP_PORT, udp_ip=DEFAULT_UDP_IP, max_fps=None, hub=stream_hub, writer=capture_writer, name=None):
+        """
+        Receives the JPEG stream of an ESP32-CAM.
+        udp_port (int): The port to listen on.
+        udp_ip (str): The interface to listen on.
+        max_fps (float): The maximum rate of frames kept, the others are dropped on reception. None for no limit.
+        hub (StreamHub): The event loop receiving the stream.
+        writer (CaptureWriter): The background writer of the saved frames.
+        name (str): The name of the stream in the metrics, the port if None.
+        """
         self.udp_port = udp_port
         self.udp_ip = udp_ip
         self.udp_sock = None
-        self.current_frame = None
-        self.bytes_buffer = b''
+        self.hub = hub
+        self.writer = writer
+        self.min_frame_interval = 1 / max_fps if max_fps else 0
+        self.metrics = StreamMetrics(name or f"udp:{udp_port}")
+        self.recorder = None
+        self.assembler = JpegAssembler()
         self.computer_ip = self._get_local_ip()
         self.running = False
-        self.lock = threading.Lock()  # Lock to ensure thread-safe access to current_frame
+        self.lock = threading.Lock()  # Lock to ensure thread-safe access to the latest JPEG
+        self.new_frame = threading.Condition(self.lock)  # Notified each time a frame is received
         self.frame_counter = 0
+
+        # Latest received JPEG, only decoded when a consumer asks for it
+        self.current_jpeg = None
+        self.frame_id = 0           # Monotonically increasing id of the latest frame, 0 if none
+        self.frame_timestamp = 0.   # time.monotonic() at the reception of the latest frame
+
+        # Decoded frame cache for each scale, shared by all the readers of the same frame
+        self.decode_lock = threading.Lock()
+        self.decoded_frames = {}    # scale -> (frame_id, frame)
+
     def _get_local_ip(self):
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.settimeout(0)
@@ -76,66 +292,146 @@ class UDPReceiver:
             exit(1)
 
         self._send_ip_to_esp32(esp32_ip, esp32_port)
+        self.listen()
+
+    def listen(self):
+        """
+        Binds the UDP socket and starts receiving frames, without any handshake with the ESP32.
+        """
         self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, DEFAULT_BUFFER_SIZE)
         self.udp_sock.bind((self.udp_ip, self.udp_port))
         self.running = True
 
-        # Start a background thread for continuous frame fetching
-        threading.Thread(target=self._fetch_frames, daemon=True).start()
+        # Frames are received on the event loop shared by all the cameras
+        self.hub.add_stream(self, self.udp_sock)
         if DEBUG_CAM:
             print(f"Listening for UDP packets on {self.udp_ip}:{self.udp_port}...")
 
-    def _fetch_frames(self):
-        """
-        Background thread function to continuously fetch and decode frames.
-        """
-        while self.running:
-            try:
-                # Receive data from the UDP socket
-                data, _ = self.udp_sock.recvfrom(65536)  # Max buffer size
-                self.bytes_buffer += data
-
-                # Look for the start and end markers for a JPEG image
-                start_index = self.bytes_buffer.find(b'\xff\xd8')  # Start of JPEG
-                end_index = self.bytes_buffer.find(b'\xff\xd9')    # End of JPEG
-
-                if start_index != -1 and end_index != -1:
-                    # Extract the JPEG frame
-                    jpg_frame = self.bytes_buffer[start_index:end_index + 2]
-                    self.bytes_buffer = self.bytes_buffer[end_index + 2:]  # Clear processed data
-
-                    # Decode the JPEG frame into an OpenCV image
-                    frame = cv2.imdecode(np.frombuffer(jpg_frame, np.uint8), cv2.IMREAD_COLOR)
-
-                    
-                    if frame is not None:
-                        with self.lock:
-                            self.current_frame = frame  # Update the latest frame
-                        
-                        if DEBUG_CAM:
-                            print("Frame received and updated.")
-            except Exception as e:
-                if DEBUG_CAM:
-                    print(f"Error while fetching frames: {e}")
-                pass
+    def _on_datagram(self, data):
+        """
+        Called by the event loop for each datagram received.
+        """
+        self.metrics.record_datagram(len(data))
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(data)
+
+        jpg_frames = self.assembler.feed(data)
+        if not jpg_frames:
+            return
+        self.metrics.set_truncated(self.assembler.truncated_frames)
 
-    def get_current_frame(self):
+        # Backpressure: drop the frames exceeding max_fps before copying them
+        if len(jpg_frames) > 1:
+            self.metrics.record_dropped(len(jpg_frames) - 1)
+        if time.monotonic() - self.frame_timestamp < self.min_frame_interval:
+            self.metrics.record_dropped()
+            return
+
+        # Keep the latest JPEG frame, it will be decoded on demand
+        jpeg = bytes(jpg_frames[-1])
+        with self.lock:
+            self.current_jpeg = jpeg
+            self.frame_id += 1
+            self.frame_timestamp = time.monotonic()
+            self.new_frame.notify_all()
+        self.metrics.record_frame()
+
+        if DEBUG_CAM:
+            print("Frame received and updated.")
+
+    def get_current_frame(self, scale=1):
         """
         Returns the most recently fetched frame immediately.
+        The JPEG is decoded on the first call for a given frame, the following calls reuse the decoded image.
+        scale (int): The reduction factor of the frame, one of 1, 2, 4 or 8.
         """
-        if self.current_frame is not None:
-            return self.current_frame
-        else:
+        with self.lock:
+            jpeg, frame_id, timestamp = self.current_jpeg, self.frame_id, self.frame_timestamp
+
+        if jpeg is None:
             if DEBUG_CAM:
                 print("No frame available.")
             return None
 
+        self.metrics.record_frame_age(timestamp)
+        return self._decode(jpeg, frame_id, scale)
+
+    def _decode(self, jpeg, frame_id, scale=1):
+        """
+        Decodes the given JPEG at the given scale, or returns the cached image if it was already decoded.
+        """
+        if scale not in DECODE_FLAGS:
+            raise ValueError(f"Unsupported scale {scale}, must be one of {list(DECODE_FLAGS)}")
+
+        with self.decode_lock:
+            decoded_id, decoded_frame = self.decoded_frames.get(scale, (0, None))
+            if frame_id != decoded_id:
+                start = time.perf_counter()
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), DECODE_FLAGS[scale])
+                self.metrics.record_decode(time.perf_counter() - start, frame is not None)
+                # Keep the previous frame if the new one is corrupted
+                if frame is not None:
+                    decoded_frame = frame
+                elif DEBUG_CAM:
+                    print(f"Frame {frame_id} could not be decoded.")
+                # A reader late on an older frame must not replace the cached newer one
+                if frame_id >= decoded_id:
+                    self.decoded_frames[scale] = (frame_id, decoded_frame)
+            return decoded_frame
+
+    @property
+    def current_frame(self):
+        return self.get_current_frame()
+
+    def latest(self, after_id=0, scale=1):
+        """
+        Returns the latest frame if it is newer than the given id, without blocking.
+        after_id (int): The id of the last frame already processed by the caller.
+        scale (int): The reduction factor of the frame, one of 1, 2, 4 or 8.
+        Returns:
+            tuple: (frame_id, timestamp, frame), or None if there is no newer frame.
+        """
+        with self.lock:
+            jpeg, frame_id, timestamp = self.current_jpeg, self.frame_id, self.frame_timestamp
+
+        if jpeg is None or frame_id <= after_id:
+            return None
+
+        self.metrics.record_frame_age(timestamp)
+        return frame_id, timestamp, self._decode(jpeg, frame_id, scale)
+
+    def wait_for_new_frame(self, after_id=0, timeout=None, not_before=None, scale=1):
+        """
+        Blocks until a frame newer than the given id is received.
+        after_id (int): The id of the last frame already processed by the caller.
+        timeout (float): The maximum time to wait in seconds, None to wait forever.
+        not_before (float): If given, also wait for a frame received after this time.monotonic() timestamp.
+        scale (int): The reduction factor of the frame, one of 1, 2, 4 or 8.
+        Returns:
+            tuple: (frame_id, timestamp, frame), or None if the timeout expired.
+        """
+        def is_new():
+            return self.frame_id > after_id and (not_before is None or self.frame_timestamp > not_before)
+
+        with self.lock:
+            if not self.new_frame.wait_for(is_new, timeout):
+                return None
+            jpeg, frame_id, timestamp = self.current_jpeg, self.frame_id, self.frame_timestamp
+
+        self.metrics.record_frame_age(timestamp)
+        return frame_id, timestamp, self._decode(jpeg, frame_id, scale)
+
     def save_frame(self):  # Save the current frame to a file
         """
-        Save the given frame to a temporary folder with a unique filename.
+        Save the current frame to a temporary folder with a unique filename.
+        The received JPEG is written as is by the capture writer, without decoding nor re-encoding it.
         """
 
-        if self.current_frame is not None:
+        with self.lock:
+            jpeg = self.current_jpeg
+        if jpeg is not None:
             # Get the system's temporary directory
             temp_dir = os.path.join(tempfile.gettempdir(), "superscanner8000/images")
             # Create the temporary directory if it doesn't exist or delete if it does
@@ -143,6 +439,7 @@ class UDPReceiver:
             if not os.path.exists(temp_dir):
                 os.makedirs(temp_dir)
             elif self.frame_counter == 0:
+                self.writer.flush()
                 shutil.rmtree(temp_dir)
                 os.makedirs(temp_dir)
             else:
@@ -150,24 +447,41 @@ class UDPReceiver:
             # Construct the full path for the file with a numbered filename
             filename = f"{self.frame_counter}.jpg"
             temp_file_path = os.path.join(temp_dir, filename)
-            # Save theself.current_frame to the temporary folder
-            cv2.imwrite(temp_file_path, self.current_frame)
+            # Queue the current frame to be written to the temporary folder
+            self.writer.write_bytes(temp_file_path, jpeg)
             self.frame_counter += 1
 
             if DEBUG_CAM:
-                print(f"Savedself.current_frame {self.frame_counter} to {temp_file_path}")
-            # Increment theself.current_frame counter
+                print(f"Queued frame {self.frame_counter} to {temp_file_path} ({self.writer.queue_depth()} pending)")
         else:
             if DEBUG_CAM:
                 print("No frame available to save.")
 
+    def start_recording(self, path):
+        """
+        Records the raw datagrams received from now on, so that they can be replayed with UDPReplayer.
+        path (str): The path of the recording.
+        Returns:
+            UDPRecorder: The recorder.
+        """
+        self.stop_recording()
+        self.recorder = UDPRecorder(path)
+        return self.recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
     def stop(self):
         """
         Stops the background frame fetching and closes the UDP socket.
         """
         self.running = False
         if self.udp_sock:
+            self.hub.remove_stream(self)
             self.udp_sock.close()
+        self.stop_recording()
         if DEBUG_CAM:
             print("Stopped frame fetching.")
 
@@ -0,0 +1,206 @@
+import argparse
+import socket
+import struct
+import threading
+import time
+
+from config.dev_config import DEBUG_CAM
+
+RECORDING_MAGIC = b'SS8UDP1\n'
+RECORD_HEADER = struct.Struct('<dI')    # Time since the start of the recording in seconds, datagram size
+
+DEFAULT_REPLAY_TCP_PORT = 8008          # Port of the fake ESP32-CAM receiving the "IP:" handshake
+DEFAULT_REPLAY_UDP_PORT = 12346         # Port the datagrams are sent to, like the top cam
+
+
+class UDPRecorder:
+    def __init__(self, path):
+        """
+        Writes timestamped raw UDP datagrams to a file.
+        path (str): The path of the recording.
+        """
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(RECORDING_MAGIC)
+        self.start_time = None
+        self.datagram_count = 0
+        self.lock = threading.Lock()
+
+    def write(self, data, timestamp=None):
+        """
+        Appends a datagram to the recording.
+        data (bytes): The datagram.
+        timestamp (float): The time.monotonic() reception time, now if None.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self.lock:
+            if self.file is None:
+                return
+            if self.start_time is None:
+                self.start_time = timestamp
+            self.file.write(RECORD_HEADER.pack(timestamp - self.start_time, len(data)))
+            self.file.write(data)
+            self.datagram_count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        if DEBUG_CAM:
+            print(f"Recorded {self.datagram_count} datagrams to {self.path}")
+
+
+def read_recording(path):
+    """
+    Reads a recording written by UDPRecorder.
+    path (str): The path of the recording.
+    Returns:
+        list[tuple]: The (time since start, datagram) of each recorded datagram.
+    """
+    datagrams = []
+    with open(path, 'rb') as file:
+        if file.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a UDP recording")
+
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            timestamp, size = RECORD_HEADER.unpack(header)
+            data = file.read(size)
+            if len(data) < size:
+                break # Truncated recording
+            datagrams.append((timestamp, data))
+
+    return datagrams
+
+
+class UDPReplayer:
+    def __init__(self, path, tcp_port=DEFAULT_REPLAY_TCP_PORT, udp_port=DEFAULT_REPLAY_UDP_PORT, speed=1., loop=True):
+        """
+        Stands in for an ESP32-CAM by replaying a recording over UDP.
+        Like the camera, it waits for the "IP:x.x.x.x" TCP handshake sent by UDPReceiver and then streams to that IP.
+        path (str): The path of the recording.
+        tcp_port (int): The port on which to wait for the handshake.
+        udp_port (int): The port the datagrams are sent to.
+        speed (float): The replay speed relative to the recording, 0 to send as fast as possible.
+        loop (bool): If True, the recording is replayed until stopped.
+        """
+        self.datagrams = read_recording(path)
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.speed = speed
+        self.loop = loop
+
+        self.target_ip = None
+        self.running = False
+        self.sent_datagrams = 0
+        self.target_set = threading.Event()
+        self.tcp_sock = None
+        self.udp_sock = None
+
+    def start(self):
+        """
+        Starts waiting for the handshake and replaying in background threads.
+        """
+        self.tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp_sock.bind(('0.0.0.0', self.tcp_port))
+        self.tcp_sock.listen()
+        self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.running = True
+
+        threading.Thread(target=self._accept_handshakes, daemon=True).start()
+        threading.Thread(target=self._replay, daemon=True).start()
+        if DEBUG_CAM:
+            print(f"Replaying {len(self.datagrams)} datagrams, waiting for the handshake on port {self.tcp_port}")
+
+    def set_target(self, ip):
+        """
+        Starts streaming to the given IP without waiting for a handshake.
+        """
+        self.target_ip = ip
+        self.target_set.set()
+
+    def _accept_handshakes(self):
+        while self.running:
+            try:
+                client, _ = self.tcp_sock.accept()
+            except OSError:
+                break
+
+            with client:
+                message = client.makefile('r').readline().strip()
+            if message.startswith("IP:"):
+                if DEBUG_CAM:
+                    print(f"Received IP address: {message[3:]}")
+                self.set_target(message[3:])
+
+    def _replay(self):
+        self.target_set.wait()
+        while self.running:
+            start = time.monotonic()
+            for timestamp, data in self.datagrams:
+                if not self.running:
+                    return
+                if self.speed > 0:
+                    delay = start + timestamp / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.udp_sock.sendto(data, (self.target_ip, self.udp_port))
+                self.sent_datagrams += 1
+
+            if not self.loop:
+                break
+        self.running = False
+
+    def stop(self):
+        self.running = False
+        self.target_set.set()
+        if self.tcp_sock:
+            self.tcp_sock.close()
+        if self.udp_sock:
+            self.udp_sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay an ESP32-CAM UDP stream.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record the stream of a camera')
+    record_parser.add_argument('path', help='Path of the recording')
+    record_parser.add_argument('--cam-url', default="http://superscanner8008:80", help='URL of the ESP32-CAM')
+    record_parser.add_argument('--udp-port', type=int, default=12346, help='Port receiving the stream')
+    record_parser.add_argument('--duration', type=float, default=30, help='Duration of the recording in seconds')
+
+    replay_parser = subparsers.add_parser('replay', help='Replay a recording like an ESP32-CAM')
+    replay_parser.add_argument('path', help='Path of the recording')
+    replay_parser.add_argument('--tcp-port', type=int, default=DEFAULT_REPLAY_TCP_PORT, help='Port of the handshake')
+    replay_parser.add_argument('--udp-port', type=int, default=DEFAULT_REPLAY_UDP_PORT, help='Port the stream is sent to')
+    replay_parser.add_argument('--speed', type=float, default=1., help='Replay speed, 0 for as fast as possible')
+    replay_parser.add_argument('--once', action='store_true', help='Replay the recording only once')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from controllers.udp_receiver import UDPReceiver
+        receiver = UDPReceiver(args.udp_port)
+        recorder = receiver.start_recording(args.path)
+        receiver.start_listening(args.cam_url)
+        time.sleep(args.duration)
+        receiver.stop()
+        print(f"Recorded {recorder.datagram_count} datagrams to {args.path}")
+    else:
+        replayer = UDPReplayer(args.path, args.tcp_port, args.udp_port, args.speed, loop=not args.once)
+        replayer.start()
+        print(f"Waiting for the handshake on port {args.tcp_port}, stream the recording to port {args.udp_port}")
+        try:
+            while replayer.running:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        replayer.stop()
+        print(f"Sent {replayer.sent_datagrams} datagrams")
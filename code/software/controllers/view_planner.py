@@ -0,0 +1,175 @@
+import math
+
+import numpy as np
+
+from controllers.ss8 import BODY_ANGLE_TO_TIME, BODY_DIST_TO_TIME
+
+DEFAULT_BINS = 400              # Number of directions of the coverage histogram on the sphere
+DEFAULT_BODY_STEPS = 36         # Number of candidate stops on the circle
+DEFAULT_COVERAGE_TARGET = 0.95  # Fraction of the surface to cover before stopping
+MIN_VIEWS = 3                   # Number of views of a surface direction before it is covered, for the stereo matching
+MAX_INCIDENCE = math.radians(60)    # Max angle between a surface normal and the view direction to see it
+GROUND_NORMAL_Z = -0.5          # The normals pointing more downward are hidden by the ground
+
+# Camera position, from the arm coordinates (x toward the object, y up) in cm
+ARM_BASE_HEIGHT = 20            # Height of the arm base in cm
+DEFAULT_OBJECT_HEIGHT = 30      # The camera aims at the middle of the object
+DEFAULT_OBJECT_RADIUS = 15      # Radius of the ball standing for the object, whose surface is seen under different angles
+
+# Time model of a view, in seconds
+ARM_ACCELERATION = 4.           # cm/s^2, the arm steppers mostly move with a triangular speed profile
+STOP_TIME = 4.                  # Orientation toward the object and body alignment at a new stop
+VIEW_TIME = 3.                  # Settling, camera alignment and capture
+PARK_POSITION = (0, 0)          # The arm is parked there while the body moves
+
+
+def sphere_directions(count):
+    """
+    Returns count unit vectors evenly spread on the sphere (Fibonacci lattice), of shape (count, 3).
+    """
+    i = np.arange(count) + 0.5
+    polar = np.arccos(1 - 2 * i / count)
+    azimuth = math.pi * (1 + math.sqrt(5)) * i
+    return np.stack([np.cos(azimuth) * np.sin(polar), np.sin(azimuth) * np.sin(polar), np.cos(polar)], axis=1)
+
+
+def camera_positions(radius, body_angles, arm_positions):
+    """
+    Returns the 3D positions of the camera around an object at the origin, of shape (n, 3).
+    radius (float): The distance between the body and the object in cm.
+    body_angles (np.ndarray): The angles of the body around the object, of shape (n,).
+    arm_positions (np.ndarray): The (x, y) arm coordinates, of shape (n, 2).
+    """
+    arm_positions = np.asarray(arm_positions, dtype=float).reshape(-1, 2)
+    dist = radius - arm_positions[:, 0]
+    return np.stack([dist * np.cos(body_angles), dist * np.sin(body_angles), ARM_BASE_HEIGHT + arm_positions[:, 1]], axis=1)
+
+
+def arm_move_time(start, end):
+    """
+    Approximated duration of the arm moves in seconds, for arrays of (x, y) arm coordinates.
+    """
+    dist = np.linalg.norm(np.asarray(end, dtype=float) - np.asarray(start, dtype=float), axis=-1)
+    return 2 * np.sqrt(dist / ARM_ACCELERATION)
+
+
+def body_move_time(radius, angle):
+    """
+    Duration in seconds of the move of the body along the circle by the given angles, like Navigator._move_of.
+    """
+    return (radius * angle * BODY_DIST_TO_TIME + angle * BODY_ANGLE_TO_TIME) / 1000
+
+
+class ViewPlanner:
+    def __init__(self, radius, arm_positions, body_steps=DEFAULT_BODY_STEPS, coverage_target=DEFAULT_COVERAGE_TARGET,
+                 normals=None, bins=DEFAULT_BINS, object_height=DEFAULT_OBJECT_HEIGHT, object_radius=DEFAULT_OBJECT_RADIUS):
+        """
+        Next best view planner: picks the captures around the object that add the most coverage per second.
+        The coverage is a histogram of the surface normals on the sphere, a normal is covered once seen by
+        MIN_VIEWS views. The views are captured during a single turn around the object, like with the navigator.
+        radius (float): The radius of the circle in cm.
+        arm_positions (list): The candidate arm positions, e.g. from generate_path.
+        body_steps (int): The number of candidate stops on the circle.
+        coverage_target (float): The fraction of the surface to cover.
+        normals (np.ndarray): Surface normals of the object if known, of shape (n, 3). Else all the directions
+            above the ground are weighted the same.
+        bins (int): The number of directions of the histogram.
+        object_height (float): The height of the object in cm.
+        object_radius (float): The radius of the ball standing for the object in cm, the direction of a bin is seen
+            from the point of the ball with this normal.
+        """
+        self.radius = radius
+        self.coverage_target = coverage_target
+        self.directions = sphere_directions(bins)
+        self.counts = np.zeros(bins)
+
+        step_angles = np.arange(body_steps) * 2 * math.pi / body_steps
+        arm_positions = np.asarray(arm_positions, dtype=float).reshape(-1, 2)
+        self.body_angles = np.repeat(step_angles, len(arm_positions))
+        self.arm_positions = np.tile(arm_positions, (body_steps, 1))
+
+        cameras = camera_positions(radius, self.body_angles, self.arm_positions)
+        surface = [0, 0, object_height / 2] + object_radius * self.directions
+        view_dirs = cameras[:, None] - surface[None]
+        view_dirs /= np.linalg.norm(view_dirs, axis=2, keepdims=True)
+        self.visible = np.einsum('cbd,bd->cb', view_dirs, self.directions) > math.cos(MAX_INCIDENCE)   # (candidates, bins)
+        self.taken = np.zeros(len(self.body_angles), dtype=bool)
+        self.weights = self._get_weights(normals)
+
+    def _get_weights(self, normals):
+        if normals is None:
+            weights = (self.directions[:, 2] > GROUND_NORMAL_Z).astype(float)
+        else:
+            nearest = np.argmax(np.asarray(normals, dtype=float) @ self.directions.T, axis=1)
+            weights = np.bincount(nearest, minlength=len(self.directions)).astype(float)
+        # The directions that no candidate views enough, e.g. the top of a tall object, can't be covered
+        weights *= self.visible.sum(axis=0) >= MIN_VIEWS
+        return weights / weights.sum()
+
+    def coverage(self):
+        """
+        Returns the fraction of the surface that can be covered seen by MIN_VIEWS views.
+        """
+        return float(self.weights @ (self.counts >= MIN_VIEWS))
+
+    def gains(self):
+        """
+        Returns the coverage added by each candidate view, none for the views already taken.
+        Each view of a direction seen less than MIN_VIEWS times counts, so that the first views have a gain.
+        """
+        seen = np.minimum(self.counts + self.visible, MIN_VIEWS) - np.minimum(self.counts, MIN_VIEWS)
+        return np.where(self.taken, 0., seen @ self.weights / MIN_VIEWS)
+
+    def add_view(self, index):
+        self.counts += self.visible[index]
+        self.taken[index] = True
+
+    def costs(self):
+        """
+        Returns the time added to the scan by each candidate view in seconds: a new stop costs the alignment of the
+        body and the arm moves from and back to its parking position, an existing stop the arm move from its closest
+        view. The body goes round the object once whatever the views, so its move isn't counted.
+        """
+        costs = VIEW_TIME + STOP_TIME + 2 * arm_move_time(PARK_POSITION, self.arm_positions)
+        for angle in np.unique(self.body_angles[self.taken]):
+            at_stop = self.body_angles == angle
+            taken_arms = self.arm_positions[at_stop & self.taken]
+            closest = arm_move_time(taken_arms[None], self.arm_positions[at_stop][:, None]).min(axis=1)
+            costs[at_stop] = VIEW_TIME + closest
+        return costs
+
+    def plan(self, max_views=None):
+        """
+        Picks greedily the views maximizing the coverage gain per second, until the coverage target is met or
+        no view adds coverage.
+        max_views (int): The max number of views, unbounded if None.
+        Returns:
+            list: The (body_angle, arm_position) of the views, in the order of a single turn around the object
+                with the arm going up at each stop.
+            float: The expected duration of the scan in seconds.
+        """
+        while self.coverage() < self.coverage_target and (max_views is None or self.taken.sum() < max_views):
+            scores = self.gains() / self.costs()
+            best = int(np.argmax(scores))
+            if scores[best] <= 1e-12:
+                break
+            self.add_view(best)
+
+        order = np.lexsort((self.arm_positions[:, 1], self.body_angles))
+        order = order[self.taken[order]]
+        views = [(float(self.body_angles[i]), [float(c) for c in self.arm_positions[i]]) for i in order]
+        return views, self.duration(views)
+
+    def duration(self, views):
+        """
+        Returns the expected duration in seconds of the capture of the views in the given order.
+        """
+        duration, body_angle, arm_position = 0., None, PARK_POSITION
+        for angle, arm in views:
+            if angle != body_angle:
+                duration += arm_move_time(arm_position, PARK_POSITION) + STOP_TIME
+                duration += body_move_time(self.radius, angle - body_angle) if body_angle is not None else 0.
+                body_angle, arm_position = angle, PARK_POSITION
+            duration += arm_move_time(arm_position, arm) + VIEW_TIME
+            arm_position = arm
+        return float(duration + arm_move_time(arm_position, PARK_POSITION))
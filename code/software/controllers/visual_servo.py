@@ -0,0 +1,226 @@
+import threading
+import time
+
+import numpy as np
+
+from config.dev_config import DEBUG_NAV
+from controllers.tracer import tracer
+
+
+class PID:
+    def __init__(self, kp, ki=0., kd=0., output_limit=None):
+        """
+        PID controller.
+        kp (float): The proportional gain.
+        ki (float): The integral gain.
+        kd (float): The derivative gain.
+        output_limit (float): The max absolute value of the output, None for no limit.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.
+        self.prev_error = None
+
+    def update(self, error, dt):
+        """
+        Returns the command for the given error.
+        error (float): The current error.
+        dt (float): The time since the previous update in seconds.
+        """
+        derivative = 0.
+        if self.prev_error is not None and dt > 0:
+            derivative = (error - self.prev_error) / dt
+        self.prev_error = error
+
+        output = self.kp * error + self.ki * (self.integral + error * dt) + self.kd * derivative
+        if self.output_limit is not None and abs(output) > self.output_limit:
+            # Anti windup: the integral doesn't grow while the output saturates
+            return float(np.clip(output, -self.output_limit, self.output_limit))
+        self.integral += error * dt
+        return output
+
+
+class CentroidKalman:
+    def __init__(self, process_noise=50., measurement_noise=4.):
+        """
+        Constant velocity Kalman filter of the position of the mask centroid along one axis.
+        process_noise (float): The std of the acceleration of the centroid, in units/s^2.
+        measurement_noise (float): The std of the measured centroid, in units.
+        """
+        self.q = process_noise**2
+        self.r = measurement_noise**2
+        self.x = None   # [position, velocity]
+        self.p = None
+        self.t = None
+
+    def reset(self):
+        self.x = None
+
+    def update(self, z, t):
+        """
+        Adds a measurement.
+        z (float): The measured position.
+        t (float): The time.monotonic() of the measurement.
+        """
+        if self.x is None:
+            self.x = np.array([z, 0.])
+            self.p = np.diag([self.r, self.q])
+            self.t = t
+            return
+
+        self._predict(t - self.t)
+        self.t = t
+        s = self.p[0, 0] + self.r
+        k = self.p[:, 0] / s
+        self.x = self.x + k * (z - self.x[0])
+        self.p = self.p - np.outer(k, self.p[0])
+
+    def predict(self, t):
+        """
+        Returns the expected position at the given time.monotonic() time.
+        """
+        return self.x[0] + self.x[1] * (t - self.t)
+
+    def _predict(self, dt):
+        f = np.array([[1., dt], [0., 1.]])
+        q = self.q * np.array([[dt**4 / 4, dt**3 / 2], [dt**3 / 2, dt**2]])
+        self.x = f @ self.x
+        self.p = f @ self.p @ f.T + q
+
+
+class ServoReport:
+    def __init__(self, mode):
+        """
+        Outcome of an alignment.
+        mode (str): The alignment mode.
+        """
+        self.mode = mode
+        self.converged = False
+        self.iterations = 0     # Number of corrections sent
+        self.frames = 0         # Number of masks used
+        self.lost_frames = 0    # Number of frames where the object was not found
+        self.final_error = None
+        self.wall_time = 0.
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        status = "converged" if self.converged else "stopped"
+        error = "-" if self.final_error is None else f"{self.final_error:.2f}"
+        return (f"Alignment {self.mode} {status} in {self.wall_time:.2f} s, {self.iterations} corrections, "
+                f"{self.frames} frames ({self.lost_frames} lost), final error {error}")
+
+
+class VisualServo:
+    def __init__(self, mode, measure, actuate, pid, tolerance, timeout=None, settle_frames=2,
+                 max_lost=None, on_lost=None, kalman=None):
+        """
+        Closed loop alignment running one correction per new mask.
+        mode (str): The alignment mode, for the report.
+        measure (function): Blocks until a mask computed after the last correction, returns (error, timestamp)
+                            with error None if the object was not found, or None if no frame arrived in time.
+        actuate (function): Sends a correction, called with the output of the PID.
+        pid (PID): The controller, in the units of the error.
+        tolerance (float): The error under which the alignment is done.
+        timeout (float): The max duration of the alignment in seconds, None for no limit.
+        settle_frames (int): The number of consecutive frames within the tolerance needed to converge.
+        max_lost (int): The number of consecutive frames without the object before calling on_lost.
+        on_lost (function): Called to search the object when it was lost for max_lost frames.
+        kalman (CentroidKalman): If given, the error is filtered and predicted to the time of the correction.
+        """
+        self.mode = mode
+        self.measure = measure
+        self.actuate = actuate
+        self.pid = pid
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.settle_frames = settle_frames
+        self.max_lost = max_lost
+        self.on_lost = on_lost
+        self.kalman = kalman
+        self.running = False
+
+    def run(self, stop_on_convergence=True):
+        """
+        Runs the alignment until convergence, timeout or stop.
+        stop_on_convergence (bool): If False, keeps tracking the object until stop is called.
+        Returns:
+            ServoReport: The report of the alignment.
+        """
+        report = ServoReport(self.mode)
+        start = time.monotonic()
+        self.running = True
+        self.pid.reset()
+        if self.kalman is not None:
+            self.kalman.reset()
+
+        settled = 0
+        lost = 0
+        last_time = None
+        while self.running:
+            if self.timeout is not None and time.monotonic() - start > self.timeout:
+                break
+
+            with tracer.span('measure', 'align', mode=self.mode):
+                res = self.measure()
+            if res is None:
+                continue
+            error, timestamp = res
+            report.frames += 1
+
+            if error is None:
+                report.lost_frames += 1
+                lost += 1
+                settled = 0
+                if self.max_lost is not None and lost > self.max_lost and self.on_lost is not None:
+                    self.on_lost()
+                    self.pid.reset()
+                    if self.kalman is not None:
+                        self.kalman.reset()
+                    lost = 0
+                continue
+            lost = 0
+
+            if self.kalman is not None:
+                self.kalman.update(error, timestamp)
+                # The correction applies to where the centroid is now, not when the frame was taken
+                error = self.kalman.predict(time.monotonic())
+            report.final_error = float(error)
+
+            if abs(error) <= self.tolerance:
+                settled += 1
+                if stop_on_convergence and settled >= self.settle_frames:
+                    report.converged = True
+                    break
+                continue
+            settled = 0
+
+            now = time.monotonic()
+            output = self.pid.update(error, 0. if last_time is None else now - last_time)
+            last_time = now
+            with tracer.span('correction', 'align', mode=self.mode, error=float(error), output=float(output)):
+                self.actuate(output)
+            report.iterations += 1
+
+        self.running = False
+        report.wall_time = time.monotonic() - start
+        if DEBUG_NAV:
+            print(report)
+        return report
+
+    def start(self, stop_on_convergence=False):
+        """
+        Runs the alignment in a background thread.
+        """
+        thread = threading.Thread(target=self.run, args=(stop_on_convergence,), daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.running = False
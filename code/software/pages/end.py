@@ -11,6 +11,7 @@ import rerun as rr
 import tkinter.messagebox as messagebox
 import os, pathlib, tempfile
 from controllers.reconstruct_3d import Reconstruct
+from controllers.tracer import tracer
 import threading
 
 
@@ -38,6 +39,8 @@ class EndPage(tk.Frame):
     def _reconstruct_3d(self):
         self.reconstructor.pre_process_images(scale_factor=1)
         self.reconstructor.reconstruction_open_mvs(pathlib.Path("packages/openMVS/make/bin"))
+        # The scan trace is written again with the reconstruction stages
+        tracer.save(os.path.join(tempfile.gettempdir(), "superscanner8000/scan_trace.json"))
         self.reconstruction_finished = True
 
     def _display_progress_bar(self):
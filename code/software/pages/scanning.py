@@ -7,11 +7,14 @@ from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,
 NavigationToolbar2Tk) 
 import asyncio, threading
 import config.dev_config as dconfig
+from controllers.tracer import tracer
 from widgets.image import ImageWidget
 import cv2
 import numpy as np
+import os, tempfile
 
 CALIBRATION_ITERATION = 4
+STREAM_METRICS_PERIOD = 1000 # Refresh period of the stream metrics in ms
 
 class ScanningPage(tk.Frame):
     def __init__(self, parent, controller):
@@ -29,6 +32,11 @@ class ScanningPage(tk.Frame):
         button = ttk.Button(self.container, text="Stop scanning", style='Accent.TButton', command=self._interrupt_scan)
         button.pack(pady=10)
 
+        # Health of the camera link, to tell a slow network from a slow decoder or model
+        self.stream_label = ttk.Label(self.container, text="")
+        self.stream_label.pack(pady=0)
+        self._update_stream_metrics()
+
         self.nav = self.controller.nav
         
         self.detector = Object_Detector(self.nav, self.controller.ss8, visualize=False)
@@ -39,20 +47,26 @@ class ScanningPage(tk.Frame):
     
 
     def _start_scanning(self):
+        tracer.start()
         # Start the movement
 
         self.display_mask_counter = 0
+        self.top_frame_id = 0
         def update_top_cam_mask():
             cv2.waitKey(1)
-            prev_img = self.controller.ss8.capture_image()
+            # Only segment frames that were not already processed
+            res = self.controller.ss8.capture_latest(after_id=self.top_frame_id, scale=self.controller.ss8.tracking_scale)
+            if res is None or res[2] is None:
+                return None
+            self.top_frame_id, _, prev_img = res
         
             if(self.controller.ss8.is_top_cam_vertical()):
                 prev_img = self.controller.segmenter.rotate_crop_image_of_90_clockwise(prev_img)
 
-            self.controller.segmenter.propagate(prev_img)
+            self.controller.segmenter.propagate(prev_img, self.top_frame_id)
             self.display_mask_counter += 1
             if self.display_mask_counter % 20 < 10:
-                prev_img = self.controller.segmenter.mask_img(prev_img)
+                prev_img = self.controller.segmenter.mask_img(prev_img, self.top_frame_id)
 
             if prev_img is not None:
                 return cv2.cvtColor(prev_img, cv2.COLOR_BGR2RGB)
@@ -75,8 +89,12 @@ class ScanningPage(tk.Frame):
             plot = self.fig.add_subplot(111)
             ss8_pos, ss8_rot, obstacles, obstacle_contributions = self.controller.nav.get_obstacle_plot_data()
             trajectory_pos, trajectory_contributions = self.controller.nav.get_trajectory_plot_data()
+            occupancy, extent = self.controller.nav.get_occupancy_plot_data()
             print(f"Trajectory positions: {trajectory_pos}, Trajectory contributions: {trajectory_contributions}")
 
+            # Plot the occupancy probability of the cells, white is free and black occupied
+            plot.imshow(occupancy.T, origin='lower', extent=extent, cmap='Greys', vmin=0, vmax=1)
+
             # Plot ss8 orientation and position
             plot.quiver(ss8_pos[0], ss8_pos[1], 10 * np.cos(ss8_rot), 10 * np.sin(ss8_rot), angles='xy', scale_units='xy', scale=1)
             plot.scatter(ss8_pos[0], ss8_pos[1], c='r', marker='o', label='SS8')
@@ -134,11 +152,19 @@ class ScanningPage(tk.Frame):
             update_plot()
 
 
+    def _update_stream_metrics(self):
+        if dconfig.CONNECT_TO_TOP_CAM:
+            self.stream_label.config(text=self.controller.ss8.get_stream_metrics('arm').summary())
+            self.container.after(STREAM_METRICS_PERIOD, self._update_stream_metrics)
+
     def _interrupt_scan(self):
         self.controller.ss8.stop_mov()
         self.controller.show_page('SetupPage')
 
     def _on_finish(self):
+        metrics_path = os.path.join(tempfile.gettempdir(), "superscanner8000/stream_metrics.json")
+        self.controller.ss8.dump_stream_metrics(metrics_path)
+        tracer.save(os.path.join(tempfile.gettempdir(), "superscanner8000/scan_trace.json"))
         self.controller.ss8.display_text("Scan finished")
         self.controller.ss8.set_led_rainbow()
         self.controller.show_page('EndPage')
\ No newline at end of file
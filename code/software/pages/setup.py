@@ -105,7 +105,8 @@ class SetupPage(tk.Frame):
             points = np.array([[x, y]], dtype=np.float32)
     
             # Initialize ImageSegmenter with a random (for now) bounding box
-            self.controller.segmenter.initialize(self.controller.ss8.capture_image(), points=points)
+            # The click is in the coordinates of the displayed image, so use the same scale
+            self.controller.segmenter.initialize(self.controller.ss8.capture_image(scale=self.controller.ss8.tracking_scale), points=points)
 
             if(not self.object_selected):
                 self.controller.ss8.display_text("Image selected")
@@ -119,23 +120,42 @@ class SetupPage(tk.Frame):
         self.img_preview_front = ImageWidget(self.container_right, 445, 300, lambda:None)
         self.img_preview_front.canvas.pack(expand=True)  # Center the canvas in the container
 
+        # Ids of the last displayed frames, the previews are only refreshed on new frames
+        self.top_frame_id = 0
+        self.front_frame_id = 0
+
+        # Reduction factors of the previews, chosen from the first full resolution frame
+        self.top_scale = None
+        self.front_scale = None
+
         def update_preview_top():
             cv2.waitKey(1)
-            prev_img = self.controller.ss8.capture_image()
-            prev_img = self.controller.segmenter.mask_img(prev_img) if self.object_selected else prev_img
-            if prev_img is not None:
-                return cv2.cvtColor(prev_img, cv2.COLOR_BGR2RGB)
-            else:
+            res = self.controller.ss8.capture_latest(after_id=self.top_frame_id, scale=self.top_scale or 1)
+            if res is None:
+                return None
+            self.top_frame_id, _, prev_img = res
+            if prev_img is None:
                 return None
+            if self.top_scale is None:
+                # The segmenter is fed with the preview frames, so it tracks at the same scale
+                self.top_scale = self.img_preview_top.fit_scale(prev_img)
+                self.controller.ss8.tracking_scale = self.top_scale
+            prev_img = self.controller.segmenter.mask_img(prev_img, self.top_frame_id) if self.object_selected else prev_img
+            return cv2.cvtColor(prev_img, cv2.COLOR_BGR2RGB)
         
         def update_preview_front():
             cv2.waitKey(1)
-            prev_img = self.controller.ss8.capture_image("front")
-            prev_img = cv2.rotate(prev_img, cv2.ROTATE_90_CLOCKWISE)
-            if prev_img is not None:
-                return cv2.cvtColor(prev_img, cv2.COLOR_BGR2RGB)
-            else:
+            res = self.controller.ss8.capture_latest("front", after_id=self.front_frame_id, scale=self.front_scale or 1)
+            if res is None:
+                return None
+            self.front_frame_id, _, prev_img = res
+            if prev_img is None:
                 return None
+            if self.front_scale is None:
+                # The preview is rotated, so compare the rotated canvas with the frame
+                self.front_scale = self.img_preview_front.fit_scale(np.swapaxes(prev_img, 0, 1))
+            prev_img = cv2.rotate(prev_img, cv2.ROTATE_90_CLOCKWISE)
+            return cv2.cvtColor(prev_img, cv2.COLOR_BGR2RGB)
         
         self.img_preview_top.display(update_preview_top, 10)
         self.img_preview_front.display(update_preview_front, 10)
@@ -0,0 +1,471 @@
+"""
+Stand-in for the ESP32-S2 control API (code/hardware/esp32-s2/esp32-s2.ino).
+
+Run from code/software with:
+    python -m simulation.esp32_server [--port 8000] [--latency-ms 15]
+
+Then connect the app to the API URL http://127.0.0.1:8000. Every route of the firmware is
+served with the same bodies and 422 errors, after a simulated network latency, and the
+wheels, arm and camera move over time like the real motors.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8000
+DEFAULT_LATENCY = 0.015     # Mean network and processing latency of a request in seconds
+DEFAULT_JITTER = 0.005      # Std of the latency in seconds
+
+# Wheels, matching the time model of SS8 (BODY_DIST_TO_TIME and BODY_ANGLE_TO_TIME) at full duty cycle
+CM_PER_SECOND = 1000 / 24       # Forward speed in cm/s
+PIVOT_RAD_PER_SECOND = 1000 / 510   # Rotation speed when only one wheel turns, in rad/s
+TRACK_WIDTH_CM = 26.            # Distance between the wheels
+MAX_DUTY_CYCLE = 255
+
+# Directions of (motor1, motor2) of each motion, from wheels.cpp. Motor1 drives the right wheel and motor2 the
+# left one: left and right only drive motor1, forward and backward, so both pivot around the left wheel.
+WHEEL_MOTORS = {
+    "forward": (1, 1),
+    "backward": (-1, -1),
+    "left": (1, 0),
+    "right": (-1, 0),
+    "hard left": (1, -1),
+    "hard right": (-1, 1),
+}
+
+# Steppers, from arm.cpp and cam_angles.cpp
+ARM_LINK_LENGTHS = (40, 40)
+ARM_INIT_ANGLE = math.radians(5)
+ARM_STEPS_PER_RAD = (30 * 200 / (2 * math.pi), 200 / 20 * 200 / (2 * math.pi))
+ARM_MAX_SPEED = 1000.   # steps/s
+ARM_ACCELERATION = 100. # steps/s^2
+CAM_STEPS_PER_REV = 4096
+CAM_MAX_SPEED = 1000.
+CAM_ACCELERATION = 10000.
+
+
+class Stepper:
+    def __init__(self, max_speed, acceleration, clock):
+        """
+        AccelStepper like motor moving to its target with a trapezoidal speed profile.
+        max_speed (float): The max speed in steps/s.
+        acceleration (float): The acceleration in steps/s^2.
+        clock (function): Returns the current time in seconds.
+        """
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.clock = clock
+        self.start_pos = 0.
+        self.target = 0.
+        self.start_time = clock()
+
+    def _duration(self, distance):
+        # Triangular profile if the max speed isn't reached
+        if distance < self.max_speed**2 / self.acceleration:
+            return 2 * math.sqrt(distance / self.acceleration)
+        return distance / self.max_speed + self.max_speed / self.acceleration
+
+    def position(self):
+        distance = abs(self.target - self.start_pos)
+        if distance == 0:
+            return self.target
+        elapsed = self.clock() - self.start_time
+        duration = self._duration(distance)
+        if elapsed >= duration:
+            return self.target
+
+        # Distance covered by the trapezoidal profile after elapsed seconds
+        ramp = min(self.max_speed / self.acceleration, duration / 2)
+        peak = self.acceleration * ramp
+        if elapsed < ramp:
+            covered = self.acceleration * elapsed**2 / 2
+        elif elapsed < duration - ramp:
+            covered = self.acceleration * ramp**2 / 2 + peak * (elapsed - ramp)
+        else:
+            remaining = duration - elapsed
+            covered = distance - self.acceleration * remaining**2 / 2
+        return self.start_pos + math.copysign(covered, self.target - self.start_pos)
+
+    def move_to(self, target):
+        self.start_pos = self.position()
+        self.target = target
+        self.start_time = self.clock()
+
+    def stop(self):
+        self.move_to(round(self.position()))
+
+    def is_moving(self):
+        return round(self.position()) != round(self.target)
+
+
+class SimulatedSS8:
+    def __init__(self, clock=time.monotonic):
+        """
+        State of the simulated robot, integrated lazily from the time of the last command.
+        clock (function): Returns the current time in seconds.
+        """
+        self.clock = clock
+        self.lock = threading.RLock()
+
+        # Wheels
+        self.pose = [0., 0., 0.]    # x, y in cm and heading in rad at the start of the current motion
+        self.direction = "stop"
+        self.motion_start = clock()
+        self.motion_duration = None # In seconds, None to move until stopped
+        self.duty_cycle = MAX_DUTY_CYCLE
+
+        # Arm
+        self.arm_steppers = [Stepper(ARM_MAX_SPEED, ARM_ACCELERATION, clock) for _ in range(2)]
+        self.arm_x, self.arm_y = 0, 0
+        self.q1, self.q2 = 0., 0.
+
+        # Camera
+        self.cam_steppers = [Stepper(CAM_MAX_SPEED, CAM_ACCELERATION, clock) for _ in range(2)]
+
+        # Display and LEDs
+        self.display = ["", ""]
+        self.progress = None
+        self.led = (0, 0, 0)
+        self.rainbow = False
+        self.flash_until = 0.
+
+    # Wheels
+
+    def get_pose(self):
+        """
+        Returns the current (x, y, heading) of the robot.
+        """
+        with self.lock:
+            elapsed = self.clock() - self.motion_start
+            if self.motion_duration is not None:
+                elapsed = min(elapsed, self.motion_duration)
+            return self._integrate(self.pose, self.direction, elapsed)
+
+    def _integrate(self, pose, direction, elapsed):
+        x, y, heading = pose
+        if direction not in WHEEL_MOTORS:
+            return [x, y, heading]
+        right, left = WHEEL_MOTORS[direction]
+        speed = self.duty_cycle / MAX_DUTY_CYCLE
+        if right == left:
+            dist = CM_PER_SECOND * speed * elapsed * right
+            return [x + dist * math.cos(heading), y + dist * math.sin(heading), heading]
+
+        # The robot rotates around the point of the wheel axis where the speeds of the wheels cancel out: the
+        # still wheel when only one turns, the center when they turn in opposite directions, twice as fast
+        angle = (right - left) * PIVOT_RAD_PER_SECOND * speed * elapsed
+        side = TRACK_WIDTH_CM / 2 * (right + left) / (right - left)
+        pivot = (x - side * math.sin(heading), y + side * math.cos(heading))
+        c, s = math.cos(angle), math.sin(angle)
+        dx, dy = x - pivot[0], y - pivot[1]
+        return [pivot[0] + c * dx - s * dy, pivot[1] + s * dx + c * dy, heading + angle]
+
+    def get_direction(self):
+        with self.lock:
+            if self.motion_duration is not None and self.clock() - self.motion_start > self.motion_duration:
+                return "stop"
+            return self.direction
+
+    def move(self, direction, ms):
+        """
+        Starts a timed motion, like Wheels::forward and the others. The motion never ends if ms <= 0.
+        """
+        with self.lock:
+            self.pose = self.get_pose()
+            self.direction = direction
+            self.motion_start = self.clock()
+            self.motion_duration = ms / 1000 if ms > 0 else None
+
+    def stop(self):
+        self.move("stop", 0)
+
+    def set_speed(self, duty_cycle):
+        """
+        Changes the duty cycle, the current motion keeps its end time.
+        """
+        with self.lock:
+            now = self.clock()
+            self.pose = self.get_pose()
+            if self.motion_duration is not None:
+                self.motion_duration = max(self.motion_duration - (now - self.motion_start), 0.)
+            self.motion_start = now
+            self.duty_cycle = duty_cycle
+
+    # Arm
+
+    def arm_goto(self, x, y, angles):
+        """
+        Returns False if the target is out of range, like Arm::setPos.
+        """
+        with self.lock:
+            if angles:
+                if x < -8 or x > 190 or y < 0 or y > 190:
+                    return False
+                q1, q2 = math.radians(x), math.radians(y)
+                a1, a2 = ARM_LINK_LENGTHS
+                self.arm_x = int(a1 * math.cos(q1) + a2 * math.cos(q1 + q2))
+                self.arm_y = int(a1 * math.sin(q1) + a2 * math.sin(q1 + q2))
+            else:
+                res = self._arm_pos_to_angles(x, y)
+                if res is None:
+                    return False
+                q1, q2 = res
+                self.arm_x, self.arm_y = x, y
+
+            self.q1, self.q2 = q1, q2
+            self.arm_steppers[0].move_to(round(ARM_STEPS_PER_RAD[0] * (q1 - ARM_INIT_ANGLE)))
+            self.arm_steppers[1].move_to(round(ARM_STEPS_PER_RAD[1] * (q2 - ARM_INIT_ANGLE)))
+            return True
+
+    def _arm_pos_to_angles(self, x, y):
+        a1, a2 = ARM_LINK_LENGTHS
+        r = math.hypot(x, y)
+        if r > a1 + a2 or r < abs(a1 - a2) or r == 0:
+            return None
+        q2 = math.acos(max(-1., min(1., (x**2 + y**2 - a1**2 - a2**2) / (2 * a1 * a2))))
+        q1 = math.atan2(y, x) - math.acos(max(-1., min(1., (a1**2 + x**2 + y**2 - a2**2) / (2 * a1 * r))))
+        if q1 < 0:
+            q1 += 2 * math.pi
+        if q1 < math.radians(-8) or q1 > math.radians(190) or q2 > math.radians(190):
+            return None
+        return q1, math.pi - q2
+
+    def arm_stop(self):
+        with self.lock:
+            for stepper in self.arm_steppers:
+                stepper.stop()
+            # Same conversion as Arm::stop, which doesn't add back the initial angle
+            self.q1 = self.arm_steppers[0].target / ARM_STEPS_PER_RAD[0]
+            self.q2 = self.arm_steppers[1].target / ARM_STEPS_PER_RAD[1]
+            a1, a2 = ARM_LINK_LENGTHS
+            self.arm_x = int(a1 * math.cos(self.q1) + a2 * math.cos(self.q1 + self.q2))
+            self.arm_y = int(a1 * math.sin(self.q1) + a2 * math.sin(self.q1 + self.q2))
+
+    def arm_moving(self):
+        return any(stepper.is_moving() for stepper in self.arm_steppers)
+
+    # Camera
+
+    def cam_goto(self, alpha, beta):
+        if not (-180 <= alpha <= 180 and -180 <= beta <= 180):
+            return False
+        with self.lock:
+            self.cam_steppers[0].move_to(int(-alpha / 360 * CAM_STEPS_PER_REV))
+            self.cam_steppers[1].move_to(int(beta / 360 * CAM_STEPS_PER_REV))
+        return True
+
+    def cam_angles(self):
+        """
+        Returns the current (alpha, beta) angles, truncated to integers like CamAngles::stepsToAngle.
+        """
+        steps = [round(stepper.position()) for stepper in self.cam_steppers]
+        return int(-steps[0] * 360 / CAM_STEPS_PER_REV), int(steps[1] * 360 / CAM_STEPS_PER_REV)
+
+    def cam_stop(self):
+        with self.lock:
+            for stepper in self.cam_steppers:
+                stepper.stop()
+
+    def cam_moving(self):
+        return any(stepper.is_moving() for stepper in self.cam_steppers)
+
+    def state(self):
+        """
+        Returns the whole simulated state, for the benchmarks and the debugging.
+        """
+        with self.lock:
+            alpha, beta = self.cam_angles()
+            return {
+                'pose': self.get_pose(),
+                'direction': self.get_direction(),
+                'duty_cycle': self.duty_cycle,
+                'arm': {'x': self.arm_x, 'y': self.arm_y, 'q1': self.q1, 'q2': self.q2, 'moving': self.arm_moving()},
+                'cam': {'alpha': alpha, 'beta': beta, 'moving': self.cam_moving()},
+                'display': self.display,
+                'progress': self.progress,
+                'led': self.led,
+                'rainbow': self.rainbow,
+                'flashing': self.clock() < self.flash_until,
+            }
+
+
+class ESP32Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=DEFAULT_PORT, host='127.0.0.1', latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER, robot=None):
+        """
+        HTTP server answering the routes of the ESP32-S2 firmware for a SimulatedSS8.
+        The requests are handled one at a time like on the ESP32, after the simulated latency.
+        port (int): The port to listen on, 0 for any free port.
+        host (str): The interface to listen on.
+        latency (float): The mean latency of a request in seconds.
+        jitter (float): The std of the latency in seconds.
+        robot (SimulatedSS8): The simulated state, a new one if None.
+        """
+        super().__init__((host, port), ESP32RequestHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.robot = robot if robot is not None else SimulatedSS8()
+        self.request_lock = threading.Lock()
+        self.request_counts = {}    # route -> number of requests
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        """
+        Serves in a background thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, name="esp32-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def simulate_latency(self):
+        delay = random.gauss(self.latency, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle_route(self, route, body):
+        """
+        Returns the (status code, response) of a request, like the handlers of esp32-s2.ino.
+        """
+        robot = self.robot
+        self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+        if route == "/status":
+            return 200, {"direction": robot.get_direction()}
+        if route in WHEEL_ROUTES:
+            robot.move(WHEEL_ROUTES[route], int(body.get("ms", 0)))
+            return 200, {}
+        if route == "/stp":
+            robot.stop()
+            return 200, {}
+        if route == "/speed":
+            speed = int(body.get("speed", 0))
+            if speed < 0 or speed > 255:
+                return 422, {}
+            robot.set_speed(speed)
+            return 200, {}
+
+        if route == "/arm/status":
+            return 200, {"x": robot.arm_x, "y": robot.arm_y, "q1": robot.q1, "q2": robot.q2, "moving": robot.arm_moving()}
+        if route == "/arm/goto":
+            if not robot.arm_goto(int(body.get("x", 0)), int(body.get("y", 0)), bool(body.get("angles", False))):
+                return 422, {}
+            return 200, {"x": robot.arm_x, "y": robot.arm_y, "q1": math.degrees(robot.q1), "q2": math.degrees(robot.q2)}
+        if route == "/arm/stp":
+            robot.arm_stop()
+            return 200, {}
+
+        if route == "/cam/status":
+            alpha, beta = robot.cam_angles()
+            return 200, {"moving": robot.cam_moving(), "alpha": alpha, "beta": beta}
+        if route == "/cam/goto":
+            alpha, beta = float(body.get("alpha", 0)), float(body.get("beta", 0))
+            if not robot.cam_goto(alpha, beta):
+                return 422, {}
+            return 200, {"angle1": alpha, "angle2": beta}
+        if route == "/cam/stp":
+            robot.cam_stop()
+            alpha, beta = robot.cam_angles()
+            return 200, {"alpha": alpha, "beta": beta}
+
+        if route == "/text":
+            robot.display = [str(body.get("text", "")), ""]
+            robot.progress = None
+            return 200, {}
+        if route == "/progress":
+            text, progress = str(body.get("text", "")), int(body.get("progress", 0))
+            if progress < 0 or progress > 100 or len(text) > 16:
+                return 422, {}
+            robot.display = [text, ""]
+            robot.progress = progress
+            return 200, {}
+        if route == "/scroll":
+            robot.display = [str(body.get("text1", "")), str(body.get("text2", ""))]
+            robot.progress = None
+            return 200, {}
+
+        if route == "/led/set":
+            robot.led = (int(body.get("r", 0)), int(body.get("g", 0)), int(body.get("b", 0)))
+            return 200, {}
+        if route == "/led/rainbow":
+            robot.rainbow = bool(body.get("rainbow", False))
+            return 200, {}
+        if route == "/led/flash":
+            robot.flash_until = robot.clock() + int(body.get("duration", 0)) / 1000
+            return 200, {}
+
+        if route == "/sim/state":
+            return 200, robot.state()
+        return 404, {}
+
+
+# Direction of the wheels for each timed motion route
+WHEEL_ROUTES = {
+    "/fwd": "forward",
+    "/bwd": "backward",
+    "/lft": "left",
+    "/rgt": "right",
+    "/hlft": "hard left",
+    "/hrgt": "hard right",
+}
+
+
+class ESP32RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep the connections alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}   # Like deserializeJson, an invalid body reads as empty
+        self._handle(body if isinstance(body, dict) else {})
+
+    def _handle(self, body):
+        with self.server.request_lock:
+            self.server.simulate_latency()
+            status, response = self.server.handle_route(self.path.split('?')[0], body)
+
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_LATENCY * 1000, help='Mean latency of a request')
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_JITTER * 1000, help='Std of the latency')
+    args = parser.parse_args()
+
+    server = ESP32Server(args.port, args.host, args.latency_ms / 1000, args.jitter_ms / 1000)
+    print(f"Simulated ESP32-S2 listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
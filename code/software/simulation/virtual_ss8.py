@@ -0,0 +1,460 @@
+"""
+Headless stand-in for SS8 running on a virtual clock, to fast-forward whole scans.
+
+Run from code/software with:
+    python -m simulation.virtual_ss8 [--horizontal 6] [--vertical 3] [--obstacles 0]
+
+VirtualSS8 has the methods of SS8 used by the navigator. The motions, the arm and the
+camera move the SimulatedSS8 of the ESP32 stand-in, whose wheels follow the time model of
+SS8 (BODY_DIST_TO_TIME and BODY_ANGLE_TO_TIME), and waiting for them advances the virtual
+clock instead of sleeping. The motions are timed like with the MotionDispatcher: each
+command reaches the wheels after the latency of the API, the end of a stop-start motion is
+only seen by the status polls, and a continuous one runs CONTINUOUS_OVERLAP longer until
+the next motion or a stop takes over. The top camera renders the mask of a synthetic
+cylinder, which the alignments center with the servo and the corrections of SS8. The front
+camera sees the surface of cylindrical obstacles and feeds them to the navigator like the
+object detector.
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+import config.dev_config as dconfig
+from controllers.motion_dispatcher import CONTINUOUS_OVERLAP, STATUS_POLL_LEAD, STATUS_POLL_PERIOD
+from controllers.ss8 import (SS8, BODY_ANGLE_TO_TIME, BODY_DIST_TO_TIME, MAX_DUTY_CYCLE, TOP_CAM_FOV, CAM_SETTLE_TIME,
+                             MOTOR_STATUS_PERIOD, STABLE_FRAMES, SERVO_GAINS)
+from controllers.view_planner import ARM_BASE_HEIGHT
+from simulation.esp32_server import DEFAULT_LATENCY, SimulatedSS8
+
+FRAME_WIDTH = 320           # Size of the rendered top cam frames
+FRAME_HEIGHT = 240
+FRAME_PERIOD = 1 / dconfig.CAM_MAX_FPS  # Time between two camera frames in seconds
+FRONT_CAM_FOV = math.radians(60)
+FRONT_CAM_RANGE = 150       # Max distance in cm of the points seen by the front camera
+FRONT_FRAME_PERIOD = 0.2    # Time between two front camera detections in seconds
+FRONT_POINTS = 7            # Number of points seen on the visible side of an obstacle
+BODY_RADIUS = 15            # Radius of the footprint of the body in cm, for the collisions
+
+
+class VirtualClock:
+    def __init__(self, start=0.):
+        """
+        Time of the simulation in seconds, only moves forward when advanced.
+        """
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+class Scene:
+    def __init__(self, radius=80, object_radius=15, object_height=30, obstacles=()):
+        """
+        Synthetic surroundings of the robot, in the frame of the navigator: the robot starts at (0, 0) heading
+        along y, with the object on its left.
+        radius (float): The distance between the robot and the center of the object in cm.
+        object_radius (float): The radius of the cylinder standing for the object in cm.
+        object_height (float): The height of the object in cm.
+        obstacles (list): The (x, y, radius) of the cylindrical obstacles in cm.
+        """
+        self.object_pos = np.array([-radius, 0.])
+        self.object_radius = object_radius
+        self.object_height = object_height
+        self.obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 3)
+
+
+class VirtualMotion:
+    def __init__(self, direction, ms, start, end, ss8):
+        """
+        Handle on a motion of the VirtualSS8, like MotionHandle.
+        start (float): The time the command is sent.
+        end (float): The time the motion is seen as done.
+        """
+        self.direction = direction
+        self.ms = ms
+        self.start_time = start
+        self.end_time = end
+        self.ss8 = ss8
+
+    def done(self):
+        return self.ss8.clock() >= self.end_time
+
+    def wait(self, timeout=None):
+        self.ss8.advance(self.end_time)
+        return True
+
+
+class VirtualSS8:
+    def __init__(self, scene=None, latency=DEFAULT_LATENCY):
+        """
+        SS8 on a virtual clock, see the module docstring.
+        scene (Scene): The object and the obstacles around the robot, the default Scene if None.
+        latency (float): The latency of a request to the API in seconds.
+        """
+        self.scene = scene if scene is not None else Scene()
+        self.latency = latency
+        self.clock = VirtualClock()
+        self.robot = SimulatedSS8(clock=self.clock)
+        self.robot.pose = [0., 0., math.pi / 2]
+
+        self.top_cam_angles = np.array([0, 0])
+        self.arm_pos = (0, 0)       # Commanded arm position in cm, (0, 0) when parked
+        self.duty_cycle = MAX_DUTY_CYCLE
+        self.last_motion_time = 0.
+        self.alignment_reports = []
+        self.alignment_rotation = 0.
+        self.queue = []             # (time, direction, ms) of the commands not yet received by the wheels
+        self.motion_end = 0.        # End time of the last queued motion
+        self.next_front_frame = 0.
+        self.front_cam_listeners = []
+
+        self.captures = []          # State of the robot at each saved capture
+        self.collisions = 0         # Number of front camera frames where the body overlaps an obstacle
+        self.display = ["", ""]
+
+        # The camera starts at its rest position, looking at the object
+        self.goto_cam(0, 90)
+        self.wait_settled(stable_frames=0)
+
+    # Clock
+
+    def advance(self, t):
+        """
+        Advances the virtual clock to the given time, starting the queued motions and running the front camera
+        detections on the way.
+        """
+        while True:
+            next_motion = self.queue[0][0] if self.queue else math.inf
+            next_event = min(next_motion, self.next_front_frame)
+            if next_event > t:
+                break
+            self.clock.now = max(self.clock.now, next_event)
+            if next_motion <= self.next_front_frame:
+                _, direction, ms = self.queue.pop(0)
+                self.robot.move(direction, ms)
+            else:
+                self.next_front_frame += FRONT_FRAME_PERIOD
+                self._on_front_frame()
+        self.clock.now = max(self.clock.now, t)
+
+    def sleep(self, duration, name='sleep'):
+        self.advance(self.clock() + duration)
+
+    def wait_idle(self):
+        self.advance(self.motion_end)
+
+    # Wheels
+
+    def _move(self, direction, ms, wait_for_completion, continuous=False):
+        """
+        Queues a timed motion after the ones already queued, see the module docstring for its timing.
+        """
+        ms = ms * MAX_DUTY_CYCLE / self.duty_cycle
+        if ms < 1:
+            # Like SS8, the firmware would move until stopped
+            return None
+        start = max(self.clock(), self.motion_end)
+        expected_end = start + ms / 1000
+        if continuous:
+            # The next motion is sent at the expected end and replaces this one before the overlap runs out
+            end = expected_end
+            self.queue.append((start + self.latency, direction, ms + CONTINUOUS_OVERLAP * 1000))
+        else:
+            # The polls start STATUS_POLL_LEAD before the expected end, the first one sent after the wheels
+            # stopped sees it a latency later
+            poll = expected_end - STATUS_POLL_LEAD
+            while poll < expected_end:
+                poll += self.latency + STATUS_POLL_PERIOD
+            end = poll + self.latency
+            self.queue.append((start + self.latency, direction, ms))
+        handle = VirtualMotion(direction, ms, start, end, self)
+        self.motion_end = handle.end_time
+        self.last_motion_time = handle.start_time
+        if wait_for_completion:
+            handle.wait()
+        return handle
+
+    def move_forward(self, dist, wait_for_completion=True, continuous=False):
+        return self._move("forward", dist*BODY_DIST_TO_TIME, wait_for_completion, continuous)
+
+    def move_backward(self, dist, wait_for_completion=True):
+        return self._move("backward", dist*BODY_DIST_TO_TIME, wait_for_completion)
+
+    def rotate_left(self, angle, wait_for_completion=True, continuous=False):
+        if(angle < 0.000001):
+            return None
+        return self._move("left", angle*BODY_ANGLE_TO_TIME, wait_for_completion, continuous)
+
+    def rotate_right(self, angle, wait_for_completion=True, continuous=False):
+        if(angle < 0.000001):
+            return None
+        return self._move("right", angle*BODY_ANGLE_TO_TIME, wait_for_completion, continuous)
+
+    def turn_left(self, angle, wait_for_completion=True, continuous=False):
+        if(angle < 0.000001):
+            return None
+        return self._move("hard left", angle*BODY_ANGLE_TO_TIME/2, wait_for_completion, continuous)
+
+    def turn_right(self, angle, wait_for_completion=True, continuous=False):
+        if(angle < 0.000001):
+            return None
+        return self._move("hard right", angle*BODY_ANGLE_TO_TIME/2, wait_for_completion, continuous)
+
+    def set_speed(self, duty_cycle):
+        duty_cycle = int(min(max(duty_cycle, 1), MAX_DUTY_CYCLE))
+        if duty_cycle == self.duty_cycle:
+            return
+        self.wait_idle()
+        self.robot.set_speed(duty_cycle)
+        self.duty_cycle = duty_cycle
+
+    def stop_mov(self):
+        # The queued motions are cancelled, the wheels stop when /stp is received
+        self.queue = [command for command in self.queue if command[0] <= self.clock()]
+        self.advance(self.clock() + self.latency)
+        self.robot.stop()
+        self.motion_end = self.clock()
+
+    # Arm and camera
+
+    def goto_arm(self, x=0, y=0):
+        assert self.robot.arm_goto(int(x), int(y), x == 0 and y == 0), f"Arm position {x}, {y} out of range"
+        self.arm_pos = (x, y)
+        self.last_motion_time = self.clock()
+
+    def goto_cam(self, x_angle, y_angle, relative=False):
+        angles = np.array([x_angle, y_angle])
+        if relative:
+            angles = angles + self.top_cam_angles
+        alpha, beta = (angles + 180) % 360 - 180
+        self.robot.cam_goto(int(alpha), int(beta))
+        self.top_cam_angles = np.array([alpha, beta])
+        self.last_motion_time = self.clock()
+
+    def stop_cam(self):
+        self.robot.cam_stop()
+        self.top_cam_angles = np.array(self.robot.cam_angles())
+
+    def wait_settled(self, timeout=None, stable_frames=STABLE_FRAMES):
+        """
+        Advances the clock until the wheels, the arm and the camera stopped, then for the still frames.
+        Returns False if the timeout expired before.
+        """
+        deadline = self.clock() + (dconfig.ARM_SETTLE_TIMEOUT if timeout is None else timeout)
+        self.advance(min(self.motion_end, deadline))
+        while self.robot.arm_moving() or self.robot.cam_moving():
+            if self.clock() >= deadline:
+                return False
+            self.advance(self.clock() + MOTOR_STATUS_PERIOD)
+        # The stability compares each frame with the previous one
+        self.advance(self.clock() + (stable_frames + 1) * FRAME_PERIOD if stable_frames > 0 else self.clock())
+        return True
+
+    # Cameras
+
+    def camera_pose(self):
+        """
+        Returns the (x, y, height) position of the top camera and its heading in radians. The arm x axis points
+        where the camera looks with the camera at 90 degrees, on the left of the body.
+        """
+        x, y, heading = self.robot.get_pose()
+        left = heading + math.pi / 2
+        arm_x, arm_y = self.arm_pos
+        position = np.array([x + arm_x * math.cos(left), y + arm_x * math.sin(left), ARM_BASE_HEIGHT + arm_y])
+        return position, heading + math.radians(self.robot.cam_angles()[1])
+
+    def render_mask(self):
+        """
+        Returns the mask of the object seen by the top camera, of shape (FRAME_HEIGHT, FRAME_WIDTH). The camera is
+        assumed to aim at the middle height of the object, only its horizontal angle is simulated.
+        """
+        mask = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), np.uint8)
+        position, heading = self.camera_pose()
+        to_obj = self.scene.object_pos - position[:2]
+        dist = np.linalg.norm(to_obj)
+        if dist <= self.scene.object_radius:
+            return mask
+
+        bearing = (math.atan2(to_obj[1], to_obj[0]) - heading + math.pi) % (2 * math.pi) - math.pi
+        half_width = math.asin(self.scene.object_radius / dist)
+        if abs(bearing) - half_width >= math.pi / 2:
+            return mask
+
+        focal = FRAME_WIDTH / 2 / math.tan(math.radians(TOP_CAM_FOV) / 2)
+        # The object is on the left of the image when it is on the left of the camera
+        limits = np.clip([bearing + half_width, bearing - half_width], -math.pi / 2 + 0.01, math.pi / 2 - 0.01)
+        left, right = FRAME_WIDTH / 2 - focal * np.tan(limits)
+        half_height = focal * self.scene.object_height / 2 / dist
+        top, bottom = FRAME_HEIGHT / 2 - half_height, FRAME_HEIGHT / 2 + half_height
+        cols = slice(int(np.clip(round(left), 0, FRAME_WIDTH)), int(np.clip(round(right), 0, FRAME_WIDTH)))
+        rows = slice(int(np.clip(round(top), 0, FRAME_HEIGHT)), int(np.clip(round(bottom), 0, FRAME_HEIGHT)))
+        mask[rows, cols] = 255
+        return mask
+
+    def get_object_error(self):
+        """
+        Returns the horizontal angle in degrees from the center of the image to the center of the bounding box of the
+        object mask, positive on the left, None if the object isn't seen.
+        """
+        cols = np.flatnonzero(self.render_mask().any(axis=0))
+        if len(cols) == 0:
+            return None
+        return (FRAME_WIDTH / 2 - (cols[0] + cols[-1] + 1) / 2) * TOP_CAM_FOV / FRAME_WIDTH
+
+    # Only the measures of the alignments differ from SS8
+    is_top_cam_vertical = SS8.is_top_cam_vertical
+    _get_alignment_axis = SS8._get_alignment_axis
+    _make_alignment_servo = SS8._make_alignment_servo
+
+    def align_to(self, mode='pos', wait_for_completion=True, keep_arm_cam_settings=False, tolerance_ratio=1):
+        """
+        Centers the object in the top camera like SS8.align_to, with the rendered masks. The alignment always blocks,
+        and lasts ALIGNMENT_TIMEOUT at most on the virtual clock.
+        Returns:
+            float: The angle of the second camera motor at the end of the alignment.
+        """
+        if mode not in SERVO_GAINS:
+            mode = 'cam'
+        deadline = self.clock() + dconfig.ALIGNMENT_TIMEOUT
+
+        def measure():
+            settle = CAM_SETTLE_TIME if mode == 'cam' else 0.
+            self.advance(max(self.clock(), self.last_motion_time + settle) + FRAME_PERIOD)
+            if self.clock() > deadline:
+                servo.stop()
+                return None
+            return self.get_object_error(), self.clock()
+
+        servo = self._make_alignment_servo(
+            mode, measure, tolerance=dconfig.CENTER_THRESHOLD * tolerance_ratio * TOP_CAM_FOV / FRAME_WIDTH)
+
+        if not keep_arm_cam_settings:
+            self.goto_arm(0, 0)
+            self.goto_cam(0, 90)
+        self.stop_cam()
+
+        self.alignment_reports.append(servo.run())
+        return self.top_cam_angles[1]
+
+    def capture_image(self, src='arm', save_to_dir=False, scale=1):
+        """
+        Returns the rendered mask of the object, with the state of the robot saved in captures if save_to_dir.
+        """
+        mask = self.render_mask()
+        if save_to_dir:
+            position, heading = self.camera_pose()
+            self.captures.append({'time': self.clock(), 'pose': self.robot.get_pose(), 'camera': position.tolist(),
+                                  'arm': self.arm_pos, 'error': self.get_object_error()})
+        return mask[::scale, ::scale]
+
+    def flush_captures(self):
+        return
+
+    def add_front_cam_listener(self, listener):
+        """
+        Registers a function called with the points seen by each front camera frame, in the frame of the body
+        (x forward, y on the left), of shape (n, 2).
+        """
+        self.front_cam_listeners.append(listener)
+
+    def connect_navigator(self, navigator):
+        """
+        Feeds the front camera points to the occupancy grid of the navigator, placed with its dead reckoning like
+        the object detector does.
+        """
+        def update(points):
+            c, s = math.cos(navigator.ss8_angle), math.sin(navigator.ss8_angle)
+            hits = navigator.ss8_pos + points @ np.array([[c, s], [-s, c]])
+            navigator.update_occupancy(navigator.ss8_pos.copy(), hits)
+        self.add_front_cam_listener(update)
+
+    def front_cam_points(self):
+        """
+        Returns the points of the sides of the obstacles and of the object facing the front camera, in its
+        field of view and range, in the frame of the body, of shape (n, 2).
+        """
+        x, y, heading = self.robot.get_pose()
+        cylinders = np.vstack([self.scene.obstacles, [*self.scene.object_pos, self.scene.object_radius]])
+        to_center = cylinders[:, :2] - [x, y]
+        toward_cam = np.arctan2(-to_center[:, 1], -to_center[:, 0])
+        offsets = np.linspace(-math.pi / 3, math.pi / 3, FRONT_POINTS)
+        angles = toward_cam[:, None] + offsets[None]
+        points = cylinders[:, None, :2] + cylinders[:, None, 2:] * np.stack([np.cos(angles), np.sin(angles)], axis=2)
+        relative = points.reshape(-1, 2) - [x, y]
+        c, s = math.cos(heading), math.sin(heading)
+        body = relative @ np.array([[c, -s], [s, c]])
+        seen = (np.linalg.norm(body, axis=1) < FRONT_CAM_RANGE) & (np.abs(np.arctan2(body[:, 1], body[:, 0])) < FRONT_CAM_FOV / 2)
+        return body[seen]
+
+    def _on_front_frame(self):
+        x, y, _ = self.robot.get_pose()
+        if len(self.scene.obstacles) and np.any(np.linalg.norm(self.scene.obstacles[:, :2] - [x, y], axis=1)
+                                               < self.scene.obstacles[:, 2] + BODY_RADIUS):
+            self.collisions += 1
+        if not self.front_cam_listeners:
+            return
+        points = self.front_cam_points()
+        for listener in self.front_cam_listeners:
+            listener(points)
+
+    # Display and LEDs
+
+    def display_text(self, text):
+        self.display = [text, ""]
+
+    def display_text_2lines(self, line1, line2):
+        self.display = [line1, line2]
+
+    def display_progress_bar(self, text, progress):
+        self.display = [text, f"{progress:.0%}"]
+
+    def set_led(self, r, g, b):
+        return
+
+    def set_led_rainbow(self):
+        return
+
+    def flash_led(self, r, g, b, duration):
+        return
+
+    def drift(self, navigator):
+        """
+        Returns the distance in cm between the dead reckoning of the navigator and the simulated position.
+        """
+        x, y, _ = self.robot.get_pose()
+        return float(np.linalg.norm(navigator.ss8_pos - [x, y]))
+
+
+def ring_obstacles(radius, count, rng, object_radius=15):
+    """
+    Returns count (x, y, radius) obstacles around the circle of the scan, inside or outside of it.
+    """
+    angles = rng.uniform(math.pi / 6, 2 * math.pi - math.pi / 6, count)
+    dists = radius + rng.choice([-1, 1], count) * rng.uniform(25, 40, count)
+    dists = np.maximum(dists, object_radius + 20)
+    return np.stack([dists * np.cos(angles) - radius, dists * np.sin(angles), rng.uniform(5, 10, count)], axis=1)
+
+
+if __name__ == "__main__":
+    from controllers.navigator import Navigator
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--horizontal', type=int, default=6, help='Number of stops around the object')
+    parser.add_argument('--vertical', type=int, default=3, help='Number of arm positions at each stop')
+    parser.add_argument('--radius', type=float, default=80, help='Distance to the object in cm')
+    parser.add_argument('--obstacles', type=int, default=0, help='Number of obstacles around the circle')
+    args = parser.parse_args()
+
+    dconfig.OBSTACLES_AVOIDANCE = args.obstacles > 0
+    ss8 = VirtualSS8(Scene(args.radius, obstacles=ring_obstacles(args.radius, args.obstacles, np.random.default_rng(0))))
+    nav = Navigator(ss8, None)
+    nav.set_precision(args.vertical, args.horizontal)
+    if args.obstacles > 0:
+        ss8.connect_navigator(nav)
+
+    start = time.perf_counter()
+    nav.start_moving(lambda: None)
+    print(f"Scan of {ss8.clock():.0f} s simulated in {time.perf_counter() - start:.1f} s, {len(ss8.captures)} photos, "
+          f"{ss8.collisions} collisions, drift {ss8.drift(nav):.1f} cm")
@@ -4,6 +4,7 @@ import numpy as np
 import cv2
 
 PREVIEW_WINDOW_NAME = "Preview"
+PREVIEW_SCALES = (8, 4, 2, 1) # Reduction factors supported by the JPEG decoder, largest first
 
 class ImageWidget():
     def __init__(self, parent, width, height, img_click_callback):
@@ -31,6 +32,19 @@ class ImageWidget():
         else:
             self.canvas.itemconfig(self.image_on_canvas, image=self.image)
     
+    def fit_scale(self, image_array):
+        """
+        Returns the largest reduction factor at which the given full resolution image still covers the canvas.
+
+        Args:
+            image_array: A numpy array of the full resolution image.
+        """
+        height, width = image_array.shape[:2]
+        for scale in PREVIEW_SCALES:
+            if width // scale >= self.width and height // scale >= self.height:
+                return scale
+        return 1
+
     def display(self, update_callback, fps=10):
         """
         Displays the image and starts an update loop to refresh the display.